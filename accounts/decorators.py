@@ -0,0 +1,38 @@
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
+from django.shortcuts import redirect
+
+
+def role_required(role, redirect_to):
+    """Decorator factory restricting a view to users with the given role.
+
+    With CachedAuthenticationMiddleware the role comes from the cached user,
+    so the check costs no database query. Async views get request.user
+    resolved up front, so neither they nor their templates touch the lazy
+    synchronous one.
+    """
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def async_wrapper(request, *args, **kwargs):
+                request.user = await request.auser()
+                if not request.user.is_authenticated:
+                    return redirect_to_login(request.get_full_path())
+                if request.user.role != role:
+                    messages.error(request, 'You do not have permission to access this page.')
+                    return redirect(redirect_to)
+                return await view_func(request, *args, **kwargs)
+            return async_wrapper
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.user.role != role:
+                messages.error(request, 'You do not have permission to access this page.')
+                return redirect(redirect_to)
+            return view_func(request, *args, **kwargs)
+        return login_required(wrapper)
+    return decorator
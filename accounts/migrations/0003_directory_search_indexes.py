@@ -0,0 +1,55 @@
+# Generated by Django 5.0 on 2026-10-18 14:09
+
+from django.db import migrations, models
+
+# Columns the employee directory prefix-searches with istartswith
+SEARCH_COLUMNS = ['username', 'first_name', 'last_name', 'employee_id']
+
+
+def create_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        # istartswith compiles to UPPER("col"::text) LIKE UPPER(%s); a trigram
+        # index on that expression serves prefix and substring matches.
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for column in SEARCH_COLUMNS:
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS user_{column}_trgm_idx ON accounts_customuser '
+                f'USING gin (UPPER({column}::text) gin_trgm_ops)'
+            )
+    elif vendor == 'sqlite':
+        # SQLite's LIKE is case-insensitive, so it can only use an index
+        # declared with NOCASE collation.
+        for column in SEARCH_COLUMNS:
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS user_{column}_nocase_idx '
+                f'ON accounts_customuser ({column} COLLATE NOCASE)'
+            )
+
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    suffix = {'postgresql': 'trgm', 'sqlite': 'nocase'}.get(vendor)
+    if suffix:
+        for column in SEARCH_COLUMNS:
+            schema_editor.execute(f'DROP INDEX IF EXISTS user_{column}_{suffix}_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_customuser_role_index'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['role', 'department', 'username'], name='user_role_department_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['role', 'last_name', 'first_name', 'id'], name='user_role_name_idx'),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
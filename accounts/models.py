@@ -1,6 +1,25 @@
-from django.contrib.auth.models import AbstractUser
+from django.conf import settings
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
 
+from .user_cache import invalidate_on_commit
+
+
+class CustomUserQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        """Bulk updates skip post_save, so invalidate the cached users here"""
+        if not settings.AUTH_USER_CACHE:
+            return super().update(**kwargs)
+        user_ids = list(self.values_list('pk', flat=True))
+        rows = super().update(**kwargs)
+        invalidate_on_commit(user_ids)
+        return rows
+
+
+class CustomUserManager(UserManager.from_queryset(CustomUserQuerySet)):
+    pass
+
+
 class CustomUser(AbstractUser):
     """Custom User model with role-based access"""
     ROLE_CHOICES = (
@@ -14,6 +33,15 @@ class CustomUser(AbstractUser):
     phone = models.CharField(max_length=15, blank=True)
     profile_picture = models.ImageField(upload_to='profiles/', null=True, blank=True)
     
+    objects = CustomUserManager()
+    
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=['role', 'username'], name='user_role_username_idx'),
+            models.Index(fields=['role', 'department', 'username'], name='user_role_department_idx'),
+            models.Index(fields=['role', 'last_name', 'first_name', 'id'], name='user_role_name_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.username} ({self.get_role_display()})"
     
@@ -1,3 +1,188 @@
-from django.test import TestCase
+import datetime
+import io
+import os
+import subprocess
+import sys
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.benchmark import SESSION_ENGINES, run_logins
+from core.seeding import OrgSeeder
+from .models import CustomUser
+from .user_cache import user_cache
+
+STOCK_MIDDLEWARE = [
+    'django.contrib.auth.middleware.AuthenticationMiddleware'
+    if path == 'accounts.middleware.CachedAuthenticationMiddleware' else path
+    for path in settings.MIDDLEWARE
+]
+
+PANEL_URLS = [
+    '/employee-panel/',
+    '/employee-panel/work/',
+    '/employee-panel/requests/',
+    '/employee-panel/notices/',
+    '/employee-panel/attendance/',
+]
+
+# Templates are rendered without running collectstatic first
+PLAIN_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+# The tests run in one process, so the locmem default cache is shared enough
+@override_settings(STORAGES=PLAIN_STORAGES, AUTH_USER_CACHE=True)
+class CachedAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('cached', password='pw', role='EMPLOYEE')
+
+    def setUp(self):
+        user_cache.clear()
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def user_queries(self, url, client=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = (client or self.client).get(url)
+        self.assertEqual(response.status_code, 200)
+        # User loads, not pages joining users in for display
+        return [q['sql'] for q in queries.captured_queries if 'FROM "accounts_customuser"' in q['sql']]
+
+    def test_warm_request_does_not_load_user(self):
+        self.user_queries('/employee-panel/')
+        self.assertEqual(self.user_queries('/employee-panel/'), [])
+
+    def test_role_change_invalidates_cached_user(self):
+        self.client.get('/employee-panel/')
+        user = CustomUser.objects.get(pk=self.user.pk)
+        user.role = 'ADMIN'
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        response = self.client.get('/employee-panel/')
+        self.assertRedirects(response, '/admin-panel/', fetch_redirect_response=False)
+
+    def test_queryset_update_invalidates_cached_user(self):
+        self.client.get('/employee-panel/')
+        with self.captureOnCommitCallbacks(execute=True):
+            CustomUser.objects.filter(pk=self.user.pk).update(role='ADMIN')
+        response = self.client.get('/employee-panel/')
+        self.assertRedirects(response, '/admin-panel/', fetch_redirect_response=False)
+
+    def test_bulk_update_invalidates_cached_user(self):
+        self.client.get('/employee-panel/')
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            CustomUser.objects.bulk_update([self.user], ['is_active'])
+        self.assertEqual(self.client.get('/employee-panel/').status_code, 302)
+
+    def test_disabled_without_a_shared_cache(self):
+        self.user_queries('/employee-panel/')
+        with override_settings(AUTH_USER_CACHE=False):
+            self.assertEqual(len(self.user_queries('/employee-panel/')), 1)
+
+    def test_password_change_ends_other_sessions(self):
+        self.client.get('/employee-panel/')
+        user = CustomUser.objects.get(pk=self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            user.set_password('changed')
+            user.save()
+        response = self.client.get('/employee-panel/')
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('/accounts/login/', response['Location'])
+
+    def test_queries_saved_per_request(self):
+        """User-table queries per warm panel request, stock vs cached"""
+        for url in PANEL_URLS:
+            self.user_queries(url)
+        cached = sum(len(self.user_queries(url)) for url in PANEL_URLS)
+
+        with override_settings(MIDDLEWARE=STOCK_MIDDLEWARE):
+            # A fresh client builds its handler with the stock middleware
+            client = Client()
+            client.force_login(self.user)
+            stock = sum(len(self.user_queries(url, client)) for url in PANEL_URLS)
+
+        # The stock middleware loads the user once per request
+        self.assertEqual((stock, cached), (len(PANEL_URLS), 0))
+
+
+# A fast hasher keeps password checks from drowning out the session cost
+@override_settings(STORAGES=PLAIN_STORAGES,
+                   PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class SessionBackendTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('sessions', password='pw', role='EMPLOYEE')
+
+    def setUp(self):
+        user_cache.clear()
+        caches['sessions'].clear()
+
+    def login_then_dashboard(self):
+        client = Client()
+        response = client.post('/accounts/login/', {'username': 'sessions', 'password': 'pw'})
+        self.assertRedirects(response, '/employee-panel/', fetch_redirect_response=False)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(client.get('/employee-panel/').status_code, 200)
+        return [q['sql'] for q in queries.captured_queries if 'django_session' in q['sql']]
+
+    def test_dashboard_skips_session_table(self):
+        for engine in ('cached_db', 'cache', 'signed_cookies'):
+            with self.subTest(engine=engine), \
+                    override_settings(SESSION_ENGINE=f'django.contrib.sessions.backends.{engine}'):
+                self.assertEqual(self.login_then_dashboard(), [])
+
+    def test_cached_db_writes_through(self):
+        with override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db'):
+            self.login_then_dashboard()
+            caches['sessions'].clear()
+            self.assertEqual(Session.objects.count(), 1)
+
+    def test_purge_sessions_in_batches(self):
+        past = timezone.now() - datetime.timedelta(days=1)
+        Session.objects.bulk_create(
+            Session(session_key=f'expired{i:032d}', session_data='', expire_date=past) for i in range(25)
+        )
+        Session.objects.create(session_key='live' + '0' * 32, session_data='',
+                               expire_date=timezone.now() + datetime.timedelta(days=1))
+        with override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db'):
+            call_command('purge_sessions', batch_size=10, stdout=io.StringIO())
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['live' + '0' * 32])
+
+    def test_login_benchmark(self):
+        OrgSeeder(employees=2, work=0, requests=0, notices=0).run()
+        results = run_logins(requests=2, concurrency=1, warmup=0)
+        self.assertEqual([result.name for result in results], SESSION_ENGINES)
+        self.assertTrue(all(len(result.latencies) == 2 for result in results))
+
+    def test_cache_engines_need_a_shared_cache(self):
+        check = 'from django.conf import settings; print(settings.SESSION_ENGINE)'
+        cases = (
+            ('cache', 'locmem', None), ('cached_db', 'locmem', None), ('cached_db', 'fakeredis', None),
+            ('cache', 'file', 'cache'), ('cached_db', 'file', 'cached_db'),
+            ('', 'locmem', 'db'), ('', 'file', 'cached_db'),
+        )
+        for engine, backend, expected in cases:
+            with self.subTest(engine=engine, backend=backend):
+                env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'emp_system.settings', 'CACHE_BACKEND': backend}
+                env.pop('SESSION_BACKEND', None)
+                if engine:
+                    env['SESSION_BACKEND'] = engine
+                result = subprocess.run([sys.executable, '-c', check], env=env, capture_output=True, text=True,
+                                        cwd=settings.BASE_DIR)
+                if expected is None:
+                    self.assertNotEqual(result.returncode, 0)
+                    self.assertIn('ImproperlyConfigured', result.stderr)
+                else:
+                    self.assertEqual(result.returncode, 0, result.stderr)
+                    self.assertEqual(result.stdout.strip(), f'django.contrib.sessions.backends.{expected}')
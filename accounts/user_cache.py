@@ -0,0 +1,116 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.crypto import constant_time_compare
+
+
+def version_key(user_id):
+    return f'auth:user-version:{user_id}'
+
+
+class UserCache:
+    """Per-process LRU of authenticated users with a time-to-live.
+
+    Entries also remember the user's "version" in the default cache at load
+    time; bumping it (see invalidate) makes every process that reads that
+    cache reload the row on its next request instead of waiting for the TTL.
+    That only reaches other processes when the default cache is shared, so
+    the cache is used only when settings.AUTH_USER_CACHE is on.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, user_id, version):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return None
+            expires, cached_version, user = entry
+            if expires < time.monotonic() or cached_version != version:
+                del self.entries[user_id]
+                return None
+            self.entries.move_to_end(user_id)
+            return user
+
+    def set(self, user_id, version, user):
+        with self.lock:
+            self.entries[user_id] = (time.monotonic() + self.ttl, version, user)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def discard(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+user_cache = UserCache(
+    maxsize=getattr(settings, 'AUTH_USER_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'AUTH_USER_CACHE_TTL', 60),
+)
+
+
+def invalidate(*user_ids):
+    """Drop users from this process and bump their versions in the default cache"""
+    version = time.time_ns()
+    for user_id in user_ids:
+        user_cache.discard(user_id)
+    cache.set_many({version_key(user_id): version for user_id in user_ids}, None)
+
+
+def invalidate_on_commit(user_ids):
+    """Invalidate once the surrounding transaction commits, so a reload sees the change"""
+    user_ids = list(user_ids)
+    if user_ids:
+        transaction.on_commit(lambda: invalidate(*user_ids))
+
+
+def get_cached_user(request):
+    """Drop-in for django.contrib.auth.get_user that avoids the user SELECT.
+
+    The session's auth hash is still checked against the cached user, so a
+    password change logs other sessions out as before. Each request gets its
+    own shallow copy so that view code mutating request.user cannot leak
+    into other requests.
+    """
+    if not settings.AUTH_USER_CACHE:
+        return auth.get_user(request)
+    session = request.session
+    try:
+        user_id = auth._get_user_session_key(request)
+        backend_path = session[BACKEND_SESSION_KEY]
+    except KeyError:
+        return AnonymousUser()
+    if backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return AnonymousUser()
+
+    version = cache.get(version_key(user_id), 0)
+    user = user_cache.get(user_id, version)
+    if user is None:
+        user = auth.load_backend(backend_path).get_user(user_id)
+        if user is None:
+            return AnonymousUser()
+        user_cache.set(user_id, version, user)
+
+    session_hash = session.get(HASH_SESSION_KEY)
+    if not (session_hash and constant_time_compare(session_hash, user.get_session_auth_hash())):
+        # Defer to Django for the fallback-key handling and session flush
+        user_cache.discard(user_id)
+        return auth.get_user(request)
+    return copy.copy(user)
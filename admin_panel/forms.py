@@ -1,6 +1,23 @@
+import codecs
+import csv
+
 from django import forms
+from django.conf import settings
+from django.db.models import Q
+from django.db import transaction
+from django.utils import timezone
 from accounts.models import CustomUser
 from core.models import Employee, Notice, Attendance, Work, Request
+from core.assignment import suggest_assignees
+from core.exports import EXPORTS
+from core.hours import compute_hours
+from core.kiosk import insert_missing_attendance
+from core.stats import rebuild_stats
+
+def department_choices(empty_label):
+    departments = (CustomUser.objects.filter(role='EMPLOYEE').exclude(department='')
+                   .order_by('department').values_list('department', flat=True).distinct())
+    return [('', empty_label)] + [(department, department) for department in departments]
 
 class EmployeeForm(forms.ModelForm):
     """Employee creation/update form"""
@@ -30,6 +47,89 @@ class EmployeeForm(forms.ModelForm):
             user.save()
         return user
 
+class EmployeeFilterForm(forms.Form):
+    """Query-string filters, prefix search and sort order for the employee directory"""
+    SORT_ORDERINGS = {
+        'username': ['username'],
+        'name': ['last_name', 'first_name'],
+        'department': ['department', 'username'],
+    }
+    SORT_CHOICES = (
+        ('username', 'Username'),
+        ('name', 'Name'),
+        ('department', 'Department'),
+    )
+    
+    q = forms.CharField(required=False, max_length=100,
+                        widget=forms.TextInput(attrs={'placeholder': 'Name, username or employee ID'}))
+    department = forms.ChoiceField(required=False)
+    status = forms.ChoiceField(required=False, choices=(('', 'Any status'),) + Employee.STATUS_CHOICES)
+    position = forms.ChoiceField(required=False)
+    hired_from = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    hired_to = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    sort = forms.ChoiceField(required=False, choices=SORT_CHOICES)
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['department'].choices = department_choices('All departments')
+        positions = (Employee.objects.exclude(position='').order_by('position')
+                     .values_list('position', flat=True).distinct())
+        self.fields['position'].choices = [('', 'All positions')] + [(p, p) for p in positions]
+        for field in self.fields:
+            self.fields[field].widget.attrs.update({'class': 'form-control'})
+    
+    def filter(self, queryset):
+        """Apply the submitted filters to a CustomUser queryset"""
+        data = self.cleaned_data if self.is_valid() else {}
+        # Every search word has to prefix-match one of the indexed columns
+        for term in (data.get('q') or '').split():
+            queryset = queryset.filter(
+                Q(username__istartswith=term) | Q(first_name__istartswith=term) |
+                Q(last_name__istartswith=term) | Q(employee_id__istartswith=term)
+            )
+        if data.get('department'):
+            queryset = queryset.filter(department=data['department'])
+        if data.get('status'):
+            queryset = queryset.filter(employee__status=data['status'])
+        if data.get('position'):
+            queryset = queryset.filter(employee__position=data['position'])
+        if data.get('hired_from'):
+            queryset = queryset.filter(employee__hire_date__gte=data['hired_from'])
+        if data.get('hired_to'):
+            queryset = queryset.filter(employee__hire_date__lte=data['hired_to'])
+        return queryset
+    
+    def ordering(self):
+        sort = self.cleaned_data.get('sort') if self.is_valid() else None
+        return self.SORT_ORDERINGS[sort or 'username']
+
+class EmployeeImportForm(forms.Form):
+    """CSV upload for bulk employee creation"""
+    csv_file = forms.FileField()
+    dry_run = forms.BooleanField(required=False, initial=True,
+                                 help_text='Only validate the file, do not create anyone')
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['csv_file'].widget.attrs.update({'class': 'form-control', 'accept': '.csv'})
+
+    def clean_csv_file(self):
+        csv_file = self.cleaned_data['csv_file']
+        rows = -1  # not counting the header
+        try:
+            for _ in csv.reader(codecs.iterdecode(csv_file, 'utf-8-sig')):
+                rows += 1
+        except UnicodeDecodeError:
+            raise forms.ValidationError('The file is not UTF-8 encoded text.')
+        except csv.Error as error:
+            raise forms.ValidationError(f'The file is not valid CSV: {error}')
+        if rows > settings.EMPLOYEE_IMPORT_MAX_ROWS:
+            raise forms.ValidationError(
+                f'The file has {rows} rows; up to {settings.EMPLOYEE_IMPORT_MAX_ROWS} can be imported here. '
+                f'Import larger files with "python manage.py import_employees".')
+        csv_file.seek(0)
+        return csv_file
+
 class NoticeForm(forms.ModelForm):
     """Notice form"""
     class Meta:
@@ -63,6 +163,121 @@ class AttendanceForm(forms.ModelForm):
         for field in self.fields:
             self.fields[field].widget.attrs.update({'class': 'form-control'})
 
+class BulkAttendanceForm(forms.Form):
+    """Mark attendance for a whole department (or every employee) on one date"""
+    date = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
+    department = forms.ChoiceField(required=False)
+    status = forms.ChoiceField(choices=Attendance.STATUS_CHOICES, initial='PRESENT')
+    check_in = forms.TimeField(required=False, widget=forms.TimeInput(attrs={'type': 'time'}))
+    check_out = forms.TimeField(required=False, widget=forms.TimeInput(attrs={'type': 'time'}))
+    notes = forms.CharField(required=False, widget=forms.Textarea(attrs={'rows': 3}))
+    overwrite = forms.BooleanField(required=False,
+                                   help_text='Replace records that already exist for this date')
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['department'].choices = department_choices('All employees')
+        for field in self.fields:
+            if field != 'overwrite':
+                self.fields[field].widget.attrs.update({'class': 'form-control'})
+    
+    def employees(self):
+        employees = CustomUser.objects.filter(role='EMPLOYEE')
+        if self.cleaned_data.get('department'):
+            employees = employees.filter(department=self.cleaned_data['department'])
+        return employees
+    
+    def save(self):
+        """Write one row per employee in a single transaction.
+        
+        Returns ``(written, conflicts)`` where ``conflicts`` lists the
+        employees that already had a record for the date and were left
+        untouched (always empty when ``overwrite`` is set). That includes
+        records another request inserted while this one ran.
+        """
+        data = self.cleaned_data
+        employees = list(self.employees().values_list('pk', 'username', 'first_name', 'last_name'))
+        rows = [
+            Attendance(employee_id=pk, date=data['date'], status=data['status'],
+                       check_in=data['check_in'], check_out=data['check_out'], notes=data['notes'])
+            for pk, _, _, _ in employees
+        ]
+        
+        with transaction.atomic():
+            if data['overwrite']:
+                Attendance.objects.bulk_create(
+                    rows, batch_size=500, update_conflicts=True,
+                    unique_fields=['employee', 'date'],
+                    update_fields=['status', 'check_in', 'check_out', 'notes'],
+                )
+                written = {row.employee_id for row in rows}
+            else:
+                written = insert_missing_attendance(rows)
+            # bulk writes skip the signals that keep EmployeeStats and
+            # WorkingHours in step
+            rebuild_stats(sorted(written))
+            compute_hours(data['date'], data['date'], sorted(written))
+        
+        conflicts = [f'{first} {last}'.strip() or username
+                     for pk, username, first, last in employees if pk not in written]
+        return len(written), conflicts
+
+class AttendanceMatrixForm(forms.Form):
+    """Month and department for the attendance matrix report"""
+    month = forms.DateField(input_formats=['%Y-%m'], required=False,
+                            widget=forms.DateInput(format='%Y-%m', attrs={'type': 'month'}))
+    department = forms.ChoiceField(required=False)
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['department'].choices = department_choices('All departments')
+        for field in self.fields:
+            self.fields[field].widget.attrs.update({'class': 'form-control'})
+    
+    def selected(self):
+        """(first day of the month, department or None); this month by default"""
+        data = self.cleaned_data if self.is_valid() else {}
+        month = data.get('month') or timezone.localdate().replace(day=1)
+        return month, data.get('department') or None
+
+class ExportForm(forms.Form):
+    """Filters for the attendance/work/request exports"""
+    FORMAT_CHOICES = (
+        ('csv', 'CSV'),
+        ('xlsx', 'Excel (.xlsx)'),
+    )
+    
+    kind = forms.ChoiceField(choices=[(kind, kind.title()) for kind in EXPORTS])
+    format = forms.ChoiceField(choices=FORMAT_CHOICES, initial='csv')
+    start = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    end = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    department = forms.CharField(required=False)
+    status = forms.CharField(required=False)
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for field in self.fields:
+            self.fields[field].widget.attrs.update({'class': 'form-control'})
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        kind, status = cleaned_data.get('kind'), cleaned_data.get('status')
+        if kind and status:
+            model = EXPORTS[kind][0]
+            valid = dict(getattr(model, 'STATUS_CHOICES', ()))
+            if not valid:
+                self.add_error('status', f"{kind.title()} exports cannot be filtered by status")
+            elif status not in valid:
+                self.add_error('status', f"Status must be one of: {', '.join(valid)}")
+        start, end = cleaned_data.get('start'), cleaned_data.get('end')
+        if start and end and start > end:
+            self.add_error('end', 'End date must be on or after the start date')
+        return cleaned_data
+    
+    def filters(self):
+        return {name: self.cleaned_data[name] or None
+                for name in ('start', 'end', 'department', 'status')}
+
 class WorkForm(forms.ModelForm):
     """Work assignment form"""
     class Meta:
@@ -73,12 +288,39 @@ class WorkForm(forms.ModelForm):
             'description': forms.Textarea(attrs={'rows': 4}),
         }
     
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, department='', **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['assigned_to'].queryset = CustomUser.objects.filter(role='EMPLOYEE')
+        assigned_to = self.fields['assigned_to']
+        assigned_to.queryset = CustomUser.objects.filter(role='EMPLOYEE')
+        # The least-loaded employees available today, listed first; a
+        # submitted form only needs validating
+        self.suggestions = [] if self.is_bound else suggest_assignees(department)
+        if self.suggestions:
+            everyone = list(iter(assigned_to.choices))
+            assigned_to.choices = [
+                everyone[0],
+                (f'Suggested ({department or "all departments"})',
+                 [(user.pk, f'{user.get_full_name() or user.username} - load {user.work_load}')
+                  for user in self.suggestions]),
+                ('All employees', everyone[1:]),
+            ]
         for field in self.fields:
             self.fields[field].widget.attrs.update({'class': 'form-control'})
 
+class AssigneeFilterForm(forms.Form):
+    """Department whose employees the work form suggests"""
+    department = forms.ChoiceField(required=False)
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['department'].choices = department_choices('All departments')
+        self.fields['department'].widget.attrs.update({'class': 'form-control'})
+    
+    def selected_department(self):
+        if self.is_valid():
+            return self.cleaned_data['department']
+        return ''
+
 class RequestResponseForm(forms.ModelForm):
     """Request response form"""
     class Meta:
@@ -1,3 +1,129 @@
-from django.test import TestCase
+import datetime
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from core.models import Attendance, Employee, EmployeeStats, WorkingHours
+from core.benchmark import BENCHMARK_SETTINGS
+from .forms import BulkAttendanceForm, EmployeeFilterForm
+
+
+class EmployeeFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user('filter_admin', password='pw', role='ADMIN')
+        cls.people = {}
+        for username, first, last, employee_id, department, position, status, hired in [
+            ('amartin', 'Anna', 'Martin', 'S-001', 'Sales', 'Clerk', 'ACTIVE', datetime.date(2020, 1, 1)),
+            ('bjones', 'Bob', 'Jones', 'S-002', 'Sales', 'Manager', 'ON_LEAVE', datetime.date(2021, 6, 1)),
+            ('cmartinez', 'Carla', 'Martinez', 'T-001', 'Support', 'Clerk', 'ACTIVE', datetime.date(2023, 3, 1)),
+        ]:
+            user = CustomUser.objects.create_user(username, password='pw', role='EMPLOYEE', first_name=first,
+                                                  last_name=last, employee_id=employee_id, department=department)
+            Employee.objects.create(user=user, hire_date=hired, position=position, salary=1000, status=status)
+            cls.people[username] = user
+
+    def usernames(self, **data):
+        form = EmployeeFilterForm(data)
+        queryset = form.filter(CustomUser.objects.filter(role='EMPLOYEE')).order_by(*form.ordering())
+        return list(queryset.values_list('username', flat=True))
+
+    def test_search_is_case_insensitive_prefix(self):
+        self.assertEqual(self.usernames(q='MART'), ['amartin', 'cmartinez'])
+        self.assertEqual(self.usernames(q='s-00'), ['amartin', 'bjones'])
+        self.assertEqual(self.usernames(q='bo'), ['bjones'])
+        # Prefixes only: "artin" is inside "Martin" but starts no column
+        self.assertEqual(self.usernames(q='artin'), [])
+
+    def test_every_word_has_to_match(self):
+        self.assertEqual(self.usernames(q='anna martin'), ['amartin'])
+        self.assertEqual(self.usernames(q='carla jones'), [])
+
+    def test_filters(self):
+        self.assertEqual(self.usernames(department='Sales'), ['amartin', 'bjones'])
+        self.assertEqual(self.usernames(status='ON_LEAVE'), ['bjones'])
+        self.assertEqual(self.usernames(position='Clerk'), ['amartin', 'cmartinez'])
+        self.assertEqual(self.usernames(hired_from='2021-01-01', hired_to='2022-12-31'), ['bjones'])
+        self.assertEqual(self.usernames(q='mart', department='Support', position='Clerk'), ['cmartinez'])
+
+    def test_sort(self):
+        self.assertEqual(self.usernames(sort='name'), ['bjones', 'amartin', 'cmartinez'])
+        self.assertEqual(self.usernames(sort='department'), ['amartin', 'bjones', 'cmartinez'])
+
+    def test_invalid_input_is_ignored(self):
+        self.assertEqual(self.usernames(sort='password', status='RETIRED'), ['amartin', 'bjones', 'cmartinez'])
+
+    @override_settings(STORAGES=BENCHMARK_SETTINGS['STORAGES'])
+    def test_directory_page(self):
+        self.client.force_login(self.admin)
+        response = self.client.get('/admin-panel/employees/', {'q': 'martin', 'sort': 'name'})
+        self.assertEqual([user.username for user in response.context['employees']], ['amartin', 'cmartinez'])
+
+
+class BulkAttendanceTests(TestCase):
+    DAY = datetime.date(2024, 3, 4)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sales = [CustomUser.objects.create_user(f'bulk{n}', password='pw', role='EMPLOYEE', department='Sales')
+                     for n in range(3)]
+        cls.support = CustomUser.objects.create_user('bulk_support', password='pw', role='EMPLOYEE',
+                                                     department='Support')
+
+    def mark(self, **data):
+        form = BulkAttendanceForm({'date': self.DAY, 'status': 'PRESENT', **data})
+        self.assertTrue(form.is_valid(), form.errors)
+        return form.save()
+
+    def test_marks_a_department(self):
+        written, conflicts = self.mark(department='Sales', check_in='09:00')
+        self.assertEqual((written, conflicts), (3, []))
+        self.assertEqual(Attendance.objects.filter(date=self.DAY).count(), 3)
+        self.assertFalse(Attendance.objects.filter(employee=self.support).exists())
+
+    def test_existing_records_are_skipped_and_reported(self):
+        Attendance.objects.create(employee=self.sales[0], date=self.DAY, status='LEAVE')
+        written, conflicts = self.mark(department='Sales')
+        self.assertEqual((written, conflicts), (2, ['bulk0']))
+        self.assertEqual(Attendance.objects.get(employee=self.sales[0], date=self.DAY).status, 'LEAVE')
+
+    def test_rows_lost_to_a_concurrent_insert_are_reported(self):
+        form = BulkAttendanceForm({'date': self.DAY, 'status': 'PRESENT', 'department': 'Sales'})
+        self.assertTrue(form.is_valid())
+        employees = form.employees
+
+        def employees_then_race():
+            # Another request marks bulk1 between the read and the insert
+            Attendance.objects.create(employee=self.sales[1], date=self.DAY, status='ABSENT')
+            return employees()
+
+        form.employees = employees_then_race
+        written, conflicts = form.save()
+        self.assertEqual((written, conflicts), (2, ['bulk1']))
+        self.assertEqual(Attendance.objects.get(employee=self.sales[1], date=self.DAY).status, 'ABSENT')
+
+    def test_overwrite(self):
+        Attendance.objects.create(employee=self.sales[0], date=self.DAY, status='LEAVE')
+        written, conflicts = self.mark(department='Sales', status='ABSENT', overwrite='on')
+        self.assertEqual((written, conflicts), (3, []))
+        self.assertEqual(set(Attendance.objects.filter(date=self.DAY).values_list('status', flat=True)), {'ABSENT'})
+
+    def test_working_hours_are_recomputed(self):
+        Attendance.objects.create(employee=self.sales[0], date=self.DAY, status='LEAVE')
+        self.mark(department='Sales', check_in='09:00', check_out='13:00')
+        hours = WorkingHours.objects.filter(week_start=self.DAY)
+        self.assertEqual(set(hours.values_list('employee__username', 'worked_minutes')),
+                         {('bulk1', 240), ('bulk2', 240)})
+
+        self.mark(department='Sales', check_in='09:00', check_out='12:00', overwrite='on')
+        self.assertEqual(set(hours.values_list('employee__username', 'worked_minutes')),
+                         {('bulk0', 180), ('bulk1', 180), ('bulk2', 180)})
+
+    def test_thousand_employees(self):
+        """Marking 1,000 employees writes every row and its stats"""
+        CustomUser.objects.bulk_create(
+            CustomUser(username=f'bulk_many{n}', role='EMPLOYEE', department='Field') for n in range(1000))
+        written, conflicts = self.mark(date=timezone.localdate(), department='Field')
+        self.assertEqual((written, conflicts), (1000, []))
+        self.assertEqual(EmployeeStats.objects.filter(user__department='Field', attendance_present=1).count(), 1000)
@@ -9,6 +9,7 @@ urlpatterns = [
     # Employee Management
     path('employees/', views.employee_list, name='employee_list'),
     path('employees/add/', views.employee_add, name='employee_add'),
+    path('employees/import/', views.employee_import, name='employee_import'),
     path('employees/edit/<int:pk>/', views.employee_edit, name='employee_edit'),
     path('employees/delete/<int:pk>/', views.employee_delete, name='employee_delete'),
     
@@ -21,13 +22,19 @@ urlpatterns = [
     # Attendance Management
     path('attendance/', views.attendance_list, name='attendance_list'),
     path('attendance/add/', views.attendance_add, name='attendance_add'),
+    path('attendance/bulk/', views.attendance_bulk, name='attendance_bulk'),
+    path('attendance/matrix/', views.attendance_matrix, name='attendance_matrix'),
     path('attendance/edit/<int:pk>/', views.attendance_edit, name='attendance_edit'),
     
     # Work Management
     path('work/', views.work_list, name='work_list'),
     path('work/create/', views.work_create, name='work_create'),
+    path('work/overdue/', views.work_overdue, name='work_overdue'),
     
     # Request Management
     path('requests/', views.request_list, name='request_list'),
     path('requests/respond/<int:pk>/', views.request_respond, name='request_respond'),
+    
+    # Exports
+    path('export/', views.export_data, name='export'),
 ]
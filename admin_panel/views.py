@@ -1,38 +1,35 @@
+import codecs
+
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth.decorators import login_required
+from django.http import StreamingHttpResponse
 from django.contrib import messages
 from django.utils import timezone
 from django.db.models import Q, Count
+from accounts.decorators import role_required
 from accounts.models import CustomUser
 from core.models import Employee, Notice, Attendance, Work, Request
-from .forms import (EmployeeForm, NoticeForm, AttendanceForm, 
-                    WorkForm, RequestResponseForm)
+from core.counters import admin_counters
+from core.exports import export_rows, csv_stream, xlsx_stream
+from core.importers import EmployeeImporter
+from core.pagination import paginate
+from core.reports import AttendanceMatrix
+from core.workqueue import overdue_queue
+from .forms import (EmployeeForm, EmployeeFilterForm, EmployeeImportForm, NoticeForm,
+                    AttendanceForm, BulkAttendanceForm, AttendanceMatrixForm, ExportForm,
+                    WorkForm, AssigneeFilterForm, RequestResponseForm)
 
-def admin_required(view_func):
-    """Decorator to check if user is admin"""
-    def wrapper(request, *args, **kwargs):
-        if not request.user.is_admin():
-            messages.error(request, 'You do not have permission to access this page.')
-            return redirect('employee_panel:dashboard')
-        return view_func(request, *args, **kwargs)
-    return login_required(wrapper)
+# Decorator to check if user is admin
+admin_required = role_required('ADMIN', redirect_to='employee_panel:dashboard')
 
 @admin_required
 def admin_dashboard(request):
     """Admin dashboard view"""
-    total_employees = CustomUser.objects.filter(role='EMPLOYEE').count()
-    total_notices = Notice.objects.filter(is_active=True).count()
-    pending_requests = Request.objects.filter(status='PENDING').count()
-    active_work = Work.objects.filter(status__in=['PENDING', 'IN_PROGRESS']).count()
-    
-    recent_requests = Request.objects.all()[:5]
-    recent_work = Work.objects.all()[:5]
+    recent_requests = Request.objects.select_related('employee')[:5]
+    recent_work = Work.objects.select_related('assigned_to')[:5]
     
     context = {
-        'total_employees': total_employees,
-        'total_notices': total_notices,
-        'pending_requests': pending_requests,
-        'active_work': active_work,
+        **admin_counters(),
         'recent_requests': recent_requests,
         'recent_work': recent_work,
     }
@@ -41,9 +38,14 @@ def admin_dashboard(request):
 # Employee Management Views
 @admin_required
 def employee_list(request):
-    """List all employees"""
-    employees = CustomUser.objects.filter(role='EMPLOYEE')
-    return render(request, 'admin_panel/employee_list.html', {'employees': employees})
+    """List, search and filter employees"""
+    filter_form = EmployeeFilterForm(request.GET)
+    employees = filter_form.filter(CustomUser.objects.filter(role='EMPLOYEE')).only(
+        'employee_id', 'username', 'first_name', 'last_name', 'email', 'department', 'phone'
+    )
+    page = paginate(request, employees, ordering=filter_form.ordering())
+    return render(request, 'admin_panel/employee_list.html',
+                  {'employees': page, 'page': page, 'filter_form': filter_form})
 
 @admin_required
 def employee_add(request):
@@ -59,6 +61,26 @@ def employee_add(request):
     
     return render(request, 'admin_panel/employee_form.html', {'form': form, 'action': 'Add'})
 
+@admin_required
+def employee_import(request):
+    """Create employees in bulk from an uploaded CSV file"""
+    result = None
+    if request.method == 'POST':
+        form = EmployeeImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            dry_run = form.cleaned_data['dry_run']
+            lines = codecs.iterdecode(form.cleaned_data['csv_file'], 'utf-8-sig')
+            result = EmployeeImporter(dry_run=dry_run).run(lines)
+            if result.created and not dry_run:
+                messages.success(request, f'{result.created} employees imported successfully!')
+                if not result.errors:
+                    return redirect('admin_panel:employee_list')
+    else:
+        form = EmployeeImportForm()
+    
+    return render(request, 'admin_panel/employee_import.html',
+                  {'form': form, 'result': result, 'max_rows': settings.EMPLOYEE_IMPORT_MAX_ROWS})
+
 @admin_required
 def employee_edit(request, pk):
     """Edit employee details"""
@@ -92,8 +114,9 @@ def employee_delete(request, pk):
 @admin_required
 def notice_list(request):
     """List all notices"""
-    notices = Notice.objects.all()
-    return render(request, 'admin_panel/notice_list.html', {'notices': notices})
+    notices = Notice.objects.only('title', 'published_date', 'is_active')
+    page = paginate(request, notices)
+    return render(request, 'admin_panel/notice_list.html', {'notices': page, 'page': page})
 
 @admin_required
 def notice_create(request):
@@ -143,8 +166,12 @@ def notice_delete(request, pk):
 @admin_required
 def attendance_list(request):
     """List all attendance records"""
-    attendance_records = Attendance.objects.all()
-    return render(request, 'admin_panel/attendance_list.html', {'attendance_records': attendance_records})
+    attendance_records = Attendance.objects.select_related('employee').only(
+        'date', 'check_in', 'check_out', 'status',
+        'employee__first_name', 'employee__last_name',
+    )
+    page = paginate(request, attendance_records)
+    return render(request, 'admin_panel/attendance_list.html', {'attendance_records': page, 'page': page})
 
 @admin_required
 def attendance_add(request):
@@ -160,6 +187,32 @@ def attendance_add(request):
     
     return render(request, 'admin_panel/attendance_form.html', {'form': form, 'action': 'Add'})
 
+@admin_required
+def attendance_bulk(request):
+    """Mark attendance for a department in one submission"""
+    if request.method == 'POST':
+        form = BulkAttendanceForm(request.POST)
+        if form.is_valid():
+            written, conflicts = form.save()
+            messages.success(request, f'Attendance saved for {written} employees.')
+            if conflicts:
+                shown = ', '.join(conflicts[:20])
+                more = f' and {len(conflicts) - 20} more' if len(conflicts) > 20 else ''
+                messages.warning(request, f'Skipped {len(conflicts)} existing records: {shown}{more}')
+            return redirect('admin_panel:attendance_list')
+    else:
+        form = BulkAttendanceForm()
+    
+    return render(request, 'admin_panel/attendance_bulk.html', {'form': form})
+
+@admin_required
+def attendance_matrix(request):
+    """Employee-by-day attendance grid with monthly totals"""
+    form = AttendanceMatrixForm(request.GET or None)
+    month, department = form.selected()
+    matrix = AttendanceMatrix(month, department).build()
+    return render(request, 'admin_panel/attendance_matrix.html', {'form': form, 'matrix': matrix})
+
 @admin_required
 def attendance_edit(request, pk):
     """Edit attendance record"""
@@ -180,14 +233,26 @@ def attendance_edit(request, pk):
 @admin_required
 def work_list(request):
     """List all work assignments"""
-    works = Work.objects.all()
-    return render(request, 'admin_panel/work_list.html', {'works': works})
+    works = Work.objects.select_related('assigned_to').only(
+        'title', 'assigned_date', 'due_date', 'priority', 'status',
+        'assigned_to__first_name', 'assigned_to__last_name',
+    )
+    page = paginate(request, works)
+    return render(request, 'admin_panel/work_list.html', {'works': page, 'page': page})
+
+@admin_required
+def work_overdue(request):
+    """Overdue open work across the organisation, most pressing first"""
+    page = paginate(request, overdue_queue())
+    return render(request, 'admin_panel/work_overdue.html', {'works': page, 'page': page})
 
 @admin_required
 def work_create(request):
-    """Create new work assignment"""
+    """Create new work assignment, suggesting the least-loaded employees"""
+    filter_form = AssigneeFilterForm(request.GET)
+    department = filter_form.selected_department()
     if request.method == 'POST':
-        form = WorkForm(request.POST)
+        form = WorkForm(request.POST, department=department)
         if form.is_valid():
             work = form.save(commit=False)
             work.assigned_by = request.user
@@ -195,16 +260,21 @@ def work_create(request):
             messages.success(request, 'Work assigned successfully!')
             return redirect('admin_panel:work_list')
     else:
-        form = WorkForm()
+        form = WorkForm(department=department)
     
-    return render(request, 'admin_panel/work_form.html', {'form': form, 'action': 'Create'})
+    return render(request, 'admin_panel/work_form.html',
+                  {'form': form, 'action': 'Create', 'filter_form': filter_form})
 
 # Request Management Views
 @admin_required
 def request_list(request):
     """List all employee requests"""
-    requests = Request.objects.all()
-    return render(request, 'admin_panel/request_list.html', {'requests': requests})
+    requests = Request.objects.select_related('employee').only(
+        'request_type', 'subject', 'submitted_date', 'status',
+        'employee__first_name', 'employee__last_name',
+    )
+    page = paginate(request, requests)
+    return render(request, 'admin_panel/request_list.html', {'requests': page, 'page': page})
 
 @admin_required
 def request_respond(request, pk):
@@ -223,3 +293,24 @@ def request_respond(request, pk):
         form = RequestResponseForm(instance=req)
     
     return render(request, 'admin_panel/request_respond.html', {'form': form, 'request': req})
+
+# Export Views
+@admin_required
+def export_data(request):
+    """Stream attendance, work or request records as CSV or XLSX"""
+    form = ExportForm(request.GET or None)
+    if not form.is_valid():
+        return render(request, 'admin_panel/export_form.html', {'form': form})
+    
+    kind = form.cleaned_data['kind']
+    rows = export_rows(kind, **form.filters())
+    if form.cleaned_data['format'] == 'xlsx':
+        response = StreamingHttpResponse(
+            xlsx_stream(rows),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
+    else:
+        response = StreamingHttpResponse(csv_stream(rows), content_type='text/csv')
+    filename = f"{kind}-{timezone.localdate():%Y%m%d}.{form.cleaned_data['format']}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
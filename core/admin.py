@@ -1,8 +1,14 @@
 from django.contrib import admin
-from .models import Employee, Notice, Attendance, Work, Request
+from .models import (Employee, Notice, Attendance, Work, Request, EmployeeStats, SearchDocument, WorkingHours,
+                     OutboxMessage, Notification)
 
 admin.site.register(Employee)
 admin.site.register(Notice)
 admin.site.register(Attendance)
 admin.site.register(Work)
 admin.site.register(Request)
+admin.site.register(EmployeeStats)
+admin.site.register(SearchDocument)
+admin.site.register(WorkingHours)
+admin.site.register(OutboxMessage)
+admin.site.register(Notification)
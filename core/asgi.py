@@ -0,0 +1,24 @@
+from django.core.handlers.asgi import ASGIHandler as BaseASGIHandler
+from django.urls import reverse
+from django.utils.functional import cached_property
+
+
+class ASGIHandler(BaseASGIHandler):
+    """Django's ASGI handler, without a thread for each event stream.
+
+    Django gives every request a thread of its own for the synchronous
+    parts (most middleware, signal receivers) and keeps it until the
+    response ends. An /events/ response lasts as long as the browser tab,
+    so those requests share asgiref's single sync thread instead; all they
+    do on it is look up the session and the cached user.
+    """
+
+    @cached_property
+    def events_path(self):
+        return reverse('events')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == self.events_path:
+            await self.handle(scope, receive, send)
+        else:
+            await super().__call__(scope, receive, send)
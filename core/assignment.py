@@ -0,0 +1,51 @@
+"""Suggested assignees for new work.
+
+Each employee's EmployeeStats row carries ``work_load``: the sum of
+core.workqueue's load over their open work, kept in step by signals and
+computed for one day (``load_date``), since loads grow as due dates near.
+Rows also copy the user's department, and are indexed by (department,
+load_date, work_load), so ranking a department reads that index in load
+order and stops after the first few employees who are available today
+(not absent or on leave): the cost does not grow with the department.
+
+Rows computed for another day are rebuilt before ranking, at most
+ASSIGNMENT_REBUILD_LIMIT per call and the lowest stale loads first; the
+rest are left out of the ranking until later calls reach them. A nightly
+``rebuild_employee_stats`` keeps this off the request path altogether.
+"""
+from django.conf import settings
+from django.db.models import F, FilteredRelation, Q
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from .models import EmployeeStats
+from .stats import rebuild_stats
+
+AVAILABLE_STATUSES = ['PRESENT', 'HALF_DAY']
+
+
+def suggest_assignees(department=None, limit=None, today=None):
+    """The least-loaded available employees, with ``work_load`` and ``today_status``.
+
+    ``today_status`` is None for employees who have not checked in yet;
+    they count as available. With no ``department`` every employee is
+    considered.
+    """
+    today = today or timezone.localdate()
+    stats = EmployeeStats.objects.all()
+    if department:
+        stats = stats.filter(department=department)
+    stale = stats.filter(Q(load_date__isnull=True) | Q(load_date__lt=today) | Q(load_date__gt=today))
+    stale_ids = list(stale.order_by('work_load', 'user').values_list('user_id', flat=True)
+                     [:settings.ASSIGNMENT_REBUILD_LIMIT])
+    if stale_ids:
+        rebuild_stats(stale_ids, today)
+
+    users = CustomUser.objects.filter(role='EMPLOYEE', is_active=True, stats__load_date=today)
+    if department:
+        users = users.filter(stats__department=department)
+    return list(users
+                .annotate(today=FilteredRelation('attendance', condition=Q(attendance__date=today)))
+                .filter(Q(today__isnull=True) | Q(today__status__in=AVAILABLE_STATUSES))
+                .annotate(work_load=F('stats__work_load'), today_status=F('today__status'))
+                .order_by('stats__work_load', 'stats__user')[:limit or settings.ASSIGNMENT_SUGGESTIONS])
@@ -0,0 +1,466 @@
+"""Drive the panel views with concurrent in-process clients and measure them.
+
+Used by the ``benchmark`` management command and by the panel tests, which
+check query counts against the stored baseline. ``run_deployments`` instead
+compares the two ways of serving the site, through Django's WSGI handler
+and through its ASGI one, and ``run_logins`` compares the session engines.
+"""
+import asyncio
+import gc
+import io
+import json
+import math
+import os
+import re
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connections
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from accounts.models import CustomUser
+from .asgi import ASGIHandler
+from .models import Notice, Attendance, Work, Request
+from .seeding import SEED_PASSWORD
+
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, 'benchmarks', 'baseline.json')
+
+# Settings a run needs regardless of the environment: uncollected static
+# files, and profiling on (query counts come from Server-Timing) but silent.
+BENCHMARK_SETTINGS = {
+    'STORAGES': {
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    },
+    'PROFILING_ENABLED': True,
+    'PROFILING_QUERY_BUDGET': 10 ** 6,
+    'PROFILING_TIME_BUDGET_MS': 10 ** 9,
+    'PROFILING_SLOW_QUERY_MS': 10 ** 9,
+    # Every request is served by this one process, so its cache is shared
+    'SHARED_CACHE': True,
+    'AUTH_USER_CACHE': True,
+    'SESSION_ENGINE': 'django.contrib.sessions.backends.cached_db',
+    'DASHBOARD_COUNTER_TIMEOUT': 300,
+}
+
+
+class Scenario:
+    """A GET of one named URL as a user with ``role``.
+
+    ``target`` is ``(model, owner field)`` for URLs that take a primary key;
+    employees are given a row they own, admins any row.
+    """
+
+    def __init__(self, url_name, role, target=None):
+        self.url_name = url_name
+        self.role = role
+        self.target = target
+
+    def url(self, user):
+        if self.target is None:
+            return reverse(self.url_name)
+        model, owner = self.target
+        rows = model.objects.order_by('pk')
+        if self.role == 'EMPLOYEE':
+            rows = rows.filter(**{owner: user})
+        elif model is CustomUser:
+            rows = rows.filter(role='EMPLOYEE')
+        pk = rows.values_list('pk', flat=True).first()
+        return reverse(self.url_name, args=[pk]) if pk is not None else None
+
+
+SCENARIOS = [
+    Scenario('admin_panel:dashboard', 'ADMIN'),
+    Scenario('admin_panel:employee_list', 'ADMIN'),
+    Scenario('admin_panel:employee_add', 'ADMIN'),
+    Scenario('admin_panel:employee_edit', 'ADMIN', (CustomUser, None)),
+    Scenario('admin_panel:notice_list', 'ADMIN'),
+    Scenario('admin_panel:notice_edit', 'ADMIN', (Notice, None)),
+    Scenario('admin_panel:attendance_list', 'ADMIN'),
+    Scenario('admin_panel:attendance_add', 'ADMIN'),
+    Scenario('admin_panel:attendance_matrix', 'ADMIN'),
+    Scenario('admin_panel:attendance_edit', 'ADMIN', (Attendance, None)),
+    Scenario('admin_panel:work_list', 'ADMIN'),
+    Scenario('admin_panel:work_create', 'ADMIN'),
+    Scenario('admin_panel:work_overdue', 'ADMIN'),
+    Scenario('admin_panel:request_list', 'ADMIN'),
+    Scenario('admin_panel:request_respond', 'ADMIN', (Request, None)),
+    Scenario('employee_panel:dashboard', 'EMPLOYEE'),
+    Scenario('employee_panel:work_list', 'EMPLOYEE'),
+    Scenario('employee_panel:work_queue', 'EMPLOYEE'),
+    Scenario('employee_panel:work_detail', 'EMPLOYEE', (Work, 'assigned_to')),
+    Scenario('employee_panel:request_list', 'EMPLOYEE'),
+    Scenario('employee_panel:request_create', 'EMPLOYEE'),
+    Scenario('employee_panel:request_detail', 'EMPLOYEE', (Request, 'employee')),
+    Scenario('employee_panel:notice_list', 'EMPLOYEE'),
+    Scenario('employee_panel:attendance_view', 'EMPLOYEE'),
+]
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+class ViewResult:
+    def __init__(self, name, latencies, queries, wall_time):
+        self.name = name
+        self.latencies = sorted(latencies)
+        self.queries = sorted(queries)
+        self.wall_time = wall_time
+
+    @property
+    def throughput(self):
+        return len(self.latencies) / self.wall_time
+
+    def as_dict(self):
+        return {
+            'requests': len(self.latencies),
+            'throughput': round(self.throughput, 1),
+            'p50': round(percentile(self.latencies, 50) * 1000, 2),
+            'p95': round(percentile(self.latencies, 95) * 1000, 2),
+            'p99': round(percentile(self.latencies, 99) * 1000, 2),
+            # The median hides the odd cold-cache request
+            'queries': percentile(self.queries, 50),
+        }
+
+
+def _fetch(client, url, latencies, queries):
+    start = time.perf_counter()
+    response = client.get(url)
+    latencies.append(time.perf_counter() - start)
+    if response.status_code != 200:
+        raise AssertionError(f'GET {url} returned {response.status_code}')
+    match = SERVER_TIMING_QUERIES.search(response.get('Server-Timing', ''))
+    queries.append(int(match.group(1)) if match else 0)
+
+
+def run_scenario(scenario, users, requests=50, concurrency=4, warmup=3):
+    """Issue ``requests`` GETs split across ``concurrency`` logged-in clients.
+
+    With a concurrency of 1 everything runs on the calling thread, which
+    lets tests benchmark inside their transaction.
+    """
+    workers = []
+    for user in users[:concurrency]:
+        url = scenario.url(user)
+        if url is None:
+            continue
+        client = Client()
+        client.force_login(user)
+        for _ in range(warmup):
+            _fetch(client, url, [], [])
+        workers.append((client, url))
+    if not workers:
+        return None
+
+    latencies, queries, errors = [], [], []
+    per_worker = max(1, requests // len(workers))
+
+    def work(client, url):
+        try:
+            for _ in range(per_worker):
+                _fetch(client, url, latencies, queries)
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            if threading.current_thread() is not threading.main_thread():
+                connections.close_all()
+
+    # As timeit does, keep garbage collection pauses out of the timings
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        if len(workers) == 1:
+            work(*workers[0])
+        else:
+            threads = [threading.Thread(target=work, args=worker) for worker in workers]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        wall_time = time.perf_counter() - start
+    finally:
+        gc.enable()
+    if errors:
+        raise errors[0]
+    return ViewResult(scenario.url_name, latencies, queries, wall_time)
+
+
+def run_benchmark(scenarios=SCENARIOS, requests=50, concurrency=4, warmup=3):
+    users = {
+        role: list(CustomUser.objects.filter(role=role).order_by('pk')[:concurrency])
+        for role in ('ADMIN', 'EMPLOYEE')
+    }
+    results = []
+    for scenario in scenarios:
+        result = run_scenario(scenario, users[scenario.role], requests, concurrency, warmup)
+        if result is not None:
+            results.append(result)
+    return results
+
+
+def _session_cookie(user):
+    client = Client()
+    client.force_login(user)
+    name = settings.SESSION_COOKIE_NAME
+    return f'{name}={client.cookies[name].value}'
+
+
+def _check(url, status, headers, queries):
+    if status != 200:
+        raise AssertionError(f'GET {url} returned {status}')
+    match = SERVER_TIMING_QUERIES.search(headers.get('server-timing', ''))
+    queries.append(int(match.group(1)) if match else 0)
+
+
+def _wsgi_fetch(app, url, cookie, latencies, queries):
+    """One GET through the WSGI application, as a threaded WSGI server makes it"""
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': url, 'SCRIPT_NAME': '', 'QUERY_STRING': '',
+        'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'testserver', 'HTTP_COOKIE': cookie, 'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr, 'wsgi.multithread': True, 'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    started = []
+    start = time.perf_counter()
+    body = app(environ, lambda status, headers, exc_info=None: started.append((status, headers)))
+    try:
+        for _ in body:
+            pass
+    finally:
+        body.close()
+    latencies.append(time.perf_counter() - start)
+    status, headers = started[0]
+    _check(url, int(status.split()[0]), {k.lower(): v for k, v in headers}, queries)
+
+
+async def _asgi_fetch(app, url, cookie, latencies, queries):
+    """One GET through the ASGI application, as an ASGI server makes it"""
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': url, 'raw_path': url.encode(), 'query_string': b'',
+        'root_path': '', 'client': ('127.0.0.1', 40000), 'server': ('testserver', 80),
+        'headers': [(b'host', b'testserver'), (b'cookie', cookie.encode())],
+    }
+    response = {}
+    finished = asyncio.Event()
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await finished.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+            response['headers'] = {k.decode().lower(): v.decode() for k, v in message['headers']}
+        elif not message.get('more_body'):
+            finished.set()
+
+    start = time.perf_counter()
+    await app(scope, receive, send)
+    latencies.append(time.perf_counter() - start)
+    finished.set()
+    _check(url, response['status'], response['headers'], queries)
+
+
+def _run_wsgi(app, workers, per_worker):
+    latencies, queries, errors = [], [], []
+
+    def work(url, cookie):
+        try:
+            for _ in range(per_worker):
+                _wsgi_fetch(app, url, cookie, latencies, queries)
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=work, args=worker) for worker in workers]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, queries, errors, time.perf_counter() - start
+
+
+def _run_asgi(app, workers, per_worker):
+    latencies, queries, errors = [], [], []
+
+    async def work(url, cookie):
+        try:
+            for _ in range(per_worker):
+                await _asgi_fetch(app, url, cookie, latencies, queries)
+        except Exception as exc:
+            errors.append(exc)
+
+    async def main():
+        start = time.perf_counter()
+        await asyncio.gather(*[work(*worker) for worker in workers])
+        return time.perf_counter() - start
+
+    # A thread of its own, like the server's, so no caller's event loop or
+    # sync thread gets in the way
+    result = {}
+    server = threading.Thread(target=lambda: result.update(wall_time=asyncio.run(main())))
+    server.start()
+    server.join()
+    return latencies, queries, errors, result.get('wall_time', 0.0)
+
+
+DEPLOYMENTS = {'wsgi': (WSGIHandler, _run_wsgi), 'asgi': (ASGIHandler, _run_asgi)}
+
+
+def run_deployments(scenarios=SCENARIOS, requests=200, concurrency=50):
+    """Serve every scenario through the WSGI and the ASGI handler.
+
+    WSGI gets ``concurrency`` threads, as a threaded WSGI server would;
+    ASGI gets as many concurrent tasks on one event loop. The rows must be
+    committed, since both run on connections of their own. Returns
+    ``{deployment: [ViewResult, ...]}``; ASGI rows report no query count,
+    which the profiling middleware cannot see in async mode.
+    """
+    users = {
+        role: list(CustomUser.objects.filter(role=role).order_by('pk')[:concurrency])
+        for role in ('ADMIN', 'EMPLOYEE')
+    }
+    cookies = {role: [_session_cookie(user) for user in role_users] for role, role_users in users.items()}
+    results = {name: [] for name in DEPLOYMENTS}
+    for scenario in scenarios:
+        targets = [(url, cookie) for url, cookie in
+                   ((scenario.url(user), cookie) for user, cookie in
+                    zip(users[scenario.role], cookies[scenario.role]))
+                   if url is not None]
+        if not targets:
+            continue
+        # Clients beyond the number of users share their sessions
+        workers = [targets[i % len(targets)] for i in range(concurrency)]
+        per_worker = max(1, requests // concurrency)
+        for name, (handler, run) in DEPLOYMENTS.items():
+            app = handler()
+            run(app, workers[:1], 3)  # warm up
+            gc.collect()
+            gc.disable()
+            try:
+                latencies, queries, errors, wall_time = run(app, workers, per_worker)
+            finally:
+                gc.enable()
+            if errors:
+                raise errors[0]
+            results[name].append(ViewResult(scenario.url_name, latencies, queries, wall_time))
+    return results
+
+
+SESSION_ENGINES = ['db', 'cached_db', 'cache', 'signed_cookies']
+# Password checks would otherwise drown out the session cost
+LOGIN_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+def _login(user, latencies, queries):
+    """Log in through the form, then load the page it redirects to"""
+    client = Client()
+    start = time.perf_counter()
+    response = client.post(reverse('accounts:login'), {'username': user.username, 'password': SEED_PASSWORD})
+    if response.status_code != 302:
+        raise AssertionError(f'Login as {user.username} returned {response.status_code}')
+    response = client.get(response['Location'])
+    latencies.append(time.perf_counter() - start)
+    _check(response.request['PATH_INFO'], response.status_code, response.headers, queries)
+
+
+def run_logins(engines=SESSION_ENGINES, requests=100, concurrency=4, warmup=3):
+    """Log in and load the dashboard with ``concurrency`` clients per session engine.
+
+    Each client logs in ``requests / concurrency`` times as a seeded
+    employee. Their passwords are re-hashed with a fast hasher first. With
+    a concurrency of 1 everything runs on the calling thread. Returns a
+    ViewResult per engine, with the dashboard's query count.
+    """
+    users = list(CustomUser.objects.filter(role='EMPLOYEE').order_by('pk')[:concurrency])
+    per_worker = max(1, requests // len(users))
+    results = []
+    with override_settings(PASSWORD_HASHERS=LOGIN_HASHERS):
+        for user in users:
+            user.set_password(SEED_PASSWORD)
+        CustomUser.objects.bulk_update(users, ['password'])
+        for engine in engines:
+            with override_settings(SESSION_ENGINE=f'django.contrib.sessions.backends.{engine}'):
+                for _ in range(warmup):
+                    _login(users[0], [], [])
+                latencies, queries, errors = [], [], []
+
+                def work(user):
+                    try:
+                        for _ in range(per_worker):
+                            _login(user, latencies, queries)
+                    except Exception as exc:
+                        errors.append(exc)
+                    finally:
+                        if threading.current_thread() is not threading.main_thread():
+                            connections.close_all()
+
+                gc.collect()
+                gc.disable()
+                try:
+                    start = time.perf_counter()
+                    if len(users) == 1:
+                        work(users[0])
+                    else:
+                        threads = [threading.Thread(target=work, args=(user,)) for user in users]
+                        for thread in threads:
+                            thread.start()
+                        for thread in threads:
+                            thread.join()
+                    wall_time = time.perf_counter() - start
+                finally:
+                    gc.enable()
+            if errors:
+                raise errors[0]
+            results.append(ViewResult(engine, latencies, queries, wall_time))
+    return results
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(path, config, results):
+    with open(path, 'w') as f:
+        json.dump({'config': config, 'views': {r.name: r.as_dict() for r in results}},
+                  f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def compare(results, baseline, tolerance=0.5, slack_ms=5.0):
+    """Regressions against a baseline, as messages.
+
+    Query counts must not grow at all. p95 latency may grow by ``tolerance``
+    (a fraction) plus ``slack_ms`` before it counts, to absorb machine noise.
+    """
+    regressions = []
+    for result in results:
+        expected = baseline['views'].get(result.name)
+        if expected is None:
+            continue
+        measured = result.as_dict()
+        if measured['queries'] > expected['queries']:
+            regressions.append(f'{result.name}: {measured["queries"]} queries, baseline {expected["queries"]}')
+        limit = expected['p95'] * (1 + tolerance) + slack_ms
+        if measured['p95'] > limit:
+            regressions.append(f'{result.name}: p95 {measured["p95"]} ms, limit {limit:.2f} ms')
+    return regressions
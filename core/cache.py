@@ -0,0 +1,348 @@
+"""Cache backends used by emp_system.settings.CACHES.
+
+Every backend here is a thin subclass of a Django backend that also counts
+hits, misses and evictions per process (see cache_stats). FakeRedisCache
+runs Django's Redis backend against an in-process stand-in for a Redis
+server, so the Redis code path can be exercised without one.
+"""
+import random
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends import filebased, locmem, redis
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+_STAT_NAMES = ('hits', 'misses', 'sets', 'deletes', 'evictions')
+_stats = {}
+
+
+def _counters(name):
+    return _stats.setdefault(name, dict.fromkeys(_STAT_NAMES, 0))
+
+
+def cache_stats():
+    """Per-alias hit/miss/set/delete/eviction counts for this process"""
+    result = {}
+    for alias in settings.CACHES:
+        backend = caches[alias]
+        if isinstance(backend, StatsMixin):
+            result[alias] = {**_counters(backend.stats_name), 'evictions': backend.evictions()}
+    return result
+
+
+class StatsMixin:
+    """Count cache traffic. Increments are plain dict updates: a rare lost
+    update under thread contention is an acceptable price for no locking.
+
+    Backends build some operations on others (add on has_key and set,
+    set_many on set, ...), so only the outermost call is counted.
+    """
+
+    def __init__(self, server, params):
+        super().__init__(server, params)
+        self.stats_name = params.get('STATS_NAME', server)
+        self.stats = _counters(self.stats_name)
+        self._depth = threading.local()
+
+    @contextmanager
+    def _counting(self):
+        """Yield whether this call is the outermost one on this thread"""
+        depth = getattr(self._depth, 'value', 0)
+        self._depth.value = depth + 1
+        try:
+            yield depth == 0
+        finally:
+            self._depth.value = depth
+
+    def _count(self, outermost, name, amount=1):
+        if outermost:
+            self.stats[name] += amount
+
+    def get(self, key, default=None, version=None):
+        missing = object()
+        with self._counting() as outermost:
+            value = super().get(key, missing, version=version)
+        if value is missing:
+            self._count(outermost, 'misses')
+            return default
+        self._count(outermost, 'hits')
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        with self._counting() as outermost:
+            found = super().get_many(keys, version=version)
+        self._count(outermost, 'hits', len(found))
+        self._count(outermost, 'misses', len(keys) - len(found))
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._counting() as outermost:
+            result = super().set(key, value, timeout=timeout, version=version)
+        self._count(outermost, 'sets')
+        return result
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._counting() as outermost:
+            result = super().set_many(data, timeout=timeout, version=version)
+        self._count(outermost, 'sets', len(data))
+        return result
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._counting() as outermost:
+            added = super().add(key, value, timeout=timeout, version=version)
+        # A refused add found the key, so it is a hit
+        self._count(outermost, 'sets' if added else 'hits')
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        with self._counting() as outermost:
+            try:
+                value = super().incr(key, delta, version=version)
+            except ValueError:
+                self._count(outermost, 'misses')
+                raise
+        self._count(outermost, 'hits')
+        self._count(outermost, 'sets')
+        return value  # decr calls this with a negative delta
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, version=None):
+        computed = []
+
+        def compute():
+            computed.append(True)
+            return default() if callable(default) else default
+
+        with self._counting() as outermost:
+            value = super().get_or_set(key, compute, timeout=timeout, version=version)
+        if computed:
+            self._count(outermost, 'misses')
+            self._count(outermost, 'sets')
+        else:
+            self._count(outermost, 'hits')
+        return value
+
+    def delete(self, key, version=None):
+        with self._counting() as outermost:
+            result = super().delete(key, version=version)
+        self._count(outermost, 'deletes')
+        return result
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        with self._counting() as outermost:
+            result = super().delete_many(keys, version=version)
+        self._count(outermost, 'deletes', len(keys))
+        return result
+
+    def evictions(self):
+        return self.stats['evictions']
+
+
+class LocMemCache(StatsMixin, locmem.LocMemCache):
+    def _cull(self):
+        before = len(self._cache)
+        super()._cull()
+        self.stats['evictions'] += before - len(self._cache)
+
+
+class FileBasedCache(StatsMixin, filebased.FileBasedCache):
+    """Django's file cache lists the whole directory on every set to decide
+    whether to cull. This one lists it only when its running estimate of the
+    entry count (the last listing plus its own writes since) reaches
+    MAX_ENTRIES, so writes by other processes are noticed then."""
+
+    def __init__(self, server, params):
+        super().__init__(server, params)
+        self._entries = None
+
+    def _cull(self):
+        if self._entries is not None and self._entries + 1 < self._max_entries:
+            self._entries += 1
+            return
+        filelist = self._list_cache_files()
+        if len(filelist) < self._max_entries:
+            self._entries = len(filelist) + 1
+            return
+        if self._cull_frequency == 0:
+            self.stats['evictions'] += len(filelist)
+            self.clear()
+        else:
+            culled = random.sample(filelist, int(len(filelist) / self._cull_frequency))
+            for fname in culled:
+                self._delete(fname)
+            self.stats['evictions'] += len(culled)
+        self._entries = len(self._list_cache_files()) + 1
+
+    def clear(self):
+        super().clear()
+        self._entries = None
+
+
+class RedisCache(StatsMixin, redis.RedisCache):
+    def evictions(self):
+        # Redis evicts on its own under maxmemory; ask the server
+        info = self._cache.get_client(write=True).info('stats')
+        return int(info.get('evicted_keys', 0))
+
+
+class FakeRedisServer:
+    """In-process stand-in for one Redis database.
+
+    Implements the commands django.core.cache.backends.redis issues, with
+    TTLs and LRU eviction once ``max_entries`` keys are stored.
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries
+        self.data = OrderedDict()
+        self.expires = {}
+        self.evicted_keys = 0
+        self.lock = threading.RLock()
+
+    def _alive(self, key):
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def _store(self, key, value, ex=None):
+        if isinstance(value, int):
+            value = str(value).encode()
+        self.data[key] = value
+        self.data.move_to_end(key)
+        self.expires.pop(key, None)
+        if ex is not None:
+            self.expires[key] = time.monotonic() + ex
+        while self.max_entries and len(self.data) > self.max_entries:
+            evicted, _ = self.data.popitem(last=False)
+            self.expires.pop(evicted, None)
+            self.evicted_keys += 1
+
+
+class FakeRedis:
+    """Subset of the redis.Redis client API backed by a FakeRedisServer"""
+    _servers = {}
+    _servers_lock = threading.Lock()
+
+    def __init__(self, connection_pool):
+        with self._servers_lock:
+            self.server = self._servers.setdefault(
+                connection_pool.url, FakeRedisServer(connection_pool.max_entries),
+            )
+
+    def get(self, key):
+        with self.server.lock:
+            if not self.server._alive(key):
+                return None
+            self.server.data.move_to_end(key)
+            return self.server.data[key]
+
+    def mget(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value, ex=None, nx=False):
+        with self.server.lock:
+            if nx and self.server._alive(key):
+                return None
+            self.server._store(key, value, ex)
+            return True
+
+    def mset(self, mapping):
+        with self.server.lock:
+            for key, value in mapping.items():
+                self.server._store(key, value)
+        return True
+
+    def delete(self, *keys):
+        with self.server.lock:
+            deleted = 0
+            for key in keys:
+                if self.server._alive(key):
+                    del self.server.data[key]
+                    self.server.expires.pop(key, None)
+                    deleted += 1
+            return deleted
+
+    def exists(self, *keys):
+        with self.server.lock:
+            return sum(1 for key in keys if self.server._alive(key))
+
+    def incr(self, key, amount=1):
+        with self.server.lock:
+            value = int(self.server.data[key]) + amount if self.server._alive(key) else amount
+            ttl = self.server.expires.get(key)
+            self.server._store(key, value)
+            if ttl is not None:
+                self.server.expires[key] = ttl
+            return value
+
+    def expire(self, key, seconds):
+        with self.server.lock:
+            if not self.server._alive(key):
+                return False
+            self.server.expires[key] = time.monotonic() + seconds
+            return True
+
+    def persist(self, key):
+        with self.server.lock:
+            return self.server._alive(key) and self.server.expires.pop(key, None) is not None
+
+    def flushdb(self):
+        with self.server.lock:
+            self.server.data.clear()
+            self.server.expires.clear()
+        return True
+
+    def info(self, section=None):
+        return {'evicted_keys': self.server.evicted_keys, 'keys': len(self.server.data)}
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((getattr(self.client, name), args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        with self.client.server.lock:
+            return [command(*args, **kwargs) for command, args, kwargs in self.commands]
+
+
+class FakeConnectionPool:
+    def __init__(self, url, max_entries=None):
+        self.url = url
+        self.max_entries = max_entries
+
+    @classmethod
+    def from_url(cls, url, **options):
+        return cls(url, **options)
+
+
+class FakeRedisCacheClient(redis.RedisCacheClient):
+    def __init__(self, servers, serializer=None, max_entries=None, **options):
+        self._servers = servers
+        self._pools = {}
+        self._client = FakeRedis
+        self._pool_class = FakeConnectionPool
+        self._serializer = serializer or redis.RedisSerializer()
+        self._pool_options = {'max_entries': max_entries}
+
+
+class FakeRedisCache(RedisCache):
+    def __init__(self, server, params):
+        super().__init__(server, params)
+        self._class = FakeRedisCacheClient
@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from accounts.models import CustomUser
+from .models import Notice, Work, Request
+from .stats import get_stats
+
+ADMIN_COUNTERS_KEY = 'dashboard:counters:admin'
+
+
+def employee_counters_key(user_id):
+    return f'dashboard:counters:employee:{user_id}'
+
+
+def employee_counters(user):
+    """Work totals for the employee dashboard, read from the user's EmployeeStats row"""
+    key = employee_counters_key(user.pk)
+    counters = cache.get(key)
+    if counters is None:
+        stats = get_stats(user.pk)
+        counters = {
+            'total_work': stats.total_work,
+            'pending_work': stats.work_pending,
+            'in_progress_work': stats.work_in_progress,
+            'completed_work': stats.work_completed,
+        }
+        cache.set(key, counters, settings.DASHBOARD_COUNTER_TIMEOUT)
+    return counters
+
+
+def admin_counters():
+    """Organisation-wide totals for the admin dashboard.
+
+    Each table only contributes one figure, so a filtered COUNT that can use
+    the status/role indexes is cheaper here than a conditional aggregate.
+    """
+    counters = cache.get(ADMIN_COUNTERS_KEY)
+    if counters is None:
+        counters = {
+            'total_employees': CustomUser.objects.filter(role='EMPLOYEE').count(),
+            'total_notices': Notice.objects.filter(is_active=True).count(),
+            'pending_requests': Request.objects.filter(status='PENDING').count(),
+            'active_work': Work.objects.filter(status__in=['PENDING', 'IN_PROGRESS']).count(),
+        }
+        cache.set(ADMIN_COUNTERS_KEY, counters, settings.DASHBOARD_COUNTER_TIMEOUT)
+    return counters
+
+
+def invalidate_employee_counters(user_id):
+    cache.delete(employee_counters_key(user_id))
+
+
+def invalidate_admin_counters():
+    cache.delete(ADMIN_COUNTERS_KEY)
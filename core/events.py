@@ -0,0 +1,182 @@
+"""Live dashboard updates over server-sent events.
+
+One Broadcaster per process holds the open /events/ streams, each an
+asyncio queue on the server's event loop, so idle connections cost a
+coroutine and a queue rather than a thread. Code anywhere (signals run in
+request or worker threads) calls ``publish``; the configured backend
+carries the event to every process's broadcaster:
+
+- LocalBackend hands it straight to this process's event loop, enough for
+  a single ASGI worker.
+- RedisBackend sends it through Redis pub/sub so that streams held by any
+  worker receive it.
+
+Events are dicts with an ``event`` name, an ``audience`` (``all``,
+``admins`` or ``user:<id>``) and JSON-serialisable ``data``.
+"""
+import asyncio
+import json
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger('emp_system.events')
+
+
+class Subscription:
+    def __init__(self, audiences, size):
+        self.audiences = audiences
+        self.queue = asyncio.Queue(maxsize=size)
+        # Set when the client fell too far behind; it is told to reload
+        self.overflowed = False
+
+
+class LocalBackend:
+    """Delivers events within this process only"""
+
+    def __init__(self, **options):
+        pass
+
+    def publish(self, broadcaster, event):
+        broadcaster.deliver_threadsafe(event)
+
+    async def listen(self, broadcaster):
+        pass
+
+
+class RedisBackend:
+    """Delivers events to every process subscribed to a Redis channel"""
+
+    def __init__(self, url, channel='emp-events', **options):
+        import redis
+        import redis.asyncio
+
+        self.channel = channel
+        self.client = redis.Redis.from_url(url)
+        self.async_client = redis.asyncio.Redis.from_url(url)
+
+    def publish(self, broadcaster, event):
+        self.client.publish(self.channel, json.dumps(event))
+
+    async def listen(self, broadcaster):
+        delay = 1
+        while True:
+            try:
+                async with self.async_client.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    delay = 1
+                    async for message in pubsub.listen():
+                        if message['type'] == 'message':
+                            broadcaster.deliver(json.loads(message['data']))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('Lost the event channel; reconnecting in %s s', delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+
+
+class Broadcaster:
+    def __init__(self, backend, queue_size=100):
+        self.backend = backend
+        self.queue_size = queue_size
+        self.loop = None
+        self.listener = None
+        self.subscribers = defaultdict(set)
+
+    def subscribe(self, audiences):
+        """Register a stream; must be called on the event loop serving it"""
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.loop = loop
+            self.listener = loop.create_task(self.backend.listen(self))
+        subscription = Subscription(audiences, self.queue_size)
+        for audience in audiences:
+            self.subscribers[audience].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        for audience in subscription.audiences:
+            listeners = self.subscribers.get(audience)
+            if listeners is not None:
+                listeners.discard(subscription)
+                if not listeners:
+                    del self.subscribers[audience]
+
+    @property
+    def connections(self):
+        return len({s for listeners in self.subscribers.values() for s in listeners})
+
+    def publish(self, event):
+        self.backend.publish(self, event)
+
+    def deliver_threadsafe(self, event):
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            return  # nobody has connected to this process
+        try:
+            loop.call_soon_threadsafe(self.deliver, event)
+        except RuntimeError:
+            pass  # the loop closed in the meantime
+
+    def deliver(self, event):
+        """Queue an event for its audience; runs on the event loop"""
+        for subscription in self.subscribers.get(event['audience'], ()):
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                subscription.overflowed = True
+
+
+_broadcaster = None
+
+
+def get_broadcaster():
+    global _broadcaster
+    if _broadcaster is None:
+        backend = import_string(settings.EVENTS_BACKEND)(**settings.EVENTS_OPTIONS)
+        _broadcaster = Broadcaster(backend, settings.EVENTS_QUEUE_SIZE)
+    return _broadcaster
+
+
+def publish(event, audience, **data):
+    get_broadcaster().publish({'event': event, 'audience': audience, 'data': data})
+
+
+def audiences_for(user):
+    if user.is_admin():
+        return ('all', 'admins')
+    return ('all', f'user:{user.pk}')
+
+
+def format_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, default=str)}\n\n'
+
+
+async def stream(subscription, resolve_counters):
+    """The text/event-stream body for one connection.
+
+    ``counters`` events only say that the figures changed; the stream looks
+    up this user's current ones (cached, see core.counters) before sending.
+    """
+    broadcaster = get_broadcaster()
+    try:
+        yield f'retry: {settings.EVENTS_RETRY_MS}\n\n'
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), settings.EVENTS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                # Keeps proxies from closing the idle connection
+                yield ': keep-alive\n\n'
+                continue
+            if subscription.overflowed:
+                yield format_event('reload', {})
+                return
+            data = event['data']
+            if event['event'] == 'counters':
+                data = await resolve_counters()
+            yield format_event(event['event'], data)
+    finally:
+        broadcaster.unsubscribe(subscription)
@@ -0,0 +1,221 @@
+import csv
+import datetime
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from django.db.models import Value
+from django.db.models.functions import Concat
+from django.utils import timezone
+
+from .models import Attendance, Work, Request, WorkingHours
+
+EXPORT_CHUNK_SIZE = 2000
+
+# name -> (model, user relation, date field, [(header, lookup), ...])
+EXPORTS = {
+    'attendance': (Attendance, 'employee', 'date', [
+        ('Employee ID', 'employee__employee_id'),
+        ('Username', 'employee__username'),
+        ('Name', 'employee_name'),
+        ('Department', 'employee__department'),
+        ('Date', 'date'),
+        ('Check In', 'check_in'),
+        ('Check Out', 'check_out'),
+        ('Status', 'status'),
+        ('Notes', 'notes'),
+    ]),
+    'work': (Work, 'assigned_to', 'assigned_date', [
+        ('ID', 'id'),
+        ('Title', 'title'),
+        ('Employee ID', 'assigned_to__employee_id'),
+        ('Username', 'assigned_to__username'),
+        ('Name', 'employee_name'),
+        ('Department', 'assigned_to__department'),
+        ('Assigned', 'assigned_date'),
+        ('Due', 'due_date'),
+        ('Priority', 'priority'),
+        ('Status', 'status'),
+        ('Completed', 'completed_date'),
+    ]),
+    'requests': (Request, 'employee', 'submitted_date', [
+        ('ID', 'id'),
+        ('Employee ID', 'employee__employee_id'),
+        ('Username', 'employee__username'),
+        ('Name', 'employee_name'),
+        ('Department', 'employee__department'),
+        ('Type', 'request_type'),
+        ('Subject', 'subject'),
+        ('Submitted', 'submitted_date'),
+        ('Status', 'status'),
+        ('Responded', 'responded_date'),
+    ]),
+    # Read by payroll; core.hours keeps the table up to date
+    'hours': (WorkingHours, 'employee', 'week_start', [
+        ('Employee ID', 'employee__employee_id'),
+        ('Username', 'employee__username'),
+        ('Name', 'employee_name'),
+        ('Department', 'employee__department'),
+        ('Week Starting', 'week_start'),
+        ('Days Worked', 'days_worked'),
+        ('Worked Minutes', 'worked_minutes'),
+        ('Regular Minutes', 'regular_minutes'),
+        ('Overtime Minutes', 'overtime_minutes'),
+        ('Late Arrivals', 'late_arrivals'),
+        ('Late Minutes', 'late_minutes'),
+    ]),
+}
+
+
+def export_queryset(kind, start=None, end=None, department=None, status=None):
+    """Build the filtered values_list queryset for one export"""
+    model, user, date_field, columns = EXPORTS[kind]
+    queryset = model.objects.annotate(
+        employee_name=Concat(f'{user}__first_name', Value(' '), f'{user}__last_name'),
+    )
+
+    is_datetime = model._meta.get_field(date_field).get_internal_type() == 'DateTimeField'
+    if start:
+        if is_datetime:
+            start = timezone.make_aware(datetime.datetime.combine(start, datetime.time.min))
+        queryset = queryset.filter(**{f'{date_field}__gte': start})
+    if end:
+        end = end + datetime.timedelta(days=1)
+        if is_datetime:
+            end = timezone.make_aware(datetime.datetime.combine(end, datetime.time.min))
+        queryset = queryset.filter(**{f'{date_field}__lt': end})
+    if department:
+        queryset = queryset.filter(**{f'{user}__department': department})
+    if status:
+        queryset = queryset.filter(status=status)
+
+    return queryset.order_by(f'-{date_field}', '-pk').values_list(*[lookup for _, lookup in columns])
+
+
+def export_rows(kind, **filters):
+    """Yield the header followed by every matching row, fetched in chunks"""
+    yield [header for header, _ in EXPORTS[kind][3]]
+    for row in export_queryset(kind, **filters).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield [_format_value(value) for value in row]
+
+
+def _format_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime.datetime):
+        return timezone.localtime(value).strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return value
+
+
+class _Echo:
+    """File-like object whose write() just hands the data back"""
+    def write(self, value):
+        return value
+
+
+# Spreadsheet programs treat text starting with these as a formula
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _csv_cell(value):
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_stream(rows):
+    """Yield CSV lines; text that would open as a formula is quoted with a leading '"""
+    writer = csv.writer(_Echo())
+    for row in rows:
+        yield writer.writerow([_csv_cell(value) for value in row])
+
+
+class _ChunkBuffer:
+    """Unseekable sink that collects what zipfile writes until it is drained"""
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" Type='
+        '"http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Export" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" Type='
+        '"http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>'
+    ),
+}
+
+_XML_ILLEGAL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _xlsx_cell(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<c t="n"><v>{value}</v></c>'
+    text = escape(_XML_ILLEGAL.sub('', str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def xlsx_stream(rows):
+    """Yield an .xlsx workbook with one sheet, without holding it in memory.
+
+    Cells use inline strings so no shared-string table has to be built up
+    front, and zipfile writes to an unseekable buffer that is drained after
+    every row.
+    """
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_PARTS.items():
+            archive.writestr(name, content)
+        yield buffer.drain()
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                        b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                        b'<sheetData>')
+            for row in rows:
+                sheet.write(('<row>' + ''.join(_xlsx_cell(value) for value in row) + '</row>').encode())
+                data = buffer.drain()
+                if data:
+                    yield data
+            sheet.write(b'</sheetData></worksheet>')
+    yield buffer.drain()
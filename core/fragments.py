@@ -0,0 +1,36 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import FragmentVersion
+
+NOTICES = 'notices'
+
+
+def _cache_key(name):
+    return f'fragments:version:{name}'
+
+
+def notice_version():
+    """Current version of the rendered notice fragments.
+
+    Templates pass it to ``{% cache %}`` as a vary-on argument, so bumping
+    it retires every cached notice fragment at once without deleting keys.
+    With a shared default cache the version lives there and reading it
+    costs no query. A per-process cache would keep the other processes on
+    the old version, so then it is a FragmentVersion row instead.
+    """
+    if settings.SHARED_CACHE:
+        # A missing key, say after an eviction, starts a fresh version
+        return cache.get_or_set(_cache_key(NOTICES), time.time_ns, timeout=None)
+    return FragmentVersion.objects.filter(name=NOTICES).values_list('version', flat=True).first() or 0
+
+
+def bump_notice_version():
+    if settings.SHARED_CACHE:
+        # Once committed, so no render can cache the old notices under the new version
+        transaction.on_commit(lambda: cache.set(_cache_key(NOTICES), time.time_ns(), timeout=None))
+        return
+    FragmentVersion.objects.update_or_create(name=NOTICES, defaults={'version': time.time_ns()})
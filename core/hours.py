@@ -0,0 +1,119 @@
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, CharField, Count, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Cast, Substr, TruncWeek
+
+from accounts.models import CustomUser
+from .models import Attendance, WorkingHours
+from .stats import REBUILD_BATCH_SIZE
+
+
+def shift_rules(department=None):
+    """SHIFT_RULES with the department's overrides applied"""
+    rules = dict(settings.SHIFT_RULES)
+    rules.update(settings.SHIFT_RULES_BY_DEPARTMENT.get(department, {}))
+    hours, minutes = rules['start'].split(':')
+    rules['start_minutes'] = int(hours) * 60 + int(minutes)
+    return rules
+
+
+def week_bounds(start, end):
+    """Widen a date range to whole Monday-Sunday weeks"""
+    start = start - datetime.timedelta(days=start.weekday())
+    end = end + datetime.timedelta(days=6 - end.weekday())
+    return start, end
+
+
+def _minutes(field):
+    """Minutes since midnight of a TimeField, cut out of its HH:MM:SS text in SQL"""
+    text = Cast(field, CharField())
+    return (Cast(Substr(text, 1, 2), IntegerField()) * 60
+            + Cast(Substr(text, 4, 2), IntegerField()))
+
+
+def _rule(key):
+    """The value of one shift rule for each row, per department where overridden"""
+    default = shift_rules()[key]
+    whens = [When(employee__department=department, then=Value(shift_rules(department)[key]))
+             for department in settings.SHIFT_RULES_BY_DEPARTMENT
+             if shift_rules(department)[key] != default]
+    if not whens:
+        return Value(default)
+    return Case(*whens, default=Value(default), output_field=IntegerField())
+
+
+def weekly_totals(start, end, user_ids):
+    """Per (employee, week) sums for the attendance between two dates.
+
+    Everything per day (time worked less the break, the part of it beyond
+    the daily limit, lateness) is an SQL expression, so the database does
+    the arithmetic for every row and hands back one row per employee-week.
+    A check-out earlier than the check-in is taken to be after midnight.
+    """
+    records = (Attendance.objects
+               .filter(employee__in=user_ids, date__gte=start, date__lte=end,
+                       check_in__isnull=False, check_out__isnull=False)
+               .annotate(in_minutes=_minutes('check_in'), out_minutes=_minutes('check_out'))
+               .annotate(span=F('out_minutes') - F('in_minutes')
+                         + Case(When(out_minutes__lt=F('in_minutes'), then=Value(1440)), default=Value(0)))
+               .annotate(worked=F('span') - Case(When(span__gt=_rule('break_after_minutes'),
+                                                      then=_rule('break_minutes')), default=Value(0)),
+                         late_by=F('in_minutes') - _rule('start_minutes'))
+               .annotate(daily_excess=F('worked') - _rule('daily_minutes')))
+    late = Q(late_by__gt=_rule('grace_minutes'))
+    return (records.order_by()
+            .values_list('employee_id', TruncWeek('date'))
+            .annotate(days=Count('pk', filter=Q(worked__gt=0)),
+                      worked_total=Sum(Case(When(worked__gt=0, then=F('worked')), default=Value(0))),
+                      daily_overtime=Sum(Case(When(daily_excess__gt=0, then=F('daily_excess')),
+                                              default=Value(0))),
+                      late_count=Count('pk', filter=late),
+                      late_total=Sum(Case(When(late, then=F('late_by')), default=Value(0)))))
+
+
+def compute_hours(start, end, user_ids=None):
+    """Recompute the WorkingHours rows for the weeks covering two dates.
+
+    Weekly overtime is whichever is larger: time beyond the weekly limit,
+    or the sum of each day's time beyond the daily limit. Employees are
+    processed in batches; each batch's rows in the range are replaced in
+    one transaction. Returns the number of rows written.
+    """
+    start, end = week_bounds(start, end)
+    if user_ids is None:
+        user_ids = CustomUser.objects.order_by('pk').values_list('pk', flat=True).iterator()
+
+    written = 0
+    batch = []
+    for user_id in user_ids:
+        batch.append(user_id)
+        if len(batch) >= REBUILD_BATCH_SIZE:
+            written += _compute_batch(start, end, batch)
+            batch = []
+    if batch:
+        written += _compute_batch(start, end, batch)
+    return written
+
+
+def _compute_batch(start, end, user_ids):
+    departments = {}
+    if settings.SHIFT_RULES_BY_DEPARTMENT:
+        departments = dict(CustomUser.objects.filter(pk__in=user_ids).values_list('pk', 'department'))
+    rows = []
+    for user_id, week, days, worked, daily_overtime, late_count, late_total in weekly_totals(start, end, user_ids):
+        if isinstance(week, datetime.datetime):
+            week = week.date()
+        weekly_limit = shift_rules(departments.get(user_id))['weekly_minutes']
+        overtime = max(worked - weekly_limit, daily_overtime, 0)
+        rows.append(WorkingHours(employee_id=user_id, week_start=week, days_worked=days,
+                                 worked_minutes=worked, regular_minutes=worked - overtime,
+                                 overtime_minutes=overtime, late_arrivals=late_count,
+                                 late_minutes=late_total))
+
+    with transaction.atomic():
+        WorkingHours.objects.filter(employee__in=user_ids, week_start__gte=start,
+                                    week_start__lte=end).delete()
+        WorkingHours.objects.bulk_create(rows, batch_size=REBUILD_BATCH_SIZE)
+    return len(rows)
@@ -0,0 +1,127 @@
+import datetime
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from .hours import compute_hours
+from .models import Attendance
+from .stats import rebuild_stats
+
+# Column a tap sets, and the comparison that lets a later tap replace it:
+# the earliest check-in and the latest check-out of the day win
+TAP_ACTIONS = {
+    'in': ('check_in', '<'),
+    'out': ('check_out', '>'),
+}
+
+UPKEEP_BATCH_SIZE = 500
+
+
+def _parse_time(value):
+    if isinstance(value, str):
+        return datetime.time.fromisoformat(value)
+    return value
+
+
+def _tap_sql(action, lookup):
+    qn = connection.ops.quote_name
+    table = qn(Attendance._meta.db_table)
+    column, wins = TAP_ACTIONS[action]
+    column, current = qn(column), f'{table}.{qn(column)}'
+    flag = qn('needs_upkeep')
+    moved = f'{current} IS NULL OR excluded.{column} {wins} {current}'
+    return (
+        f'INSERT INTO {table} ({qn("employee_id")}, {qn("date")}, {column}, {qn("status")}, {qn("notes")}, {flag}) '
+        f'SELECT {qn("id")}, %s, %s, %s, %s, %s FROM {qn(CustomUser._meta.db_table)} '
+        f'WHERE {qn(lookup)} = %s AND {qn("is_active")} '
+        f'ON CONFLICT ({qn("employee_id")}, {qn("date")}) DO UPDATE SET '
+        f'{column} = CASE WHEN {moved} THEN excluded.{column} ELSE {current} END, '
+        f'{flag} = CASE WHEN {moved} THEN excluded.{flag} ELSE {table}.{flag} END '
+        f'RETURNING {qn("employee_id")}, {qn("check_in")}, {qn("check_out")}'
+    )
+
+
+def record_tap(action, user_id=None, employee_id=None, when=None):
+    """Record a check-in or check-out tap for today with a single statement.
+
+    The employee is given by primary key or by badge ``employee_id``. The
+    upsert on (employee, date) never reads the row first, so simultaneous
+    or repeated taps cannot lose an update: whatever order they land in,
+    the day keeps its earliest check-in and latest check-out. New rows are
+    PRESENT; an existing row keeps its status.
+
+    Nothing else runs on the tap path. A tap that creates the row or moves
+    a time marks it ``needs_upkeep``, and process_taps() brings the
+    EmployeeStats and WorkingHours rows up to date later.
+
+    Returns ``(user id, date, check_in, check_out)``, or None when there is
+    no such active user.
+    """
+    if action not in TAP_ACTIONS:
+        raise ValueError(f'Unknown tap action {action!r}')
+    when = timezone.localtime(when).replace(microsecond=0)
+    lookup, value = ('id', user_id) if employee_id is None else ('employee_id', employee_id)
+    params = [connection.ops.adapt_datefield_value(when.date()),
+              connection.ops.adapt_timefield_value(when.time()), 'PRESENT', '', True, value]
+    with connection.cursor() as cursor:
+        cursor.execute(_tap_sql(action, lookup), params)
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    return row[0], when.date(), _parse_time(row[1]), _parse_time(row[2])
+
+
+def insert_missing_attendance(rows, batch_size=100):
+    """Insert the rows that do not clash with an existing (employee, date).
+
+    ``bulk_create(ignore_conflicts=True)`` cannot say which rows it skipped,
+    so this uses INSERT ... ON CONFLICT DO NOTHING RETURNING and gives back
+    the ids of the employees whose rows went in.
+    """
+    qn = connection.ops.quote_name
+    columns = ['employee_id', 'date', 'status', 'check_in', 'check_out', 'notes']
+    inserted = set()
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            placeholders = ', '.join(['(' + ', '.join(['%s'] * len(columns)) + ')'] * len(batch))
+            params = []
+            for row in batch:
+                params += [row.employee_id, connection.ops.adapt_datefield_value(row.date), row.status,
+                           connection.ops.adapt_timefield_value(row.check_in),
+                           connection.ops.adapt_timefield_value(row.check_out), row.notes]
+            cursor.execute(
+                f'INSERT INTO {qn(Attendance._meta.db_table)} ({", ".join(qn(c) for c in columns)}) '
+                f'VALUES {placeholders} '
+                f'ON CONFLICT ({qn("employee_id")}, {qn("date")}) DO NOTHING '
+                f'RETURNING {qn("employee_id")}',
+                params,
+            )
+            inserted.update(employee_id for employee_id, in cursor.fetchall())
+    return inserted
+
+
+def process_taps(batch_size=None):
+    """Refresh the derived rows for one batch of tapped days; returns how many were taken.
+
+    The batch is claimed, cleared and refreshed in one transaction, so a
+    tap that lands meanwhile marks its row again for the next batch.
+    """
+    with transaction.atomic():
+        tapped = list(Attendance.objects
+                      .select_for_update(skip_locked=True)
+                      .filter(needs_upkeep=True)
+                      .order_by('pk')
+                      .values_list('pk', 'employee_id', 'date')[:batch_size or UPKEEP_BATCH_SIZE])
+        if not tapped:
+            return 0
+        Attendance.objects.filter(pk__in=[pk for pk, _, _ in tapped]).update(needs_upkeep=False)
+        days = defaultdict(set)
+        for _, user_id, day in tapped:
+            days[day].add(user_id)
+        rebuild_stats(sorted(set().union(*days.values())))
+        for day, user_ids in sorted(days.items()):
+            compute_hours(day, day, sorted(user_ids))
+    return len(tapped)
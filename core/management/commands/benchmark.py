@@ -0,0 +1,112 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from core.benchmark import (BENCHMARK_SETTINGS, DEFAULT_BASELINE, SCENARIOS, compare,
+                            load_baseline, run_benchmark, run_deployments, run_logins, save_baseline)
+from core.seeding import OrgSeeder
+
+
+class Command(BaseCommand):
+    help = ('Seed a synthetic organisation into a throwaway test database, drive the panel '
+            'views with concurrent clients and compare the results with a stored baseline')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--employees', type=int, default=200)
+        parser.add_argument('--years', type=int, default=1, help='Years of attendance history')
+        parser.add_argument('--work', type=int, default=2000)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--requests-per-view', type=int, default=100)
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--views', help='Only run views whose URL name contains this text')
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+        parser.add_argument('--save-baseline', action='store_true',
+                            help='Store this run as the new baseline instead of comparing')
+        parser.add_argument('--tolerance', type=float, default=0.5,
+                            help='Allowed fractional p95 slowdown before failing (default 0.5)')
+        parser.add_argument('--deployments', action='store_true',
+                            help='Compare serving through the WSGI and the ASGI handler instead '
+                                 'of checking against the baseline')
+        parser.add_argument('--logins', action='store_true',
+                            help='Compare login followed by the dashboard across the session engines '
+                                 'instead of checking against the baseline')
+
+    def handle(self, *args, **options):
+        config = {key: options[key] for key in
+                  ('employees', 'years', 'work', 'requests', 'seed', 'requests_per_view', 'concurrency')}
+        baseline = None
+        compare_only = options['deployments'] or options['logins']
+        if not options['save_baseline'] and not compare_only:
+            if not os.path.exists(options['baseline']):
+                raise CommandError(f'No baseline at {options["baseline"]}; run with --save-baseline first')
+            baseline = load_baseline(options['baseline'])
+            if baseline['config'] != config:
+                raise CommandError(f'Baseline was recorded with {baseline["config"]}; '
+                                   'rerun with the same options or --save-baseline')
+
+        scenarios = [s for s in SCENARIOS if not options['views'] or options['views'] in s.url_name]
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(**BENCHMARK_SETTINGS):
+                counts = OrgSeeder(employees=options['employees'], years=options['years'],
+                                   work=options['work'], requests=options['requests'],
+                                   seed=options['seed'], hours=False).run()
+                self.stdout.write('Seeded ' + ', '.join(f'{n} {name}' for name, n in counts.items()))
+                if options['deployments']:
+                    deployments = run_deployments(scenarios, requests=options['requests_per_view'],
+                                                  concurrency=options['concurrency'])
+                elif options['logins']:
+                    logins = run_logins(requests=options['requests_per_view'],
+                                        concurrency=options['concurrency'])
+                else:
+                    results = run_benchmark(scenarios, requests=options['requests_per_view'],
+                                            concurrency=options['concurrency'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options['deployments']:
+            self.write_deployments(deployments, options['concurrency'])
+            return
+        if options['logins']:
+            self.write_logins(logins, options['concurrency'])
+            return
+
+        self.stdout.write(f'{"view":<36} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"queries":>8}')
+        for result in results:
+            row = result.as_dict()
+            self.stdout.write(f'{result.name:<36} {row["throughput"]:>8} {row["p50"]:>8} '
+                              f'{row["p95"]:>8} {row["p99"]:>8} {row["queries"]:>8}')
+
+        if options['save_baseline']:
+            os.makedirs(os.path.dirname(options['baseline']), exist_ok=True)
+            save_baseline(options['baseline'], config, results)
+            self.stdout.write(self.style.SUCCESS(f'Baseline written to {options["baseline"]}'))
+            return
+
+        regressions = compare(results, baseline, tolerance=options['tolerance'])
+        if regressions:
+            raise CommandError('Regressions against the baseline:\n  ' + '\n  '.join(regressions))
+        self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
+
+    def write_deployments(self, deployments, concurrency):
+        self.stdout.write(f'{concurrency} concurrent clients')
+        self.stdout.write(f'{"view":<36} {"wsgi req/s":>11} {"asgi req/s":>11} '
+                          f'{"wsgi p95":>9} {"asgi p95":>9}')
+        for wsgi, asgi in zip(deployments['wsgi'], deployments['asgi']):
+            wsgi_row, asgi_row = wsgi.as_dict(), asgi.as_dict()
+            self.stdout.write(f'{wsgi.name:<36} {wsgi_row["throughput"]:>11} {asgi_row["throughput"]:>11} '
+                              f'{wsgi_row["p95"]:>9} {asgi_row["p95"]:>9}')
+
+    def write_logins(self, logins, concurrency):
+        self.stdout.write(f'Login + dashboard, {concurrency} concurrent clients')
+        self.stdout.write(f'{"session engine":<16} {"logins/s":>9} {"p50 ms":>8} {"p95 ms":>8} '
+                          f'{"p99 ms":>8} {"queries":>8}')
+        for result in logins:
+            row = result.as_dict()
+            self.stdout.write(f'{result.name:<16} {row["throughput"]:>9} {row["p50"]:>8} '
+                              f'{row["p95"]:>8} {row["p99"]:>8} {row["queries"]:>8}')
@@ -0,0 +1,27 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.hours import compute_hours
+
+
+class Command(BaseCommand):
+    help = ('Recompute the weekly WorkingHours summary (hours, overtime, lateness) from attendance; '
+            'run after changing the shift rules')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=datetime.date.fromisoformat,
+                            help='First date to cover (default: 8 weeks ago)')
+        parser.add_argument('--end', type=datetime.date.fromisoformat,
+                            help='Last date to cover (default: today)')
+        parser.add_argument('user_ids', nargs='*', type=int,
+                            help='Only recompute these user ids')
+
+    def handle(self, *args, **options):
+        end = options['end'] or timezone.localdate()
+        start = options['start'] or end - datetime.timedelta(weeks=8)
+        if start > end:
+            raise CommandError('--start must be on or before --end')
+        written = compute_hours(start, end, options['user_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} weekly summaries from {start} to {end}'))
@@ -0,0 +1,41 @@
+import csv
+import os
+
+from django.core.management.base import BaseCommand
+
+from core.importers import EmployeeImporter, IMPORT_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = ('Create employee accounts and profiles from a CSV file with columns '
+            'username, employee_id and optionally email, first_name, last_name, department, '
+            'phone, password, hire_date, position, salary, status, address, emergency_contact')
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', help='Path to the CSV file')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Validate every row without writing anything')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Processes used for password hashing (default: CPU count, 0 hashes in this process)')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument('--report', help='Write rejected rows to this CSV file')
+
+    def handle(self, *args, **options):
+        importer = EmployeeImporter(dry_run=options['dry_run'], workers=options['workers'],
+                                    batch_size=options['batch_size'])
+        with open(options['csv_file'], newline='', encoding='utf-8-sig') as handle:
+            result = importer.run(handle)
+
+        for line, username, message in result.errors:
+            self.stderr.write(f'Line {line} ({username or "-"}): {message}')
+
+        if options['report']:
+            with open(options['report'], 'w', newline='') as handle:
+                writer = csv.writer(handle)
+                writer.writerow(['line', 'username', 'error'])
+                writer.writerows(result.errors)
+
+        verb = 'Would create' if options['dry_run'] else 'Created'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {result.created} of {result.rows} employees, {len(result.errors)} rejected'
+        ))
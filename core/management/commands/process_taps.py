@@ -0,0 +1,33 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.kiosk import UPKEEP_BATCH_SIZE, process_taps
+
+
+class Command(BaseCommand):
+    help = ('Bring EmployeeStats and WorkingHours up to date for check-in/out taps; '
+            'polls every KIOSK_POLL_SECONDS until interrupted')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once no tap is waiting instead of polling')
+        parser.add_argument('--batch-size', type=int, default=UPKEEP_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        processed = 0
+        try:
+            while True:
+                close_old_connections()
+                taken = process_taps(options['batch_size'])
+                processed += taken
+                if taken:
+                    continue
+                if options['once']:
+                    break
+                time.sleep(settings.KIOSK_POLL_SECONDS)
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} tapped attendance records'))
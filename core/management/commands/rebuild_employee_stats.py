@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the EmployeeStats counters for every user from the source tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_ids', nargs='*', type=int,
+                            help='Only rebuild these user ids')
+
+    def handle(self, *args, **options):
+        written = rebuild_stats(options['user_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt stats for {written} users'))
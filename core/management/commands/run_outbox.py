@@ -0,0 +1,33 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.outbox import drain
+
+
+class Command(BaseCommand):
+    help = ('Deliver queued notifications (in-app and email) in batches, retrying failures with '
+            'backoff; polls every OUTBOX_POLL_SECONDS until interrupted')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once nothing is due instead of polling')
+        parser.add_argument('--batch-size', type=int, default=settings.OUTBOX_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        processed = 0
+        try:
+            while True:
+                close_old_connections()
+                taken = drain(options['batch_size'])
+                processed += taken
+                if taken:
+                    continue
+                if options['once']:
+                    break
+                time.sleep(settings.OUTBOX_POLL_SECONDS)
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} outbox messages'))
@@ -0,0 +1,55 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import CustomUser
+from core.seeding import OrgSeeder, SEED_PASSWORD
+
+
+class Command(BaseCommand):
+    help = ('Generate a synthetic organisation (users, profiles, notices, attendance, work and '
+            'requests) for sizing and load tests. The same --seed always produces the same data.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--employees', type=int, default=1000)
+        parser.add_argument('--years', type=float, default=1, help='Years of attendance history')
+        parser.add_argument('--work', type=int, default=20000)
+        parser.add_argument('--requests', type=int, default=10000)
+        parser.add_argument('--notices', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='emp',
+                            help='Username prefix, so several organisations can share a database')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--today', type=datetime.date.fromisoformat,
+                            help='Last day of the history, YYYY-MM-DD (default: the current date)')
+        parser.add_argument('--no-hours', action='store_true',
+                            help='Skip the WorkingHours summary, the slowest step; run compute_hours later')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if CustomUser.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(f'Users starting with "{prefix}" already exist; choose another --prefix')
+
+        started = time.perf_counter()
+        reported = {}
+
+        def progress(model, rows):
+            # Report every 500,000 rows or so
+            if rows // 500000 > reported.get(model, 0):
+                reported[model] = rows // 500000
+                self.stdout.write(f'  {model.__name__}: {rows} rows '
+                                  f'({time.perf_counter() - started:.0f}s)')
+
+        seeder = OrgSeeder(employees=options['employees'], years=options['years'],
+                           work=options['work'], requests=options['requests'],
+                           notices=options['notices'], seed=options['seed'], prefix=prefix,
+                           batch_size=options['batch_size'], progress=progress,
+                           today=options['today'], hours=not options['no_hours'])
+        counts = seeder.run()
+        for name, rows in counts.items():
+            self.stdout.write(f'{name:<12} {rows:>12}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded in {time.perf_counter() - started:.1f}s; '
+            f'log in as {prefix}admin or {prefix}000001 with password "{SEED_PASSWORD}"'
+        ))
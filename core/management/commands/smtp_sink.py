@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from core.smtp_sink import SMTPSink
+
+
+class Command(BaseCommand):
+    help = 'Run a local SMTP stand-in that accepts all mail and prints it (EMAIL_PORT defaults to 1025)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=1025)
+
+    def handle(self, *args, **options):
+        sink = SMTPSink(on_message=self.show)
+        port = sink.start(options['host'], options['port'])
+        self.stdout.write(f'SMTP sink listening on {options["host"]}:{port}; Ctrl-C to stop')
+        try:
+            sink.thread.join()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            sink.stop()
+
+    def show(self, sender, recipients, message):
+        body = message.get_payload(decode=True) or b''
+        self.stdout.write(f'--- From {sender} to {", ".join(recipients)}: {message["Subject"]}')
+        self.stdout.write(body.decode(message.get_content_charset() or 'utf-8', 'replace'))
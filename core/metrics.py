@@ -0,0 +1,202 @@
+"""Prometheus text-format metrics.
+
+Each process records into plain dicts (no locks; the GIL keeps single
+increments consistent enough for monitoring). With METRICS_DIR set, a
+daemon thread writes the process's samples to METRICS_DIR/<pid>.json every
+METRICS_FLUSH_INTERVAL seconds and /metrics merges the files of all
+gunicorn workers, so recording never touches the disk.
+"""
+import bisect
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+from .cache import RedisCache, cache_stats
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, help text, how gauges from several processes combine)
+METRICS = {
+    'emp_request_duration_seconds': ('histogram', 'View latency by URL name', None),
+    'emp_db_queries_total': ('counter', 'SQL queries run by views', None),
+    'emp_db_query_seconds_total': ('counter', 'Time spent in SQL by views', None),
+    'emp_model_creates_total': ('counter', 'Rows created', None),
+    'emp_status_transitions_total': ('counter', 'Status changes of saved rows', None),
+    'emp_cache_requests_total': ('counter', 'Cache reads and writes by result', None),
+    'emp_cache_evictions_total': ('counter', 'Entries evicted from per-process and file caches', None),
+    'emp_cache_server_evictions': ('gauge', 'Keys evicted by the Redis server', 'max'),
+    'emp_db_connections_open': ('gauge', 'Open database connections', 'sum'),
+}
+
+_counters = {}
+_histograms = {}
+_flusher = None
+
+
+def inc(name, labels, amount=1):
+    key = (name, labels)
+    _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name, labels, value):
+    buckets = _histograms.get((name, labels))
+    if buckets is None:
+        # One slot per bucket plus +Inf, then the sum
+        buckets = _histograms.setdefault((name, labels), [0] * (len(LATENCY_BUCKETS) + 2))
+    buckets[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+    buckets[-1] += value
+    _start_flusher()
+
+
+def record_request(namespace, view, seconds, timings=None):
+    labels = (('namespace', namespace), ('view', view))
+    observe('emp_request_duration_seconds', labels, seconds)
+    if timings is not None:
+        inc('emp_db_queries_total', labels, timings.queries)
+        inc('emp_db_query_seconds_total', labels, timings.sql_time)
+
+
+def record_write(model, old_status, new_status):
+    if old_status is None:
+        inc('emp_model_creates_total', (('model', model),))
+    elif old_status != new_status:
+        inc('emp_status_transitions_total',
+            (('model', model), ('from', old_status), ('to', new_status)))
+
+
+def _gauges():
+    """Totals kept elsewhere (cache stats, connections), read at snapshot time"""
+    gauges = {}
+    for alias, stats in cache_stats().items():
+        for result in ('hits', 'misses', 'sets', 'deletes'):
+            gauges[('emp_cache_requests_total', (('cache', alias), ('result', result)))] = stats[result]
+        name = ('emp_cache_server_evictions' if isinstance(caches[alias], RedisCache)
+                else 'emp_cache_evictions_total')
+        gauges[(name, (('cache', alias),))] = stats['evictions']
+    for connection in connections.all(initialized_only=True):
+        labels = (('alias', connection.alias), ('vendor', connection.vendor))
+        gauges[('emp_db_connections_open', labels)] = int(connection.connection is not None)
+    return gauges
+
+
+def snapshot():
+    """This process's samples as {(name, labels): value or bucket list}"""
+    samples = dict(_counters)
+    samples.update((key, list(buckets)) for key, buckets in list(_histograms.items()))
+    samples.update(_gauges())
+    return samples
+
+
+def _encode(samples):
+    return [[name, list(map(list, labels)), value] for (name, labels), value in samples.items()]
+
+
+def _decode(rows):
+    return {(name, tuple(map(tuple, labels))): value for name, labels, value in rows}
+
+
+def flush():
+    directory = settings.METRICS_DIR
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{os.getpid()}.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(_encode(snapshot()), f)
+    os.replace(path + '.tmp', path)
+
+
+def _flush_forever():
+    while True:
+        time.sleep(settings.METRICS_FLUSH_INTERVAL)
+        flush()
+
+
+def _start_flusher():
+    global _flusher
+    if _flusher is None and settings.METRICS_DIR:
+        _flusher = threading.Thread(target=_flush_forever, name='metrics-flush', daemon=True)
+        _flusher.start()
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def merge(snapshots):
+    """Combine per-process samples. Counters and histograms add up; gauges
+    from exited processes are dropped and the rest combine per METRICS."""
+    merged = {}
+    for samples, alive in snapshots:
+        for key, value in samples.items():
+            kind, _, combine = METRICS[key[0]]
+            if kind == 'gauge' and not alive:
+                continue
+            if key not in merged:
+                merged[key] = list(value) if kind == 'histogram' else value
+            elif kind == 'histogram':
+                merged[key] = [a + b for a, b in zip(merged[key], value)]
+            elif combine == 'max':
+                merged[key] = max(merged[key], value)
+            else:
+                merged[key] += value
+    return merged
+
+
+def collect():
+    """Samples of this process plus, with METRICS_DIR, every other worker"""
+    snapshots = [(snapshot(), True)]
+    directory = settings.METRICS_DIR
+    if directory and os.path.isdir(directory):
+        for entry in os.listdir(directory):
+            pid, ext = os.path.splitext(entry)
+            if ext != '.json' or not pid.isdigit() or int(pid) == os.getpid():
+                continue
+            try:
+                with open(os.path.join(directory, entry)) as f:
+                    snapshots.append((_decode(json.load(f)), _alive(int(pid))))
+            except (OSError, ValueError):
+                continue
+    return merge(snapshots)
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = ('{}="{}"'.format(k, str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+               for k, v in pairs)
+    return '{' + ','.join(escaped) + '}'
+
+
+def render(samples):
+    """Prometheus text exposition format (version 0.0.4)"""
+    lines = []
+    for name, (kind, help_text, _) in METRICS.items():
+        series = sorted((labels, value) for (metric, labels), value in samples.items() if metric == name)
+        if not series:
+            continue
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in series:
+            if kind != 'histogram':
+                lines.append(f'{name}{_labels(labels)} {value}')
+                continue
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), value[:-1]):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labels)} {value[-1]}')
+            lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,141 @@
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from whitenoise.middleware import WhiteNoiseMiddleware as BaseWhiteNoiseMiddleware
+
+from . import metrics
+from .profiling import RequestTimings, current_timings, log_slow_queries, logger
+
+
+class AsyncCapableMiddleware:
+    """Base for middleware that runs in whichever mode the handler below it
+    uses, so that under ASGI an async view is reached without a thread hop"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.process(request)
+
+
+class WhiteNoiseMiddleware(BaseWhiteNoiseMiddleware):
+    """WhiteNoise that can also run in async mode"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
+
+
+class RequestProfilingMiddleware(AsyncCapableMiddleware):
+    """Time every request and report it in a Server-Timing header.
+
+    Breaks the response time down into SQL (with the query count), template
+    rendering and the Python left over, flags requests that exceed the
+    PROFILING_QUERY_BUDGET / PROFILING_TIME_BUDGET_MS budgets, and logs the
+    stacks of queries slower than PROFILING_SLOW_QUERY_MS.
+
+    Requests handled in async mode only get the total, and only the time
+    budget is checked: their queries run on sync_to_async threads, out of
+    reach of the connection wrappers.
+    """
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        if not settings.PROFILING_ENABLED:
+            return response
+        total = time.perf_counter() - start
+        response['Server-Timing'] = f'total;dur={total * 1000:.1f}'
+        if total * 1000 > settings.PROFILING_TIME_BUDGET_MS:
+            response['X-Budget-Exceeded'] = 'time'
+            logger.warning('%s %s over budget: %.1f ms', request.method, request.path, total * 1000)
+        return response
+
+    def process(self, request):
+        if not settings.PROFILING_ENABLED:
+            return self.get_response(request)
+
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings))
+                response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+
+        total = timings.total_time
+        python_time = max(total - timings.sql_time - timings.template_time, 0)
+        response['Server-Timing'] = ', '.join([
+            f'sql;dur={timings.sql_time * 1000:.1f};desc="{timings.queries} queries"',
+            f'template;dur={timings.template_time * 1000:.1f}',
+            f'python;dur={python_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+        over_budget = []
+        if timings.queries > settings.PROFILING_QUERY_BUDGET:
+            over_budget.append('queries')
+        if total * 1000 > settings.PROFILING_TIME_BUDGET_MS:
+            over_budget.append('time')
+        if over_budget:
+            response['X-Budget-Exceeded'] = ','.join(over_budget)
+            logger.warning('%s %s over budget: %d queries, %.1f ms',
+                           request.method, request.path, timings.queries, total * 1000)
+        if timings.slow_queries:
+            log_slow_queries(request, timings)
+        return response
+
+
+class MetricsMiddleware(AsyncCapableMiddleware):
+    """Record each request's latency (and, under the profiling middleware,
+    its SQL) against the namespace and name of the URL it resolved to"""
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, start)
+        return response
+
+    def process(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        self.record(request, start)
+        return response
+
+    def record(self, request, start):
+        match = request.resolver_match
+        if match is None:
+            namespace, view = '', 'unresolved'
+        else:
+            namespace, view = match.namespace, match.url_name or match.view_name
+        metrics.record_request(namespace, view, time.perf_counter() - start, current_timings.get())
@@ -0,0 +1,36 @@
+# Generated by Django 5.0 on 2026-10-18 14:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_customuser_role_index'),
+        ('core', '0002_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmployeeStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('work_pending', models.PositiveIntegerField(default=0)),
+                ('work_in_progress', models.PositiveIntegerField(default=0)),
+                ('work_completed', models.PositiveIntegerField(default=0)),
+                ('work_cancelled', models.PositiveIntegerField(default=0)),
+                ('open_requests', models.PositiveIntegerField(default=0)),
+                ('month', models.DateField(help_text='First day of the month the attendance counters cover')),
+                ('attendance_present', models.PositiveIntegerField(default=0)),
+                ('attendance_absent', models.PositiveIntegerField(default=0)),
+                ('attendance_leave', models.PositiveIntegerField(default=0)),
+                ('attendance_half_day', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'employee stats',
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.0 on 2026-10-18 14:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_searchdocument'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkingHours',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week_start', models.DateField(help_text='Monday of the week')),
+                ('days_worked', models.PositiveSmallIntegerField(default=0)),
+                ('worked_minutes', models.PositiveIntegerField(default=0)),
+                ('regular_minutes', models.PositiveIntegerField(default=0)),
+                ('overtime_minutes', models.PositiveIntegerField(default=0)),
+                ('late_arrivals', models.PositiveSmallIntegerField(default=0)),
+                ('late_minutes', models.PositiveIntegerField(default=0)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='working_hours', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'working hours',
+                'indexes': [models.Index(fields=['-week_start', '-id'], name='workinghours_week_idx')],
+                'unique_together': {('employee', 'week_start')},
+            },
+        ),
+    ]
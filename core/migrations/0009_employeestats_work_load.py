@@ -0,0 +1,47 @@
+# Generated by Django 5.0 on 2026-10-18 15:24
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_departments(apps, schema_editor):
+    EmployeeStats = apps.get_model('core', 'EmployeeStats')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    EmployeeStats.objects.update(
+        department=Subquery(User.objects.filter(pk=OuterRef('user_id')).values('department')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_work_open_due_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employeestats',
+            name='department',
+            field=models.CharField(blank=True, help_text="Copy of the user's department", max_length=100),
+        ),
+        migrations.AddField(
+            model_name='employeestats',
+            name='load_date',
+            field=models.DateField(blank=True, help_text='Day the work load was computed for', null=True),
+        ),
+        migrations.AddField(
+            model_name='employeestats',
+            name='work_load',
+            field=models.PositiveIntegerField(default=0, help_text='Open work weighted by priority and due date'),
+        ),
+        migrations.AddIndex(
+            model_name='employeestats',
+            index=models.Index(fields=['department', 'load_date', 'work_load', 'user'], name='stats_department_load_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='employeestats',
+            index=models.Index(fields=['load_date', 'work_load', 'user'], name='stats_load_idx'),
+        ),
+        migrations.RunPython(copy_departments, migrations.RunPython.noop),
+    ]
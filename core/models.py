@@ -1,5 +1,16 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
+from django.utils import timezone
+
+class AtomicSaveMixin:
+    """Run save() and its pre/post_save receivers in a single transaction.
+
+    Model.delete() already sends its signals inside a transaction; save() does
+    not, so receivers that keep derived tables in step need this.
+    """
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
 
 class Employee(models.Model):
     """Employee profile model"""
@@ -17,6 +28,13 @@ class Employee(models.Model):
     address = models.TextField(blank=True)
     emergency_contact = models.CharField(max_length=15, blank=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['status'], name='employee_status_idx'),
+            models.Index(fields=['position'], name='employee_position_idx'),
+            models.Index(fields=['hire_date'], name='employee_hire_date_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.user.get_full_name()} - {self.position}"
 
@@ -30,11 +48,15 @@ class Notice(models.Model):
     
     class Meta:
         ordering = ['-published_date']
+        indexes = [
+            models.Index(fields=['is_active', '-published_date'], name='notice_active_published_idx'),
+            models.Index(fields=['-published_date', '-id'], name='notice_published_idx'),
+        ]
     
     def __str__(self):
         return self.title
 
-class Attendance(models.Model):
+class Attendance(AtomicSaveMixin, models.Model):
     """Attendance tracking model"""
     STATUS_CHOICES = (
         ('PRESENT', 'Present'),
@@ -49,15 +71,21 @@ class Attendance(models.Model):
     check_out = models.TimeField(null=True, blank=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PRESENT')
     notes = models.TextField(blank=True)
+    # Set by taps (core.kiosk) until process_taps has refreshed the derived rows
+    needs_upkeep = models.BooleanField(default=False, db_default=False, editable=False)
     
     class Meta:
         ordering = ['-date']
         unique_together = ['employee', 'date']
+        indexes = [
+            models.Index(fields=['-date', '-id'], name='attendance_date_idx'),
+            models.Index(fields=['id'], name='attendance_upkeep_idx', condition=models.Q(needs_upkeep=True)),
+        ]
     
     def __str__(self):
         return f"{self.employee.username} - {self.date} ({self.status})"
 
-class Work(models.Model):
+class Work(AtomicSaveMixin, models.Model):
     """Work assignment model"""
     STATUS_CHOICES = (
         ('PENDING', 'Pending'),
@@ -86,11 +114,20 @@ class Work(models.Model):
     
     class Meta:
         ordering = ['-assigned_date']
+        indexes = [
+            models.Index(fields=['assigned_to', 'status'], name='work_assignee_status_idx'),
+            models.Index(fields=['assigned_to', '-assigned_date'], name='work_assignee_assigned_idx'),
+            models.Index(fields=['status'], name='work_status_idx'),
+            models.Index(fields=['-assigned_date', '-id'], name='work_assigned_idx'),
+            # Open work only, by due date: the overdue queue (core.workqueue)
+            models.Index(fields=['due_date'], name='work_open_due_idx',
+                         condition=models.Q(status__in=['PENDING', 'IN_PROGRESS'])),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.assigned_to.username}"
 
-class Request(models.Model):
+class Request(AtomicSaveMixin, models.Model):
     """Employee request model"""
     REQUEST_TYPE_CHOICES = (
         ('LEAVE', 'Leave Request'),
@@ -116,6 +153,149 @@ class Request(models.Model):
     
     class Meta:
         ordering = ['-submitted_date']
+        indexes = [
+            models.Index(fields=['employee', '-submitted_date'], name='request_employee_submitted_idx'),
+            models.Index(fields=['status'], name='request_status_idx'),
+            models.Index(fields=['-submitted_date', '-id'], name='request_submitted_idx'),
+        ]
     
     def __str__(self):
         return f"{self.employee.username} - {self.get_request_type_display()}"
+
+class EmployeeStats(models.Model):
+    """Per-user counters maintained incrementally by core.signals"""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                                primary_key=True, related_name='stats')
+    work_pending = models.PositiveIntegerField(default=0)
+    work_in_progress = models.PositiveIntegerField(default=0)
+    work_completed = models.PositiveIntegerField(default=0)
+    work_cancelled = models.PositiveIntegerField(default=0)
+    open_requests = models.PositiveIntegerField(default=0)
+    month = models.DateField(help_text='First day of the month the attendance counters cover')
+    attendance_present = models.PositiveIntegerField(default=0)
+    attendance_absent = models.PositiveIntegerField(default=0)
+    attendance_leave = models.PositiveIntegerField(default=0)
+    attendance_half_day = models.PositiveIntegerField(default=0)
+    work_load = models.PositiveIntegerField(default=0, help_text='Open work weighted by priority and due date')
+    load_date = models.DateField(null=True, blank=True, help_text='Day the work load was computed for')
+    department = models.CharField(max_length=100, blank=True, help_text="Copy of the user's department")
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name_plural = 'employee stats'
+        indexes = [
+            # Assignment suggestions read these in load order (core.assignment)
+            models.Index(fields=['department', 'load_date', 'work_load', 'user'], name='stats_department_load_idx'),
+            models.Index(fields=['load_date', 'work_load', 'user'], name='stats_load_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Stats for user {self.user_id} ({self.month:%b %Y})"
+    
+    @property
+    def total_work(self):
+        return self.work_pending + self.work_in_progress + self.work_completed + self.work_cancelled
+
+class WorkingHours(models.Model):
+    """Hours, overtime and lateness per employee per week, computed by core.hours"""
+    employee = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                                 related_name='working_hours')
+    week_start = models.DateField(help_text='Monday of the week')
+    days_worked = models.PositiveSmallIntegerField(default=0)
+    worked_minutes = models.PositiveIntegerField(default=0)
+    regular_minutes = models.PositiveIntegerField(default=0)
+    overtime_minutes = models.PositiveIntegerField(default=0)
+    late_arrivals = models.PositiveSmallIntegerField(default=0)
+    late_minutes = models.PositiveIntegerField(default=0)
+    computed_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name_plural = 'working hours'
+        unique_together = ['employee', 'week_start']
+        indexes = [
+            models.Index(fields=['-week_start', '-id'], name='workinghours_week_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Hours for user {self.employee_id}, week of {self.week_start}"
+
+class OutboxMessage(models.Model):
+    """A notification written with the change it announces, delivered later by core.outbox"""
+    STATUS_CHOICES = (
+        ('PENDING', 'Pending'),
+        ('SENT', 'Sent'),
+        ('FAILED', 'Failed'),
+    )
+    
+    recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    subject = models.CharField(max_length=200)
+    body = models.TextField()
+    link = models.CharField(max_length=200, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    # Each channel is stamped once delivered, so retries skip it
+    emailed_at = models.DateTimeField(null=True, blank=True)
+    notified_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.subject} -> user {self.recipient_id} ({self.status})"
+
+class Notification(models.Model):
+    """In-app notification shown to an employee"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='notifications')
+    subject = models.CharField(max_length=200)
+    body = models.TextField()
+    link = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    read_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='notification_user_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.subject} for user {self.user_id}"
+
+class SearchDocument(models.Model):
+    """Denormalised text of a Notice, Work or Request, indexed by core.search"""
+    KIND_CHOICES = (
+        ('notice', 'Notice'),
+        ('work', 'Work'),
+        ('request', 'Request'),
+    )
+    
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True,
+                              help_text='Employee allowed to see the document; empty for notices')
+    is_public = models.BooleanField(default=False, help_text='Visible to every employee')
+    title = models.CharField(max_length=200)
+    body = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['kind', 'object_id']
+        indexes = [
+            models.Index(fields=['kind', 'is_public'], name='searchdoc_kind_public_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind} #{self.object_id}: {self.title}"
+
+class FragmentVersion(models.Model):
+    """Version of a family of cached template fragments (core.fragments)"""
+    name = models.CharField(max_length=50, primary_key=True)
+    version = models.BigIntegerField()
+    
+    def __str__(self):
+        return f"{self.name} v{self.version}"
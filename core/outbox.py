@@ -0,0 +1,155 @@
+"""Transactional outbox for employee notifications.
+
+Signals add an OutboxMessage inside the transaction that saves the Work or
+Request, so a notification exists exactly when the change commits and the
+web request never waits on delivery. ``drain`` (run by the run_outbox
+worker) delivers due messages in batches to two channels, in-app
+Notification rows and email, and reschedules failures with exponential
+backoff. No transaction is open while email is sent. Email is
+at-least-once: a worker that dies between sending and recording it will
+send it again once its claim runs out.
+"""
+import datetime
+import logging
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import OutboxMessage, Notification, Work
+
+logger = logging.getLogger('emp_system.outbox')
+
+MAX_RETRY_DELAY = datetime.timedelta(hours=1)
+# How long a claimed batch is left to its worker before others may retry it
+CLAIM_TIMEOUT = datetime.timedelta(minutes=15)
+
+
+def enqueue(recipient_id, subject, body, link=''):
+    return OutboxMessage.objects.create(recipient_id=recipient_id, subject=subject, body=body, link=link)
+
+
+def work_assigned(work):
+    # The date may still be the string it was assigned as
+    due_date = Work._meta.get_field('due_date').to_python(work.due_date)
+    return enqueue(
+        work.assigned_to_id,
+        f'New work assigned: {work.title}',
+        f'You have been assigned "{work.title}" ({work.get_priority_display()} priority), '
+        f'due {due_date:%b %d, %Y}.',
+        reverse('employee_panel:work_detail', args=[work.pk]),
+    )
+
+
+def request_answered(request):
+    decision = request.get_status_display().lower()
+    body = f'Your {request.get_request_type_display().lower()} request "{request.subject}" was {decision}.'
+    if request.admin_response:
+        body += f'\n\n{request.admin_response}'
+    return enqueue(
+        request.employee_id,
+        f'Request {decision}: {request.subject}',
+        body,
+        reverse('employee_panel:request_detail', args=[request.pk]),
+    )
+
+
+def retry_delay(attempts):
+    """Wait before the next try after ``attempts`` failed ones"""
+    delay = datetime.timedelta(seconds=settings.OUTBOX_RETRY_SECONDS * 2 ** (attempts - 1))
+    return min(delay, MAX_RETRY_DELAY)
+
+
+def drain(batch_size=None, now=None):
+    """Deliver one batch of due messages; returns how many were taken.
+
+    Rows are claimed with SELECT ... FOR UPDATE SKIP LOCKED where the
+    database supports it, so several workers can drain side by side. The
+    claim, which moves ``next_attempt_at`` past CLAIM_TIMEOUT, commits with
+    the in-app notifications; email is then sent outside any transaction
+    and a second short one records the outcome.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        batch = list(OutboxMessage.objects
+                     .select_for_update(skip_locked=True, of=('self',))
+                     .select_related('recipient')
+                     .filter(status='PENDING', next_attempt_at__lte=now)
+                     .order_by('next_attempt_at', 'pk')[:batch_size or settings.OUTBOX_BATCH_SIZE])
+        if not batch:
+            return 0
+        errors = {message.pk: [] for message in batch}
+        _notify(batch, now, errors)
+        for message in batch:
+            message.next_attempt_at = now + CLAIM_TIMEOUT
+        OutboxMessage.objects.bulk_update(batch, ['next_attempt_at', 'notified_at'])
+
+    _email(batch, now, errors)
+
+    for message in batch:
+        if message.notified_at and message.emailed_at:
+            message.status = 'SENT'
+            continue
+        message.attempts += 1
+        message.last_error = '\n'.join(errors[message.pk])
+        if message.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            message.status = 'FAILED'
+            logger.error('Giving up on outbox message %s: %s', message.pk, message.last_error)
+        else:
+            message.next_attempt_at = now + retry_delay(message.attempts)
+    with transaction.atomic():
+        OutboxMessage.objects.bulk_update(
+            batch, ['status', 'attempts', 'next_attempt_at', 'emailed_at', 'last_error'])
+    return len(batch)
+
+
+def _notify(batch, now, errors):
+    pending = [message for message in batch if message.notified_at is None]
+    try:
+        # A savepoint, so a failure here leaves the batch's bookkeeping intact
+        with transaction.atomic():
+            Notification.objects.bulk_create(
+                Notification(user_id=message.recipient_id, subject=message.subject,
+                             body=message.body, link=message.link)
+                for message in pending
+            )
+    except Exception as exc:
+        for message in pending:
+            errors[message.pk].append(f'in-app: {exc!r}')
+        return
+    for message in pending:
+        message.notified_at = now
+
+
+def _email(batch, now, errors):
+    pending = [message for message in batch if message.emailed_at is None]
+    for message in pending:
+        if not message.recipient.email:
+            message.emailed_at = now  # nowhere to send it
+    pending = [message for message in pending if message.emailed_at is None]
+    if not pending:
+        return
+
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as exc:
+        for message in pending:
+            errors[message.pk].append(f'email: {exc!r}')
+        return
+    try:
+        for message in pending:
+            body = message.body
+            if message.link:
+                body += f'\n\n{settings.SITE_URL}{message.link}'
+            email = EmailMessage(message.subject, body, to=[message.recipient.email], connection=connection)
+            try:
+                email.send()
+            except Exception as exc:
+                errors[message.pk].append(f'email: {exc!r}')
+            else:
+                message.emailed_at = now
+    finally:
+        connection.close()
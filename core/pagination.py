@@ -0,0 +1,154 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+
+class KeysetPage:
+    """A single page of results produced by KeysetPaginator"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        # Other query parameters (filters, sort) that page links must carry
+        self.querystring = ''
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """Cursor (keyset) paginator.
+
+    Pages are located with a ``WHERE (a, b, pk) < (x, y, z)`` style filter on
+    the ordering columns instead of OFFSET, so fetching page 500 costs the
+    same as fetching page 1. The primary key is always appended to the
+    ordering as a tiebreaker so that cursors are unambiguous. Ordering
+    entries may also name annotations on the queryset.
+    """
+
+    def __init__(self, queryset, per_page=50, ordering=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.model = queryset.model
+
+        ordering = list(ordering or queryset.query.order_by or self.model._meta.ordering)
+        names = [field.lstrip('-') for field in ordering]
+        if 'pk' not in names and self.model._meta.pk.name not in names:
+            descending = ordering[-1].startswith('-') if ordering else False
+            ordering.append('-pk' if descending else 'pk')
+        self.ordering = ordering
+
+    def _fields(self):
+        annotations = self.queryset.query.annotations
+        for entry in self.ordering:
+            descending = entry.startswith('-')
+            name = entry.lstrip('-')
+            if name in annotations:
+                field = annotations[name].output_field
+            elif name == 'pk':
+                field = self.model._meta.pk
+            else:
+                field = self.model._meta.get_field(name)
+            yield name, field, descending
+
+    def _key(self, obj):
+        annotations = self.queryset.query.annotations
+        return [str(getattr(obj, name)) if name in annotations else field.value_to_string(obj)
+                for name, field, _ in self._fields()]
+
+    def encode_cursor(self, obj):
+        raw = json.dumps(self._key(obj), separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            fields = list(self._fields())
+            if not isinstance(values, list) or len(values) != len(fields):
+                raise ValueError
+            values = [field.to_python(value) for (_, field, _), value in zip(fields, values)]
+            # The seek cannot compare with NULL; only a tampered cursor has one
+            if any(value is None and not field.null for (_, field, _), value in zip(fields, values)):
+                raise ValueError
+            return values
+        except (ValueError, TypeError, ValidationError):
+            raise InvalidCursor(cursor)
+
+    def _seek(self, values, backwards):
+        """Build the lexicographic comparison that skips past ``values``"""
+        condition = Q()
+        equal_prefix = Q()
+        for (name, _, descending), value in zip(self._fields(), values):
+            lookup = 'lt' if descending != backwards else 'gt'
+            condition |= equal_prefix & Q(**{f'{name}__{lookup}': value})
+            equal_prefix &= Q(**{name: value})
+        return condition
+
+    def _ordered(self, backwards):
+        if not backwards:
+            return self.queryset.order_by(*self.ordering)
+        flipped = [entry[1:] if entry.startswith('-') else f'-{entry}' for entry in self.ordering]
+        return self.queryset.order_by(*flipped)
+
+    def page(self, after=None, before=None):
+        backwards = before is not None and after is None
+        cursor = before if backwards else after
+
+        queryset = self._ordered(backwards)
+        if cursor:
+            queryset = queryset.filter(self._seek(self.decode_cursor(cursor), backwards))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+
+        if not rows:
+            return KeysetPage([])
+
+        if backwards:
+            next_cursor = self.encode_cursor(rows[-1])
+            previous_cursor = self.encode_cursor(rows[0]) if has_more else None
+        else:
+            next_cursor = self.encode_cursor(rows[-1]) if has_more else None
+            previous_cursor = self.encode_cursor(rows[0]) if cursor else None
+        return KeysetPage(rows, next_cursor, previous_cursor)
+
+
+def paginate(request, queryset, per_page=50, ordering=None):
+    """Return the keyset page selected by the ``after``/``before`` query parameters"""
+    paginator = KeysetPaginator(queryset, per_page=per_page, ordering=ordering)
+    try:
+        page = paginator.page(after=request.GET.get('after'), before=request.GET.get('before'))
+    except InvalidCursor:
+        page = paginator.page()
+
+    params = request.GET.copy()
+    params.pop('after', None)
+    params.pop('before', None)
+    page.querystring = params.urlencode()
+    return page
@@ -0,0 +1,102 @@
+import heapq
+import itertools
+import logging
+import os
+import time
+import traceback
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.template.backends import django as django_backend
+
+logger = logging.getLogger('emp_system.profiling')
+
+# Timings of the request being handled in the current thread or task
+current_timings = ContextVar('current_timings', default=None)
+
+
+class RequestTimings:
+    """Query count and SQL/template time collected during one request"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        # A min-heap of the slowest queries so far: (elapsed, order, sql, stack)
+        self.slow_queries = []
+        self._order = itertools.count()
+
+    @property
+    def total_time(self):
+        return time.perf_counter() - self.start
+
+    def __call__(self, execute, sql, params, many, context):
+        """Database execute_wrapper: time every query the request runs"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.queries += 1
+            self.sql_time += elapsed
+            if elapsed * 1000 >= settings.PROFILING_SLOW_QUERY_MS:
+                self._keep_slow(elapsed, sql)
+
+    def _keep_slow(self, elapsed, sql):
+        """Keep the PROFILING_STACKS_PER_REQUEST slowest queries. Only those
+        that make it in pay for a stack walk."""
+        limit = settings.PROFILING_STACKS_PER_REQUEST
+        if limit <= 0 or (len(self.slow_queries) >= limit and elapsed <= self.slow_queries[0][0]):
+            return
+        entry = (elapsed, next(self._order), sql, _project_stack())
+        if len(self.slow_queries) < limit:
+            heapq.heappush(self.slow_queries, entry)
+        else:
+            heapq.heapreplace(self.slow_queries, entry)
+
+
+def _project_stack():
+    """The calling frames that belong to this project, innermost last.
+
+    Queries from the async ORM run on a sync_to_async thread, whose stack
+    does not reach back into the async view that awaited them.
+    """
+    root = str(settings.BASE_DIR) + os.sep
+    frames = traceback.extract_stack()[:-4]
+    return [frame for frame in frames
+            if frame.filename.startswith(root) and 'site-packages' not in frame.filename]
+
+
+def log_slow_queries(request, timings):
+    for elapsed, _, sql, stack in sorted(timings.slow_queries, reverse=True):
+        logger.warning('Slow query (%.1f ms) on %s %s\n%s\nCalled from:\n%s',
+                       elapsed * 1000, request.method, request.path, sql,
+                       ''.join(traceback.format_list(stack)).rstrip())
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        timings = current_timings.get()
+        if timings is None:
+            return super().render(context, request)
+        start, sql_before = time.perf_counter(), timings.sql_time
+        try:
+            return super().render(context, request)
+        finally:
+            # Lazy querysets run during rendering; count them as SQL, not template
+            elapsed = time.perf_counter() - start
+            timings.template_time += elapsed - (timings.sql_time - sql_before)
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """DjangoTemplates backend whose templates report their render time"""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except django_backend.TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
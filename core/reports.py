@@ -0,0 +1,109 @@
+import calendar
+
+from django.db import connection
+from django.db.models import CharField, IntegerField
+from django.db.models.functions import Cast, ExtractDay, Substr
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from accounts.models import CustomUser
+from .models import Attendance
+from .stats import month_bounds
+
+# Matrix cell values; 0 means no record for the day
+STATUS_CODES = {'PRESENT': 1, 'ABSENT': 2, 'LEAVE': 3, 'HALF_DAY': 4}
+STATUS_KEYS = ['present', 'absent', 'leave', 'half_day']
+CELL_LABELS = ['', 'P', 'A', 'L', 'H']
+
+
+def _cell_html(day):
+    """The five possible <td>s for a day of the month, weekends shaded"""
+    weekend = ' weekend' if day.weekday() >= 5 else ''
+    return [f'<td class="cell cell-{code}{weekend}">{label}</td>' for code, label in enumerate(CELL_LABELS)]
+
+
+class MatrixRow:
+    def __init__(self, user_id, name, department, cells, totals):
+        self.user_id = user_id
+        self.name = name
+        self.department = department
+        # Pre-rendered <td> cells for every day of the month and the totals
+        self.cells = cells
+        self.totals = totals
+
+
+class AttendanceMatrix:
+    """Employee-by-day attendance grid for one month.
+
+    Loads the month's (employee, date, status) tuples with one query, packs
+    them into an employees x days array of status codes and derives the
+    per-employee and per-department totals from the array.
+    """
+
+    def __init__(self, month, department=None):
+        self.month = month.replace(day=1)
+        self.department = department
+        self.days = [self.month.replace(day=d)
+                     for d in range(1, calendar.monthrange(self.month.year, self.month.month)[1] + 1)]
+
+    def employees(self):
+        users = CustomUser.objects.filter(role='EMPLOYEE')
+        if self.department:
+            users = users.filter(department=self.department)
+        return list(users.order_by('department', 'last_name', 'first_name', 'id')
+                    .values_list('id', 'first_name', 'last_name', 'username', 'department'))
+
+    def records(self):
+        start, end = month_bounds(self.month)
+        records = Attendance.objects.filter(date__gte=start, date__lt=end)
+        if self.department:
+            records = records.filter(employee__department=self.department)
+        # The day comes back as a plain integer, without per-row date
+        # parsing. SQLite implements EXTRACT in Python, which would dominate
+        # the report, so there it is cut out of the ISO text SQLite stores
+        if connection.vendor == 'sqlite':
+            day = Cast(Substr(Cast('date', CharField()), 9, 2), IntegerField())
+        else:
+            day = ExtractDay('date')
+        return records.annotate(day=day).values_list('employee_id', 'day', 'status')
+
+    def build(self):
+        employees = self.employees()
+        index = {row[0]: i for i, row in enumerate(employees)}
+        codes = self._matrix(index, len(employees))
+        totals = [[row.count(code) for code in range(1, 5)] for row in codes]
+
+        cell_html = [_cell_html(day) for day in self.days]
+        self.rows = []
+        for (user_id, first, last, username, department), row, counts in zip(employees, codes, totals):
+            cells = mark_safe(''.join([cell_html[day][code] for day, code in enumerate(row)])
+                              + ''.join([f'<td class="total">{count}</td>' for count in counts]))
+            name = escape(f'{first} {last}'.strip() or username)
+            self.rows.append(MatrixRow(user_id, name, department, cells, dict(zip(STATUS_KEYS, counts))))
+        self.departments = self._rollup()
+        return self
+
+    def _matrix(self, index, size):
+        """One bytearray of status codes per employee, a byte per day"""
+        codes = [bytearray(len(self.days)) for _ in range(size)]
+        for employee_id, day, status in self.records():
+            position = index.get(employee_id)
+            if position is not None:
+                codes[position][day - 1] = STATUS_CODES[status]
+        return codes
+
+    def _rollup(self):
+        """Totals per department, with the share of recorded days worked"""
+        departments = {}
+        for row in self.rows:
+            entry = departments.setdefault(row.department or 'Unassigned',
+                                           {'employees': 0, **dict.fromkeys(STATUS_KEYS, 0)})
+            entry['employees'] += 1
+            for key in STATUS_KEYS:
+                entry[key] += row.totals[key]
+        for entry in departments.values():
+            recorded = sum(entry[key] for key in STATUS_KEYS)
+            worked = entry['present'] + entry['half_day'] / 2
+            entry['rate'] = round(100 * worked / recorded, 1) if recorded else None
+        return sorted(departments.items())
+
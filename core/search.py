@@ -0,0 +1,146 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Notice, Work, Request, SearchDocument
+
+# Control characters stand in for <mark> while the snippet is still raw text
+HIGHLIGHT_START, HIGHLIGHT_END = '\x02', '\x03'
+MAX_TERMS = 10
+
+
+def document_for(instance):
+    """Return the SearchDocument field values for a Notice, Work or Request"""
+    if isinstance(instance, Notice):
+        return 'notice', {
+            'owner_id': None,
+            'is_public': instance.is_active,
+            'title': instance.title,
+            'body': instance.content,
+        }
+    if isinstance(instance, Work):
+        return 'work', {
+            'owner_id': instance.assigned_to_id,
+            'is_public': False,
+            'title': instance.title,
+            'body': '\n'.join(filter(None, [instance.description, instance.remarks])),
+        }
+    return 'request', {
+        'owner_id': instance.employee_id,
+        'is_public': False,
+        'title': instance.subject,
+        'body': '\n'.join(filter(None, [instance.description, instance.admin_response])),
+    }
+
+
+def index_document(instance):
+    kind, values = document_for(instance)
+    SearchDocument.objects.update_or_create(kind=kind, object_id=instance.pk, defaults=values)
+
+
+def remove_document(instance):
+    kind, _ = document_for(instance)
+    SearchDocument.objects.filter(kind=kind, object_id=instance.pk).delete()
+
+
+def rebuild_index(batch_size=1000):
+    """Re-index every notice, work item and request from scratch"""
+    SearchDocument.objects.all().delete()
+    return add_to_index([model.objects.all() for model in (Notice, Work, Request)], batch_size)
+
+
+def add_to_index(querysets, batch_size=1000):
+    """Index the rows of each queryset, which have no documents yet"""
+    total = 0
+    for queryset in querysets:
+        batch = []
+        for instance in queryset.order_by('pk').iterator(chunk_size=batch_size):
+            kind, values = document_for(instance)
+            batch.append(SearchDocument(kind=kind, object_id=instance.pk, **values))
+            if len(batch) >= batch_size:
+                SearchDocument.objects.bulk_create(batch)
+                total += len(batch)
+                batch = []
+        SearchDocument.objects.bulk_create(batch)
+        total += len(batch)
+    return total
+
+
+class SearchResult:
+    def __init__(self, kind, object_id, title, snippet, rank):
+        self.kind = kind
+        self.object_id = object_id
+        self.title = title
+        self.snippet = snippet
+        self.rank = rank
+
+
+def _highlight(text):
+    return mark_safe(escape(text).replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>'))
+
+
+def _scope(user):
+    """SQL condition and parameters limiting results to what ``user`` may see"""
+    if user.is_admin():
+        return '1 = 1', []
+    return "(d.owner_id = %s OR (d.kind = 'notice' AND d.is_public))", [user.pk]
+
+
+def search(user, query, limit=20):
+    """Ranked, highlighted matches for ``query`` that ``user`` is allowed to see.
+
+    Each word in the query is matched as a prefix and all words must match.
+    """
+    terms = re.findall(r'\w+', query)[:MAX_TERMS]
+    if not terms:
+        return []
+
+    scope, scope_params = _scope(user)
+    if connection.vendor == 'sqlite':
+        sql = f'''
+            SELECT d.kind, d.object_id, d.title,
+                   snippet(core_searchdocument_fts, -1, %s, %s, '…', 16),
+                   bm25(core_searchdocument_fts, 10.0, 1.0) AS rank
+            FROM core_searchdocument_fts
+            JOIN core_searchdocument d ON d.id = core_searchdocument_fts.rowid
+            WHERE core_searchdocument_fts MATCH %s AND {scope}
+            ORDER BY rank
+            LIMIT %s
+        '''
+        match = ' '.join(f'"{term}"*' for term in terms)
+        params = [HIGHLIGHT_START, HIGHLIGHT_END, match, *scope_params, limit]
+    elif connection.vendor == 'postgresql':
+        sql = f'''
+            SELECT d.kind, d.object_id, d.title,
+                   ts_headline('english', d.title || ' ' || d.body, q.query,
+                               'StartSel=' || %s || ', StopSel=' || %s || ', MaxWords=30, MinWords=10'),
+                   -ts_rank(d.search_vector, q.query) AS rank
+            FROM core_searchdocument d, to_tsquery('english', %s) AS q(query)
+            WHERE d.search_vector @@ q.query AND {scope}
+            ORDER BY rank
+            LIMIT %s
+        '''
+        match = ' & '.join(f'{term}:*' for term in terms)
+        params = [HIGHLIGHT_START, HIGHLIGHT_END, match, *scope_params, limit]
+    else:
+        return _fallback_search(user, terms, limit)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    return [SearchResult(kind, object_id, title, _highlight(snippet), rank)
+            for kind, object_id, title, snippet, rank in rows]
+
+
+def _fallback_search(user, terms, limit):
+    """Unranked icontains search for backends without a text index"""
+    documents = SearchDocument.objects.all()
+    if not user.is_admin():
+        documents = documents.filter(Q(owner=user) | Q(kind='notice', is_public=True))
+    for term in terms:
+        documents = documents.filter(Q(title__icontains=term) | Q(body__icontains=term))
+    return [SearchResult(d.kind, d.object_id, d.title, escape(d.body[:200]), 0)
+            for d in documents.order_by('-updated_at')[:limit]]
@@ -0,0 +1,294 @@
+import datetime
+import random
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from .models import Employee, Notice, Attendance, Work, Request
+from .hours import compute_hours
+from .search import add_to_index
+from .stats import rebuild_stats
+
+SEED_PASSWORD = 'password'
+# Departments with their relative headcount
+DEPARTMENTS = {
+    'Engineering': 30, 'Sales': 20, 'Support': 15, 'Operations': 12,
+    'Marketing': 10, 'Finance': 8, 'HR': 5,
+}
+POSITIONS = {'Associate': 40, 'Engineer': 25, 'Analyst': 20, 'Manager': 12, 'Director': 3}
+# Absence is likelier either side of the weekend (Monday = 0)
+WEEKDAY_ABSENCE = [1.4, 0.9, 0.8, 0.9, 1.3]
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """Let bulk_create keep the auto_now_add values the seeder chose"""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class OrgSeeder:
+    """Fill the database with a synthetic organisation using bulk_create.
+
+    The same ``seed`` always produces the same rows. Every account gets the
+    password SEED_PASSWORD; the admin is ``<prefix>admin`` and employees are
+    ``<prefix>000001`` onwards. Distributions aim to look like a real
+    company: staff join and leave over the period, absences bunch around
+    weekends, leave comes in multi-day blocks, and older work and requests
+    are more likely to be closed.
+
+    The history ends on ``today`` (default: the current date), so a fixed
+    ``today`` reproduces the same rows on any day. WorkingHours, which take
+    longer to compute than everything else, are skipped with ``hours=False``;
+    run compute_hours for the seeded range later.
+    """
+
+    def __init__(self, employees=100, years=1, work=1000, requests=1000, notices=50,
+                 seed=0, prefix='emp', batch_size=5000, progress=None, today=None, hours=True):
+        self.employees = employees
+        self.years = years
+        self.work = work
+        self.requests = requests
+        self.notices = notices
+        self.random = random.Random(seed)
+        self.prefix = prefix
+        self.batch_size = batch_size
+        self.progress = progress
+        self.hours = hours
+        self.today = today or timezone.localdate()
+        self.start = self.today - datetime.timedelta(days=round(365 * years))
+        end_of_today = timezone.make_aware(datetime.datetime.combine(self.today, datetime.time.max))
+        self.now = min(timezone.now(), end_of_today)
+
+    def run(self):
+        """Create everything and return the number of rows per model"""
+        password = make_password(SEED_PASSWORD)
+        admin = CustomUser.objects.create(username=f'{self.prefix}admin', password=password,
+                                          role='ADMIN', is_staff=True, first_name='Admin')
+        counts = {'users': self.create_users(password) + 1}
+        users = list(CustomUser.objects.filter(role='EMPLOYEE', username__startswith=self.prefix)
+                     .order_by('pk').values_list('pk', flat=True))
+        profiles = self.create_profiles(users)
+        counts['employees'] = len(profiles)
+        # Work and requests only go to people employed during the period
+        working = [p for p in profiles if p[1] <= p[2]] or profiles
+        with explicit_timestamps(Notice._meta.get_field('published_date'),
+                                 Work._meta.get_field('assigned_date'),
+                                 Request._meta.get_field('submitted_date')):
+            counts['notices'] = self.create_notices(admin)
+            counts['attendance'] = self.create_attendance(profiles)
+            counts['work'] = self.create_work(admin, working)
+            counts['requests'] = self.create_requests(working)
+        # bulk_create sends no signals, so derived tables are rebuilt here,
+        # for the seeded accounts only
+        rebuild_stats([admin.pk, *users])
+        add_to_index([
+            Notice.objects.filter(published_by=admin),
+            Work.objects.filter(assigned_by=admin),
+            Request.objects.filter(employee__role='EMPLOYEE', employee__username__startswith=self.prefix),
+        ])
+        if self.hours:
+            counts['hours'] = compute_hours(self.start, self.today, users)
+        return counts
+
+    def bulk(self, model, rows):
+        """bulk_create an iterable of unsaved rows a batch at a time"""
+        total, batch = 0, []
+        with transaction.atomic():
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= self.batch_size:
+                    model.objects.bulk_create(batch)
+                    total += len(batch)
+                    batch = []
+                    if self.progress:
+                        self.progress(model, total)
+            model.objects.bulk_create(batch)
+        return total + len(batch)
+
+    def insert_rows(self, model, field_names, rows):
+        """Insert tuples of database-ready values with multi-row INSERTs.
+
+        The same statements bulk_create issues, minus its per-field work on
+        model instances, which dominates at attendance volumes.
+        """
+        fields = [model._meta.get_field(name) for name in field_names]
+        qn = connection.ops.quote_name
+        prefix = f'INSERT INTO {qn(model._meta.db_table)} ({", ".join(qn(f.column) for f in fields)}) '
+        per_statement = connection.ops.bulk_batch_size(fields, [None] * self.batch_size)
+        statements = {}
+        total = 0
+
+        def execute(cursor, batch):
+            if len(batch) not in statements:
+                placeholders = [['%s'] * len(fields)] * len(batch)
+                statements[len(batch)] = prefix + connection.ops.bulk_insert_sql(fields, placeholders)
+            cursor.execute(statements[len(batch)], [value for row in batch for value in row])
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= per_statement:
+                    execute(cursor, batch)
+                    total += len(batch)
+                    batch = []
+                    if self.progress and total % self.batch_size < per_statement:
+                        self.progress(model, total)
+            if batch:
+                execute(cursor, batch)
+                total += len(batch)
+        return total
+
+    def weighted(self, table):
+        return self.random.choices(list(table), list(table.values()))[0]
+
+    def moment(self, day, hour=9, spread=2):
+        """An aware datetime during working hours on ``day``"""
+        minutes = self.random.randrange(spread * 60)
+        naive = datetime.datetime.combine(day, datetime.time(hour)) + datetime.timedelta(minutes=minutes)
+        return min(timezone.make_aware(naive), self.now)
+
+    def create_users(self, password):
+        return self.bulk(CustomUser, (
+            CustomUser(username=f'{self.prefix}{n:06d}', employee_id=f'{self.prefix.upper()}{n:06d}',
+                       password=password, role='EMPLOYEE', first_name=f'First{n}', last_name=f'Last{n}',
+                       email=f'{self.prefix}{n:06d}@example.com', department=self.weighted(DEPARTMENTS))
+            for n in range(1, self.employees + 1)
+        ))
+
+    def create_profiles(self, users):
+        """Create Employee rows; returns (user id, first day, last day) per employee"""
+        span = (self.today - self.start).days
+        profiles, rows = [], []
+        for user_id in users:
+            # Most staff predate the period, the rest join during it
+            if self.random.random() < 0.7:
+                hired = self.start - datetime.timedelta(days=self.random.randrange(1, 3650))
+            else:
+                hired = self.start + datetime.timedelta(days=self.random.randrange(max(span, 1)))
+            status, last_day = 'ACTIVE', self.today
+            if self.random.random() < 0.08:
+                status = 'INACTIVE'
+                last_day = hired + datetime.timedelta(days=self.random.randrange(30, 1500))
+                if last_day >= self.today:
+                    status, last_day = 'ACTIVE', self.today
+            elif self.random.random() < 0.03:
+                status = 'ON_LEAVE'
+            profiles.append((user_id, max(hired, self.start), last_day))
+            position = self.weighted(POSITIONS)
+            base = {'Associate': 35000, 'Engineer': 60000, 'Analyst': 50000,
+                    'Manager': 80000, 'Director': 120000}[position]
+            rows.append(Employee(user_id=user_id, position=position, hire_date=hired, status=status,
+                                 salary=Decimal(base + self.random.randrange(0, base // 2, 100))))
+        self.bulk(Employee, rows)
+        return profiles
+
+    def create_notices(self, admin):
+        span = max((self.today - self.start).days, 1)
+        rows = []
+        for n in range(1, self.notices + 1):
+            day = self.start + datetime.timedelta(days=self.random.randrange(span))
+            age = (self.today - day).days
+            rows.append(Notice(title=f'Notice {n}', content=f'Announcement number {n} for all staff.',
+                               published_by_id=admin.pk, published_date=self.moment(day),
+                               is_active=age < 90 or self.random.random() < 0.1))
+        return self.bulk(Notice, rows)
+
+    def leave_days(self, first, last):
+        """Days off for one employee, taken as blocks of 1-10 days"""
+        days = set()
+        span = (last - first).days
+        for _ in range(round(span / 365 * self.random.uniform(2, 5))):
+            start = first + datetime.timedelta(days=self.random.randrange(max(span, 1)))
+            for offset in range(self.random.choice([1, 1, 2, 3, 5, 5, 10])):
+                days.add(start + datetime.timedelta(days=offset))
+        return days
+
+    def create_attendance(self, profiles):
+        ops = connection.ops
+        workdays = []
+        day = self.start
+        while day <= self.today:
+            if day.weekday() < 5:
+                workdays.append((day, ops.adapt_datefield_value(day), WEEKDAY_ABSENCE[day.weekday()]))
+            day += datetime.timedelta(days=1)
+        # Database-ready values are computed once, not per row
+        clock = [ops.adapt_timefield_value(datetime.time(h, m)) for h in range(24) for m in range(60)]
+        check_ins, check_outs, half_day_outs = clock[510:630], clock[990:1140], clock[720:810]
+
+        def rows():
+            rand, choice = self.random.random, self.random.choice
+            for user_id, first, last in profiles:
+                leave = self.leave_days(first, last)
+                # Some people are simply absent more often than others
+                absence = self.random.uniform(0.005, 0.04)
+                for day, value, weekday_factor in workdays:
+                    if day < first or day > last:
+                        continue
+                    if day in leave:
+                        yield user_id, value, 'LEAVE', None, None, ''
+                        continue
+                    roll = rand()
+                    threshold = absence * weekday_factor
+                    if roll < threshold:
+                        yield user_id, value, 'ABSENT', None, None, ''
+                    elif roll < threshold + 0.02:
+                        yield user_id, value, 'HALF_DAY', choice(check_ins), choice(half_day_outs), ''
+                    else:
+                        yield user_id, value, 'PRESENT', choice(check_ins), choice(check_outs), ''
+        return self.insert_rows(Attendance, ['employee', 'date', 'status', 'check_in', 'check_out', 'notes'],
+                                rows())
+
+    def create_work(self, admin, profiles):
+        priorities = {'LOW': 20, 'MEDIUM': 45, 'HIGH': 25, 'URGENT': 10}
+        rows = []
+        for n in range(1, self.work + 1):
+            user_id, first, last = self.random.choice(profiles)
+            span = max((last - first).days, 1)
+            assigned = first + datetime.timedelta(days=self.random.randrange(span))
+            age = (self.today - assigned).days
+            # The older the item, the likelier it has been closed
+            closed = self.random.random() < min(0.97, age / 30)
+            if closed:
+                status = 'CANCELLED' if self.random.random() < 0.07 else 'COMPLETED'
+            else:
+                status = 'IN_PROGRESS' if self.random.random() < 0.45 else 'PENDING'
+            completed = None
+            if status == 'COMPLETED':
+                completed = self.moment(assigned + datetime.timedelta(days=self.random.randrange(1, 30)))
+            rows.append(Work(title=f'Task {n}', description=f'Synthetic work item {n}.',
+                             assigned_to_id=user_id, assigned_by_id=admin.pk,
+                             assigned_date=self.moment(assigned), completed_date=completed,
+                             due_date=assigned + datetime.timedelta(days=self.random.randrange(3, 30)),
+                             status=status, priority=self.weighted(priorities)))
+        return self.bulk(Work, rows)
+
+    def create_requests(self, profiles):
+        types = {'LEAVE': 55, 'EQUIPMENT': 20, 'ADVANCE': 10, 'OTHER': 15}
+        rows = []
+        for n in range(1, self.requests + 1):
+            user_id, first, last = self.random.choice(profiles)
+            span = max((last - first).days, 1)
+            submitted = first + datetime.timedelta(days=self.random.randrange(span))
+            age = (self.today - submitted).days
+            status, response, responded = 'PENDING', '', None
+            if self.random.random() < min(0.98, age / 7):
+                status = 'APPROVED' if self.random.random() < 0.8 else 'REJECTED'
+                response = 'Approved.' if status == 'APPROVED' else 'Not possible at this time.'
+                responded = self.moment(submitted + datetime.timedelta(days=self.random.randrange(0, 5)))
+            request_type = self.weighted(types)
+            rows.append(Request(employee_id=user_id, request_type=request_type,
+                                subject=f'{request_type.title()} request {n}',
+                                description=f'Synthetic request {n}.', submitted_date=self.moment(submitted),
+                                status=status, admin_response=response, responded_date=responded))
+        return self.bulk(Request, rows)
@@ -0,0 +1,276 @@
+import functools
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from . import events, metrics, outbox
+from .counters import invalidate_employee_counters, invalidate_admin_counters
+from .fragments import bump_notice_version
+from .hours import compute_hours
+from .models import Notice, Attendance, Work, Request, EmployeeStats
+from .search import index_document, remove_document
+from .stats import (WORK_STATUS_FIELDS, ATTENDANCE_STATUS_FIELDS, apply_delta, apply_load_delta,
+                    create_stats, current_month, month_bounds)
+from .workqueue import OPEN_STATUSES, item_load
+
+# Columns of each model that decide which EmployeeStats counter a row feeds
+STATS_FIELDS = {
+    Work: ('assigned_to_id', 'status', 'priority', 'due_date'),
+    Request: ('employee_id', 'status'),
+    Attendance: ('employee_id', 'date', 'status'),
+}
+
+
+def skip_raw(handler):
+    """Ignore saves made by loaddata: fixtures carry their derived rows as they are"""
+    @functools.wraps(handler)
+    def wrapper(sender, **kwargs):
+        if kwargs.get('raw'):
+            return None
+        return handler(sender, **kwargs)
+    return wrapper
+
+
+def stats_contribution(sender, values):
+    """Return the (user id, counter field) a row with ``values`` counts towards"""
+    if values is None:
+        return None
+    if sender is Work:
+        return values['assigned_to_id'], WORK_STATUS_FIELDS.get(values['status'])
+    if sender is Request:
+        return values['employee_id'], 'open_requests' if values['status'] == 'PENDING' else None
+    start, end = month_bounds(current_month())
+    if not start <= values['date'] < end:
+        return values['employee_id'], None
+    return values['employee_id'], ATTENDANCE_STATUS_FIELDS.get(values['status'])
+
+
+def record_stats_change(sender, old_values, new_values):
+    deltas = defaultdict(lambda: defaultdict(int))
+    for contribution, sign in ((stats_contribution(sender, old_values), -1),
+                               (stats_contribution(sender, new_values), 1)):
+        if contribution and contribution[1]:
+            user_id, field = contribution
+            deltas[user_id][field] += sign
+    for user_id, fields in deltas.items():
+        apply_delta(user_id, fields)
+    if sender is Work:
+        record_load_change(old_values, new_values)
+
+
+def record_load_change(old_values, new_values):
+    """Move the work loads of the assignees of an open item"""
+    loads = defaultdict(int)
+    for values, sign in ((old_values, -1), (new_values, 1)):
+        if values is not None and values['status'] in OPEN_STATUSES:
+            loads[values['assigned_to_id']] += sign * item_load(values['priority'], values['due_date'])
+    for user_id, change in loads.items():
+        apply_load_delta(user_id, change)
+
+
+def tracked_values(sender, instance):
+    """The instance's STATS_FIELDS, converted as the database would return them.
+
+    Assigned values need not be the field's type yet (``date='2024-05-01'``
+    is a valid save), and the counters compare dates.
+    """
+    return {name: sender._meta.get_field(name).to_python(getattr(instance, name))
+            for name in STATS_FIELDS[sender]}
+
+
+def changes_admin_totals(sender, update_fields=None, **kwargs):
+    """Whether a save or delete can move the admin dashboard totals.
+
+    A user save limited to other fields than the role, such as the
+    last_login update on every login, cannot.
+    """
+    if sender._meta.label != settings.AUTH_USER_MODEL or update_fields is None:
+        return True
+    return 'role' in update_fields
+
+
+def assignees(work):
+    """The work's assignee, and the previous one if this save reassigned it"""
+    user_ids = {work.assigned_to_id}
+    stored = getattr(work, '_stored_values', None)
+    if stored is not None:
+        user_ids.add(stored['assigned_to_id'])
+    return user_ids
+
+
+@receiver(pre_save, sender=Work)
+@receiver(pre_save, sender=Request)
+@receiver(pre_save, sender=Attendance)
+@skip_raw
+def remember_stored_values(sender, instance, **kwargs):
+    """Keep the stored row so post_save can work out the counter delta.
+
+    The row is locked until the save commits, so a concurrent save of the
+    same row reads the values this one writes rather than the same old
+    ones. SQLite has no row locks; there the second writer fails with
+    "database is locked" instead of applying a stale delta.
+    """
+    instance._stored_values = None
+    if instance.pk:
+        instance._stored_values = (sender.objects.select_for_update().filter(pk=instance.pk)
+                                   .values(*STATS_FIELDS[sender]).first())
+
+
+@receiver(post_save, sender=Work)
+@receiver(post_save, sender=Request)
+@receiver(post_save, sender=Attendance)
+@skip_raw
+def stats_row_saved(sender, instance, **kwargs):
+    """Move the affected EmployeeStats counters within the save's transaction"""
+    stored = getattr(instance, '_stored_values', None)
+    record_stats_change(sender, stored, tracked_values(sender, instance))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@skip_raw
+def stats_user_saved(sender, instance, created, update_fields=None, **kwargs):
+    """Give new users a stats row and keep its copy of the department current"""
+    if created:
+        create_stats([instance])
+    elif update_fields is None or 'department' in update_fields:
+        (EmployeeStats.objects.filter(pk=instance.pk).exclude(department=instance.department)
+         .update(department=instance.department))
+
+
+@receiver(post_save, sender=Work)
+@receiver(post_save, sender=Request)
+@receiver(post_save, sender=Attendance)
+@skip_raw
+def write_counted(sender, instance, created, **kwargs):
+    """Count creates and status transitions for /metrics once committed"""
+    stored = getattr(instance, '_stored_values', None)
+    old_status = None if created or stored is None else stored['status']
+    new_status = instance.status
+    transaction.on_commit(lambda: metrics.record_write(sender.__name__, old_status, new_status))
+
+
+@receiver(post_save, sender=Work)
+@receiver(post_save, sender=Request)
+@skip_raw
+def queue_notification(sender, instance, created, **kwargs):
+    """Add the employee's notification to the outbox in the save's transaction"""
+    stored = getattr(instance, '_stored_values', None)
+    if sender is Work:
+        # New work, or work handed to someone else
+        if created or stored is None or stored['assigned_to_id'] != instance.assigned_to_id:
+            outbox.work_assigned(instance)
+        return
+    if stored is not None and stored['status'] == 'PENDING' and instance.status != 'PENDING':
+        outbox.request_answered(instance)
+
+
+@receiver(post_delete, sender=Work)
+@receiver(post_delete, sender=Request)
+@receiver(post_delete, sender=Attendance)
+@skip_raw
+def stats_row_deleted(sender, instance, **kwargs):
+    record_stats_change(sender, tracked_values(sender, instance), None)
+
+
+@receiver(post_save, sender=Attendance)
+@receiver(post_delete, sender=Attendance)
+@skip_raw
+def attendance_hours_changed(sender, instance, **kwargs):
+    """Recompute the WorkingHours week(s) the row was and is now in"""
+    current = tracked_values(sender, instance)
+    weeks = {(current['employee_id'], current['date'])}
+    stored = getattr(instance, '_stored_values', None)
+    if stored is not None:
+        weeks.add((stored['employee_id'], stored['date']))
+    for employee_id, day in weeks:
+        compute_hours(day, day, [employee_id])
+
+
+@receiver(post_save, sender=Notice)
+@receiver(post_save, sender=Work)
+@receiver(post_save, sender=Request)
+@skip_raw
+def searchable_saved(sender, instance, **kwargs):
+    """Refresh the search index entry for the saved row"""
+    index_document(instance)
+
+
+@receiver(post_delete, sender=Notice)
+@receiver(post_delete, sender=Work)
+@receiver(post_delete, sender=Request)
+@skip_raw
+def searchable_deleted(sender, instance, **kwargs):
+    remove_document(instance)
+
+
+@receiver(post_save, sender=Notice)
+@receiver(post_delete, sender=Notice)
+@skip_raw
+def notice_changed(sender, instance, **kwargs):
+    """Retire the cached notice fragments, in the same transaction as the change"""
+    bump_notice_version()
+
+
+@receiver(post_save, sender=Work)
+@receiver(post_delete, sender=Work)
+@skip_raw
+def work_changed(sender, instance, **kwargs):
+    """Drop the cached dashboard counters affected by a work change"""
+    for user_id in assignees(instance):
+        transaction.on_commit(lambda user_id=user_id: invalidate_employee_counters(user_id))
+    transaction.on_commit(invalidate_admin_counters)
+
+
+@receiver(post_save, sender=Request)
+@receiver(post_delete, sender=Request)
+@receiver(post_save, sender=Notice)
+@receiver(post_delete, sender=Notice)
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+@skip_raw
+def admin_totals_changed(sender, instance, **kwargs):
+    """Drop the cached admin dashboard counters"""
+    if changes_admin_totals(sender, **kwargs):
+        transaction.on_commit(invalidate_admin_counters)
+
+
+# Live dashboard events. Defined last so that their on_commit callbacks run
+# after the counter caches above have been dropped.
+
+@receiver(post_save, sender=Work)
+@receiver(post_delete, sender=Work)
+@skip_raw
+def work_event(sender, instance, created=False, **kwargs):
+    employee = f'user:{instance.assigned_to_id}'
+    if created:
+        data = {'id': instance.pk, 'title': instance.title, 'priority': instance.priority,
+                'due_date': instance.due_date}
+        transaction.on_commit(lambda: events.publish('work', employee, **data))
+        transaction.on_commit(lambda: events.publish('work', 'admins', **data))
+    transaction.on_commit(lambda: events.publish('counters', employee))
+
+
+@receiver(post_save, sender=Notice)
+@skip_raw
+def notice_event(sender, instance, created, **kwargs):
+    if created and instance.is_active:
+        data = {'id': instance.pk, 'title': instance.title}
+        transaction.on_commit(lambda: events.publish('notice', 'all', **data))
+
+
+@receiver(post_save, sender=Work)
+@receiver(post_delete, sender=Work)
+@receiver(post_save, sender=Request)
+@receiver(post_delete, sender=Request)
+@receiver(post_save, sender=Notice)
+@receiver(post_delete, sender=Notice)
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+@skip_raw
+def admin_counters_event(sender, instance, **kwargs):
+    if not changes_admin_totals(sender, **kwargs):
+        return
+    transaction.on_commit(lambda: events.publish('counters', 'admins'))
@@ -0,0 +1,78 @@
+"""A local SMTP stand-in for development and tests.
+
+Speaks just enough SMTP for Django's SMTP backend (no TLS, no auth) and
+accepts every message, keeping the parsed messages in ``messages``.
+"""
+import asyncio
+import email
+import threading
+
+
+class SMTPSink:
+    def __init__(self, on_message=None):
+        self.messages = []
+        self.on_message = on_message
+
+    def start(self, host='127.0.0.1', port=1025):
+        """Serve from a background thread; returns the bound port"""
+        self.loop = asyncio.new_event_loop()
+        self.server = self.loop.run_until_complete(asyncio.start_server(self.handle, host, port))
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        return self.server.sockets[0].getsockname()[1]
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.server.close()
+        self.loop.run_until_complete(self.server.wait_closed())
+        self.loop.close()
+
+    def received(self, sender, recipients, data):
+        message = email.message_from_bytes(data)
+        self.messages.append(message)
+        if self.on_message:
+            self.on_message(sender, recipients, message)
+
+    async def handle(self, reader, writer):
+        writer.write(b'220 localhost SMTP sink\r\n')
+        sender, recipients = None, []
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            command = line.decode('utf-8', 'replace').rstrip('\r\n')
+            verb = command[:4].upper()
+            if verb in ('HELO', 'EHLO'):
+                reply = '250 localhost'
+            elif verb == 'MAIL':
+                sender, recipients = command.partition(':')[2].strip(), []
+                reply = '250 OK'
+            elif verb == 'RCPT':
+                recipients.append(command.partition(':')[2].strip())
+                reply = '250 OK'
+            elif verb == 'DATA':
+                writer.write(b'354 End data with <CR><LF>.<CR><LF>\r\n')
+                await writer.drain()
+                lines = []
+                while True:
+                    line = await reader.readline()
+                    if not line or line in (b'.\r\n', b'.\n'):
+                        break
+                    # Undo dot-stuffing
+                    lines.append(line[1:] if line.startswith(b'..') else line)
+                self.received(sender, recipients, b''.join(lines))
+                reply = '250 OK: queued'
+            elif verb in ('RSET', 'NOOP'):
+                if verb == 'RSET':
+                    sender, recipients = None, []
+                reply = '250 OK'
+            elif verb == 'QUIT':
+                writer.write(b'221 Bye\r\n')
+                await writer.drain()
+                break
+            else:
+                reply = '502 Command not implemented'
+            writer.write(f'{reply}\r\n'.encode())
+            await writer.drain()
+        writer.close()
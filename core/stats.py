@@ -0,0 +1,143 @@
+import datetime
+
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from .models import Attendance, Work, Request, EmployeeStats
+from .workqueue import load, open_work
+
+WORK_STATUS_FIELDS = {
+    'PENDING': 'work_pending',
+    'IN_PROGRESS': 'work_in_progress',
+    'COMPLETED': 'work_completed',
+    'CANCELLED': 'work_cancelled',
+}
+
+ATTENDANCE_STATUS_FIELDS = {
+    'PRESENT': 'attendance_present',
+    'ABSENT': 'attendance_absent',
+    'LEAVE': 'attendance_leave',
+    'HALF_DAY': 'attendance_half_day',
+}
+
+COUNTER_FIELDS = [*WORK_STATUS_FIELDS.values(), 'open_requests', *ATTENDANCE_STATUS_FIELDS.values(), 'work_load']
+
+REBUILD_BATCH_SIZE = 1000
+
+
+def current_month():
+    return timezone.localdate().replace(day=1)
+
+
+def month_bounds(month):
+    next_month = (month + datetime.timedelta(days=32)).replace(day=1)
+    return month, next_month
+
+
+def get_stats(user_id):
+    """Return the counters for one user with a primary-key lookup.
+
+    Rows that are missing or still describe last month's attendance are
+    rebuilt on the spot.
+    """
+    stats = EmployeeStats.objects.filter(pk=user_id, month=current_month()).first()
+    if stats is None:
+        rebuild_stats([user_id])
+        stats = EmployeeStats.objects.get(pk=user_id)
+    return stats
+
+
+def apply_delta(user_id, deltas):
+    """Add ``deltas`` (counter field -> change) to one user's stats row.
+
+    A row that is missing or covers an earlier month is left alone;
+    get_stats() rebuilds it from the source tables on the next read.
+    """
+    deltas = {field: change for field, change in deltas.items() if change}
+    if deltas:
+        EmployeeStats.objects.filter(pk=user_id, month=current_month()).update(
+            **{field: F(field) + change for field, change in deltas.items()}
+        )
+
+
+def apply_load_delta(user_id, change, today=None):
+    """Add ``change`` to one user's work load if it was computed for ``today``.
+
+    Loads grow as due dates near, so one computed on an earlier day is
+    stale: it is left alone and rebuilt by rebuild_stats().
+    """
+    if change:
+        EmployeeStats.objects.filter(pk=user_id, load_date=today or timezone.localdate()).update(
+            work_load=F('work_load') + change)
+
+
+def rebuild_stats(user_ids=None, today=None):
+    """Recompute stats rows from the source tables and upsert them.
+
+    With no ``user_ids`` every user is rebuilt, in batches. Work loads are
+    computed for ``today``. Returns the number of rows written.
+    """
+    if user_ids is None:
+        user_ids = CustomUser.objects.order_by('pk').values_list('pk', flat=True).iterator()
+
+    written = 0
+    batch = []
+    for user_id in user_ids:
+        batch.append(user_id)
+        if len(batch) >= REBUILD_BATCH_SIZE:
+            written += _rebuild_batch(batch, today)
+            batch = []
+    if batch:
+        written += _rebuild_batch(batch, today)
+    return written
+
+
+def create_stats(users, today=None):
+    """Add zeroed stats rows for users who have just been created"""
+    today = today or timezone.localdate()
+    EmployeeStats.objects.bulk_create(
+        [EmployeeStats(user_id=user.pk, month=current_month(), load_date=today, department=user.department)
+         for user in users],
+        ignore_conflicts=True,
+    )
+
+
+def _rebuild_batch(user_ids, today=None):
+    month = current_month()
+    start, end = month_bounds(month)
+    today = today or timezone.localdate()
+    departments = dict(CustomUser.objects.filter(pk__in=user_ids).values_list('pk', 'department'))
+    rows = {user_id: EmployeeStats(user_id=user_id, month=month, load_date=today,
+                                   department=departments.get(user_id, ''))
+            for user_id in user_ids}
+
+    work_counts = (Work.objects.filter(assigned_to__in=user_ids)
+                   .order_by().values_list('assigned_to', 'status').annotate(n=Count('pk')))
+    for user_id, status, n in work_counts:
+        if status in WORK_STATUS_FIELDS:
+            setattr(rows[user_id], WORK_STATUS_FIELDS[status], n)
+
+    loads = (open_work().filter(assigned_to__in=user_ids)
+             .order_by().values_list('assigned_to').annotate(total=Sum(load(today))))
+    for user_id, total in loads:
+        rows[user_id].work_load = total
+
+    request_counts = (Request.objects.filter(employee__in=user_ids, status='PENDING')
+                      .order_by().values_list('employee').annotate(n=Count('pk')))
+    for user_id, n in request_counts:
+        rows[user_id].open_requests = n
+
+    attendance_counts = (Attendance.objects.filter(employee__in=user_ids, date__gte=start, date__lt=end)
+                         .order_by().values_list('employee', 'status').annotate(n=Count('pk')))
+    for user_id, status, n in attendance_counts:
+        if status in ATTENDANCE_STATUS_FIELDS:
+            setattr(rows[user_id], ATTENDANCE_STATUS_FIELDS[status], n)
+
+    EmployeeStats.objects.bulk_create(
+        rows.values(),
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=['month', 'load_date', 'department', 'updated_at', *COUNTER_FIELDS],
+    )
+    return len(rows)
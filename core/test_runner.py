@@ -0,0 +1,22 @@
+import logging
+
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """DiscoverRunner that keeps the profiling warnings out of the output.
+
+    Test requests routinely go over the profiling budgets; the tests about
+    those warnings capture them with assertLogs, which installs a handler
+    of its own while it runs.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        logger = logging.getLogger('emp_system.profiling')
+        self.profiling_handlers = logger.handlers
+        logger.handlers = [logging.NullHandler()]
+
+    def teardown_test_environment(self, **kwargs):
+        logging.getLogger('emp_system.profiling').handlers = self.profiling_handlers
+        super().teardown_test_environment(**kwargs)
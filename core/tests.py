@@ -1,3 +1,1752 @@
-from django.test import TestCase
+import asyncio
+import codecs
+import csv
+import datetime
+import io
+import json
+import os
+import re
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from unittest import mock
+from xml.etree import ElementTree
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import update_last_login
+from django.core import mail, serializers
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.core.cache import cache, caches
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections
+from django.db.models import Q
+from django.db import connection, connections, transaction
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+
+from accounts.models import CustomUser
+from . import events, metrics, outbox, reports, search
+from .asgi import ASGIHandler
+from .assignment import suggest_assignees
+from .benchmark import BENCHMARK_SETTINGS, DEFAULT_BASELINE, SCENARIOS, compare, load_baseline, run_benchmark
+from .cache import FakeRedisCache, FileBasedCache, LocMemCache
+from .counters import admin_counters, employee_counters
+from .exports import csv_stream, export_rows, xlsx_stream
+from .fragments import bump_notice_version, notice_version
+from .importers import EmployeeImporter
+from .hours import compute_hours
+from .kiosk import process_taps, record_tap
+from .middleware import RequestProfilingMiddleware
+from .models import (Employee, Notice, Attendance, Work, Request, WorkingHours, OutboxMessage, Notification,
+                     EmployeeStats, SearchDocument)
+from .pagination import InvalidCursor, KeysetPaginator
+from .profiling import RequestTimings, log_slow_queries
+from .seeding import OrgSeeder
+from .smtp_sink import SMTPSink
+from .stats import current_month, get_stats, rebuild_stats
+from .workqueue import my_queue, overdue_queue
+
+
+class KeysetPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Seven users over three departments, so the sort key has ties
+        cls.users = [CustomUser.objects.create_user(f'page{n}', password='pw', department=f'D{n % 3}')
+                     for n in range(7)]
+
+    def paginator(self, per_page=3):
+        return KeysetPaginator(CustomUser.objects.filter(username__startswith='page'),
+                               per_page=per_page, ordering=['department'])
+
+    def expected(self):
+        return [u.username for u in sorted(self.users, key=lambda u: (u.department, u.pk))]
+
+    def test_forward_and_back(self):
+        paginator = self.paginator()
+        first = paginator.page()
+        second = paginator.page(after=first.next_cursor)
+        third = paginator.page(after=second.next_cursor)
+        pages = [[u.username for u in page] for page in (first, second, third)]
+        self.assertEqual(sum(pages, []), self.expected())
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertFalse(first.has_previous)
+        self.assertFalse(third.has_next)
+
+        back = paginator.page(before=third.previous_cursor)
+        self.assertEqual([u.username for u in back], pages[1])
+        self.assertEqual([u.username for u in paginator.page(before=back.previous_cursor)], pages[0])
+        self.assertFalse(paginator.page(before=back.previous_cursor).has_previous)
+
+    def test_ties_are_not_skipped_or_repeated(self):
+        # One row per page: every cursor falls inside a run of equal departments
+        paginator = self.paginator(per_page=1)
+        seen, page = [], paginator.page()
+        while True:
+            seen.extend(u.username for u in page)
+            if not page.has_next:
+                break
+            page = paginator.page(after=page.next_cursor)
+        self.assertEqual(seen, self.expected())
+
+    @override_settings(STORAGES=BENCHMARK_SETTINGS['STORAGES'])
+    def test_invalid_cursor(self):
+        paginator = self.paginator()
+        for cursor in ('not base64!', 'bm90IGpzb24', 'WyJEMCJd', 'WyJEMCIsIngiXQ', 'W251bGwsbnVsbF0',
+                       'WyJEMCIsbnVsbF0'):
+            with self.subTest(cursor=cursor), self.assertRaises(InvalidCursor):
+                paginator.page(after=cursor)
+        self.client.force_login(CustomUser.objects.create_user('page_admin', password='pw', role='ADMIN'))
+        for cursor in ('WyJEMCIsIngiXQ', 'W251bGwsbnVsbF0'):
+            for url in ('/admin-panel/employees/', '/admin-panel/attendance/'):
+                with self.subTest(url=url, cursor=cursor):
+                    self.assertEqual(self.client.get(f'{url}?after={cursor}').status_code, 200)
+
+    def test_empty_page(self):
+        page = KeysetPaginator(CustomUser.objects.filter(username='nobody')).page()
+        self.assertEqual(len(page), 0)
+        self.assertFalse(page.has_other_pages)
+        last = self.paginator(per_page=7).page()
+        self.assertFalse(last.has_next)
+
+
+@override_settings(DASHBOARD_COUNTER_TIMEOUT=300)
+class DashboardCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user('counter_admin', password='pw', role='ADMIN')
+        cls.ann = CustomUser.objects.create_user('counter_ann', password='pw', role='EMPLOYEE')
+        cls.bob = CustomUser.objects.create_user('counter_bob', password='pw', role='EMPLOYEE')
+
+    def setUp(self):
+        cache.clear()
+
+    def work(self, user, status='PENDING'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Work.objects.create(title='Job', description='Body', assigned_to=user, assigned_by=self.admin,
+                                       status=status, due_date=datetime.date(2024, 1, 2))
+
+    def test_counts_and_caching(self):
+        self.work(self.ann)
+        self.work(self.ann, 'IN_PROGRESS')
+        self.work(self.ann, 'COMPLETED')
+        self.assertEqual(employee_counters(self.ann), {
+            'total_work': 3, 'pending_work': 1, 'in_progress_work': 1, 'completed_work': 1,
+        })
+        self.assertEqual(admin_counters(), {
+            'total_employees': 2, 'total_notices': 0, 'pending_requests': 0, 'active_work': 2,
+        })
+        with self.assertNumQueries(0):
+            employee_counters(self.ann)
+            admin_counters()
+
+    def test_work_changes_invalidate(self):
+        job = self.work(self.ann)
+        employee_counters(self.ann)
+        admin_counters()
+        with self.captureOnCommitCallbacks(execute=True):
+            job.status = 'COMPLETED'
+            job.save()
+        self.assertEqual(employee_counters(self.ann)['completed_work'], 1)
+        self.assertEqual(admin_counters()['active_work'], 0)
+
+    def test_logins_keep_admin_counters(self):
+        admin_counters()
+        with self.captureOnCommitCallbacks(execute=True):
+            update_last_login(None, self.ann)
+        with self.assertNumQueries(0):
+            admin_counters()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ann.role = 'ADMIN'
+            self.ann.save()
+        self.assertEqual(admin_counters()['total_employees'], 1)
+
+    def test_reassignment_invalidates_both_employees(self):
+        job = self.work(self.ann)
+        self.assertEqual(employee_counters(self.ann)['total_work'], 1)
+        self.assertEqual(employee_counters(self.bob)['total_work'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            job.assigned_to = self.bob
+            job.save()
+        self.assertEqual(employee_counters(self.ann)['total_work'], 0)
+        self.assertEqual(employee_counters(self.bob)['total_work'], 1)
+
+
+class EmployeeStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user('stats_admin', password='pw', role='ADMIN')
+        cls.ann = CustomUser.objects.create_user('stats_ann', password='pw', role='EMPLOYEE')
+        cls.bob = CustomUser.objects.create_user('stats_bob', password='pw', role='EMPLOYEE')
+
+    def setUp(self):
+        self.today = timezone.localdate()
+
+    def counters(self, user, *fields):
+        return EmployeeStats.objects.values_list(*fields).get(pk=user.pk)
+
+    def work(self, user, status='PENDING'):
+        return Work.objects.create(title='Job', description='Body', assigned_to=user, assigned_by=self.admin,
+                                   status=status, due_date=self.today)
+
+    def test_create_update_delete(self):
+        job = self.work(self.ann)
+        self.assertEqual(self.counters(self.ann, 'work_pending', 'work_in_progress'), (1, 0))
+        job.status = 'IN_PROGRESS'
+        job.save()
+        self.assertEqual(self.counters(self.ann, 'work_pending', 'work_in_progress'), (0, 1))
+        job.delete()
+        self.assertEqual(self.counters(self.ann, 'work_pending', 'work_in_progress'), (0, 0))
+
+        request = Request.objects.create(employee=self.ann, request_type='LEAVE', subject='Off', description='')
+        self.assertEqual(self.counters(self.ann, 'open_requests'), (1,))
+        request.status = 'APPROVED'
+        request.save()
+        self.assertEqual(self.counters(self.ann, 'open_requests'), (0,))
+
+        record = Attendance.objects.create(employee=self.ann, date=self.today)
+        self.assertEqual(self.counters(self.ann, 'attendance_present', 'attendance_absent'), (1, 0))
+        record.status = 'ABSENT'
+        record.save()
+        self.assertEqual(self.counters(self.ann, 'attendance_present', 'attendance_absent'), (0, 1))
+        record.delete()
+        self.assertEqual(self.counters(self.ann, 'attendance_present', 'attendance_absent'), (0, 0))
+
+    def test_reassignment(self):
+        job = self.work(self.ann)
+        job.assigned_to = self.bob
+        job.save()
+        self.assertEqual(self.counters(self.ann, 'work_pending'), (0,))
+        self.assertEqual(self.counters(self.bob, 'work_pending'), (1,))
+
+    def test_string_dates(self):
+        Attendance.objects.create(employee=self.ann, date=self.today.isoformat())
+        record = Attendance.objects.create(employee=self.bob, date=str(current_month() - datetime.timedelta(days=1)))
+        self.assertEqual(self.counters(self.ann, 'attendance_present'), (1,))
+        self.assertEqual(self.counters(self.bob, 'attendance_present'), (0,))
+        record.date = self.today.isoformat()
+        record.save()
+        self.assertEqual(self.counters(self.bob, 'attendance_present'), (1,))
+
+    def test_month_rollover(self):
+        # Last month's row: deltas leave it alone and the next read rebuilds it
+        last_month = (current_month() - datetime.timedelta(days=1)).replace(day=1)
+        Attendance.objects.create(employee=self.ann, date=last_month)
+        EmployeeStats.objects.filter(pk=self.ann.pk).update(month=last_month, attendance_present=5)
+        Attendance.objects.create(employee=self.ann, date=self.today, status='LEAVE')
+        self.assertEqual(self.counters(self.ann, 'attendance_present', 'attendance_leave'), (5, 0))
+        stats = get_stats(self.ann.pk)
+        self.assertEqual((stats.month, stats.attendance_present, stats.attendance_leave), (current_month(), 0, 1))
+
+    def test_fixture_loads_have_no_side_effects(self):
+        fixture = serializers.serialize('json', [
+            Work(pk=999, title='Loaded', description='Body', assigned_to=self.ann, assigned_by=self.admin,
+                 due_date=self.today, assigned_date=timezone.now()),
+        ])
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            for obj in serializers.deserialize('json', fixture):
+                obj.save()
+        self.assertTrue(Work.objects.filter(pk=999).exists())
+        self.assertEqual(self.counters(self.ann, 'work_pending'), (0,))
+        self.assertFalse(OutboxMessage.objects.exists())
+        self.assertFalse(SearchDocument.objects.filter(kind='work', object_id=999).exists())
+        self.assertEqual(callbacks, [])
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user('search_admin', password='pw', role='ADMIN')
+        cls.ann = CustomUser.objects.create_user('search_ann', password='pw', role='EMPLOYEE')
+        cls.bob = CustomUser.objects.create_user('search_bob', password='pw', role='EMPLOYEE')
+        cls.notice = Notice.objects.create(title='Quarterly budget review', content='Bring the figures',
+                                           published_by=cls.admin)
+        cls.hidden = Notice.objects.create(title='Budget draft', content='Not yet', published_by=cls.admin,
+                                           is_active=False)
+        cls.ann_work = Work.objects.create(title='Prepare invoices', description='Budget <b>lines</b> for Q3',
+                                           assigned_to=cls.ann, assigned_by=cls.admin,
+                                           due_date=datetime.date(2024, 1, 2))
+        cls.bob_request = Request.objects.create(employee=cls.bob, request_type='LEAVE', subject='Budget leave',
+                                                 description='Travel')
+
+    def found(self, user, query):
+        return [(result.kind, result.object_id) for result in search.search(user, query)]
+
+    def test_prefix_and_all_words(self):
+        self.assertEqual(self.found(self.admin, 'invoi'), [('work', self.ann_work.pk)])
+        self.assertEqual(self.found(self.admin, 'budget figures'), [('notice', self.notice.pk)])
+        self.assertEqual(self.found(self.admin, 'budget nothing'), [])
+        self.assertEqual(self.found(self.admin, '"*) OR ('), [])
+
+    def test_title_matches_rank_first(self):
+        self.assertEqual(self.found(self.admin, 'budget')[-1], ('work', self.ann_work.pk))
+
+    def test_role_scoping(self):
+        self.assertEqual(len(self.found(self.admin, 'budget')), 4)
+        self.assertEqual(set(self.found(self.ann, 'budget')), {('notice', self.notice.pk), ('work', self.ann_work.pk)})
+        self.assertEqual(set(self.found(self.bob, 'budget')),
+                         {('notice', self.notice.pk), ('request', self.bob_request.pk)})
+
+    def test_highlight_escapes_text(self):
+        result, = search.search(self.ann, 'lines')
+        self.assertIn('<mark>lines</mark>', result.snippet)
+        self.assertIn('&lt;b&gt;', result.snippet)
+
+    def test_index_follows_changes(self):
+        self.ann_work.assigned_to = self.bob
+        self.ann_work.save()
+        self.assertEqual(self.found(self.ann, 'invoices'), [])
+        self.assertEqual(self.found(self.bob, 'invoices'), [('work', self.ann_work.pk)])
+        self.notice.is_active = False
+        self.notice.save()
+        self.assertEqual(self.found(self.bob, 'quarterly'), [])
+        self.bob_request.delete()
+        self.assertEqual(self.found(self.admin, 'leave'), [])
+
+    def test_rebuild_index(self):
+        SearchDocument.objects.all().delete()
+        self.assertEqual(search.rebuild_index(batch_size=2), 4)
+        self.assertEqual(self.found(self.ann, 'invoices'), [('work', self.ann_work.pk)])
+
+    def test_fallback_search(self):
+        results = search._fallback_search(self.bob, ['budget'], 20)
+        self.assertEqual({(r.kind, r.object_id) for r in results},
+                         {('notice', self.notice.pk), ('request', self.bob_request.pk)})
+
+    @override_settings(STORAGES=BENCHMARK_SETTINGS['STORAGES'])
+    def test_search_page(self):
+        self.client.force_login(self.ann)
+        response = self.client.get('/search/', {'q': 'invoices'})
+        self.assertContains(response, '<mark>invoices</mark>', html=False)
+        self.assertNotContains(response, 'Budget leave')
+
+
+@override_settings(STORAGES=BENCHMARK_SETTINGS['STORAGES'])
+class NoticeFragmentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user('fragment_admin', password='pw', role='ADMIN')
+        cls.user = CustomUser.objects.create_user('fragment_user', password='pw', role='EMPLOYEE')
+        cls.notice = Notice.objects.create(title='Office closed', content='Friday', published_by=cls.admin)
+
+    def setUp(self):
+        caches['template_fragments'].clear()
+        self.client.force_login(self.user)
+
+    def notice_board(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/employee-panel/notices/')
+        self.assertEqual(response.status_code, 200)
+        notice_queries = [q for q in queries.captured_queries if 'FROM "core_notice"' in q['sql']]
+        return response.content.decode(), len(notice_queries)
+
+    def test_bump(self):
+        version = notice_version()
+        bump_notice_version()
+        self.assertNotEqual(notice_version(), version)
+
+    def test_version_is_shared_through_the_database(self):
+        version = notice_version()
+        # As seen by a process with an empty cache of its own
+        cache.clear()
+        self.assertEqual(notice_version(), version)
+
+    @override_settings(SHARED_CACHE=True)
+    def test_version_in_a_shared_cache(self):
+        with self.assertNumQueries(0):
+            version = notice_version()
+            self.assertEqual(notice_version(), version)
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_notice_version()
+            self.assertEqual(notice_version(), version)
+        self.assertNotEqual(notice_version(), version)
+
+    @override_settings(SHARED_CACHE=True)
+    def test_shared_cache_board_makes_no_queries_once_cached(self):
+        self.notice_board()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/employee-panel/notices/')
+        self.assertFalse([q for q in queries.captured_queries
+                          if 'core_notice' in q['sql'] or 'core_fragmentversion' in q['sql']])
+        with self.captureOnCommitCallbacks(execute=True):
+            Notice.objects.create(title='Fire drill', content='Monday', published_by=self.admin)
+        content, queries = self.notice_board()
+        self.assertEqual(queries, 1)
+        self.assertIn('Fire drill', content)
+
+    def test_cached_board_skips_notice_query(self):
+        self.assertEqual(self.notice_board()[1], 1)
+        content, queries = self.notice_board()
+        self.assertEqual(queries, 0)
+        self.assertIn('Office closed', content)
+
+    def test_changes_retire_the_fragment(self):
+        self.notice_board()
+        Notice.objects.create(title='Fire drill', content='Monday', published_by=self.admin)
+        self.assertIn('Fire drill', self.notice_board()[0])
+        self.notice.title = 'Office open'
+        self.notice.save()
+        self.assertIn('Office open', self.notice_board()[0])
+        self.notice.delete()
+        self.assertNotIn('Office open', self.notice_board()[0])
+
+    def test_admin_edit_retires_the_fragment(self):
+        self.notice_board()
+        admin = Client()
+        admin.force_login(self.admin)
+        response = admin.post(f'/admin-panel/notices/edit/{self.notice.pk}/',
+                   {'title': 'Office closed', 'content': 'Friday', 'is_active': ''})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('No notices available', self.notice_board()[0])
+
+
+@override_settings(**BENCHMARK_SETTINGS)
+class PanelQueryBudgetTests(TestCase):
+    """Query counts of every panel page in the benchmark may not exceed the baseline"""
+    PANELS = ['admin_panel', 'employee_panel']
+
+    @classmethod
+    def setUpTestData(cls):
+        OrgSeeder(employees=3, work=20, requests=20, notices=5).run()
+
+    def test_queries_within_baseline(self):
+        baseline = load_baseline(DEFAULT_BASELINE)
+        for panel in self.PANELS:
+            with self.subTest(panel=panel):
+                scenarios = [s for s in SCENARIOS if s.url_name.startswith(f'{panel}:')]
+                self.assertTrue(scenarios)
+                results = run_benchmark(scenarios, requests=3, concurrency=1, warmup=1)
+                self.assertEqual(len(results), len(scenarios))
+                # Latency is left to the benchmark command; it is too noisy here
+                self.assertEqual(compare(results, baseline, tolerance=float('inf')), [])
+
+
+class SeedOrgTests(TestCase):
+    TODAY = datetime.date(2024, 3, 15)
+
+    def seed(self, prefix, **options):
+        out = io.StringIO()
+        call_command('seed_org', employees=6, years=0.25, work=15, requests=10, notices=4,
+                     today=self.TODAY, prefix=prefix, stdout=out, **options)
+        return out.getvalue()
+
+    def history(self, prefix):
+        rows = (Attendance.objects.filter(employee__username__startswith=prefix)
+                .order_by('employee__username', 'date')
+                .values_list('employee__username', 'date', 'status', 'check_in'))
+        return [(username[len(prefix):], *rest) for username, *rest in rows]
+
+    def test_seeds_an_organisation(self):
+        output = self.seed('s')
+        self.assertIn('log in as sadmin or s000001', output)
+        users = CustomUser.objects.filter(username__startswith='s')
+        self.assertEqual(users.count(), 7)
+        self.assertEqual(Employee.objects.filter(user__in=users).count(), 6)
+        self.assertEqual(Work.objects.filter(assigned_to__in=users).count(), 15)
+        self.assertEqual(Request.objects.filter(employee__in=users).count(), 10)
+        self.assertEqual(EmployeeStats.objects.filter(user__in=users).count(), 7)
+        self.assertEqual(SearchDocument.objects.filter(kind='work').count(), 15)
+        dates = Attendance.objects.filter(employee__in=users).values_list('date', flat=True)
+        self.assertTrue(all(day.weekday() < 5 for day in dates))
+        self.assertLessEqual(max(dates), self.TODAY)
+        self.assertGreaterEqual(min(dates), self.TODAY - datetime.timedelta(days=92))
+        self.assertTrue(WorkingHours.objects.filter(employee__in=users).exists())
+        # Stats match a rebuild from the source rows
+        stats = EmployeeStats.objects.get(user__username='s000001')
+        self.assertEqual(stats.work_pending + stats.work_in_progress + stats.work_completed + stats.work_cancelled,
+                         Work.objects.filter(assigned_to=stats.user_id).count())
+
+    def test_indexes_only_the_seeded_rows(self):
+        admin = CustomUser.objects.create_user('other_admin', password='pw', role='ADMIN')
+        notice = Notice.objects.create(title='Existing', content='Body', published_by=admin)
+        SearchDocument.objects.update(title='Left alone')
+        self.seed('i')
+        self.assertEqual(SearchDocument.objects.get(kind='notice', object_id=notice.pk).title, 'Left alone')
+        self.assertEqual(SearchDocument.objects.count(), 1 + 4 + 15 + 10)
+
+    def test_same_seed_and_day_same_rows(self):
+        self.seed('a')
+        self.seed('b')
+        self.assertTrue(self.history('a'))
+        self.assertEqual(self.history('a'), self.history('b'))
+
+    def test_hours_are_optional_and_limited_to_the_seeded_users(self):
+        other = CustomUser.objects.create_user('other', password='pw')
+        Attendance.objects.create(employee=other, date=self.TODAY, check_in=datetime.time(9),
+                                  check_out=datetime.time(17))
+        WorkingHours.objects.all().delete()
+        self.seed('n', no_hours=True)
+        self.assertFalse(WorkingHours.objects.exists())
+        self.seed('h')
+        self.assertFalse(WorkingHours.objects.filter(employee=other).exists())
+
+    def test_prefix_in_use(self):
+        self.seed('p')
+        with self.assertRaises(CommandError):
+            self.seed('p')
+
+
+class QueryPlanTests(TestCase):
+    """Guard the hot panel queries against regressing to full table scans.
+
+    Runs against whichever database is configured: SQLite by default, or
+    PostgreSQL when DATABASE_URL points at one. On PostgreSQL sequential
+    scans are disabled for the session so that the planner picks an index
+    whenever one is usable, even on the near-empty test tables.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('plan_user', password='pw')
+        Notice.objects.create(title='Notice', content='Body', published_by=cls.user)
+        Attendance.objects.create(employee=cls.user, date=datetime.date(2024, 1, 1))
+        Work.objects.create(title='Work', description='Body', assigned_to=cls.user,
+                            assigned_by=cls.user, due_date=datetime.date(2024, 1, 2))
+        Request.objects.create(employee=cls.user, request_type='LEAVE',
+                               subject='Leave', description='Body')
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+
+    def assertNoFullScan(self, queryset):
+        plan = queryset.explain()
+        if connection.vendor == 'sqlite':
+            # Walking an index in order is only acceptable when a LIMIT
+            # stops the walk early, as it does for a single list page.
+            limited = queryset.query.high_mark is not None
+            full_scans = [
+                line for line in re.findall(r'\bSCAN \w+.*$', plan, re.MULTILINE)
+                if not (limited and 'USING' in line)
+            ]
+        elif connection.vendor == 'postgresql':
+            full_scans = re.findall(r'Seq Scan on (\w+)', plan)
+        else:
+            self.skipTest(f'No plan checks for {connection.vendor}')
+        self.assertFalse(full_scans, f'Full scan in query plan:\n{plan}')
+
+    # employee_panel.views
+    def test_employee_work_list(self):
+        self.assertNoFullScan(Work.objects.filter(assigned_to=self.user))
+
+    def test_employee_work_status_count(self):
+        self.assertNoFullScan(Work.objects.filter(assigned_to=self.user, status='PENDING'))
+
+    def test_employee_request_list(self):
+        self.assertNoFullScan(Request.objects.filter(employee=self.user))
+
+    def test_active_notices(self):
+        self.assertNoFullScan(Notice.objects.filter(is_active=True)[:5])
+
+    def test_employee_attendance(self):
+        self.assertNoFullScan(Attendance.objects.filter(employee=self.user))
+
+    # admin_panel.views
+    def test_employee_count(self):
+        self.assertNoFullScan(CustomUser.objects.filter(role='EMPLOYEE').order_by('username'))
+
+    def test_pending_requests(self):
+        self.assertNoFullScan(Request.objects.filter(status='PENDING'))
+
+    def test_active_work(self):
+        self.assertNoFullScan(Work.objects.filter(status__in=['PENDING', 'IN_PROGRESS']))
+
+    def test_work_queues(self):
+        today = datetime.date(2024, 1, 10)
+        self.assertNoFullScan(my_queue(self.user, today)[:51])
+        self.assertNoFullScan(overdue_queue(today)[:51])
+
+    def test_directory_search(self):
+        # istartswith on the columns given case-insensitive indexes by
+        # accounts' 0003 migration
+        for column in ('username', 'first_name', 'last_name', 'employee_id'):
+            self.assertNoFullScan(CustomUser.objects.filter(**{f'{column}__istartswith': 'Pl'}))
+        self.assertNoFullScan(CustomUser.objects.filter(
+            Q(username__istartswith='pl') | Q(first_name__istartswith='pl') |
+            Q(last_name__istartswith='pl') | Q(employee_id__istartswith='pl')
+        ))
+
+    def test_keyset_pages(self):
+        self.assertNoFullScan(Attendance.objects.order_by('-date', '-pk')[:51])
+        self.assertNoFullScan(Work.objects.order_by('-assigned_date', '-pk')[:51])
+        self.assertNoFullScan(Request.objects.order_by('-submitted_date', '-pk')[:51])
+        self.assertNoFullScan(Notice.objects.order_by('-published_date', '-pk')[:51])
+
+
+class ExportTests(TestCase):
+    SHEET = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('exported', password='pw', role='EMPLOYEE',
+                                                  first_name='Ex', last_name='Ported', department='Sales')
+        cls.work = Work.objects.create(title='=HYPERLINK("http://evil")', description='Body', assigned_to=cls.user,
+                                       assigned_by=cls.user, due_date=datetime.date(2024, 1, 2))
+        Request.objects.create(employee=cls.user, request_type='LEAVE', subject='-2+3', description='Body')
+        Attendance.objects.create(employee=cls.user, date=datetime.date(2024, 1, 1), check_in=datetime.time(9),
+                                  notes='@SUM(A1) <late> & \x07tired')
+
+    def csv_rows(self, kind):
+        return list(csv.reader(io.StringIO(''.join(csv_stream(export_rows(kind))))))
+
+    def xlsx_rows(self, kind):
+        workbook = zipfile.ZipFile(io.BytesIO(b''.join(xlsx_stream(export_rows(kind)))))
+        self.assertIsNone(workbook.testzip())
+        self.assertEqual(set(workbook.namelist()), {
+            '[Content_Types].xml', '_rels/.rels', 'xl/workbook.xml', 'xl/_rels/workbook.xml.rels',
+            'xl/worksheets/sheet1.xml',
+        })
+        sheet = ElementTree.fromstring(workbook.read('xl/worksheets/sheet1.xml'))
+        return [[(cell.get('t'), ''.join(cell.itertext())) for cell in row]
+                for row in sheet.iter(f'{self.SHEET}row')]
+
+    def test_csv_rows(self):
+        header, row = self.csv_rows('attendance')
+        self.assertEqual(header[:5], ['Employee ID', 'Username', 'Name', 'Department', 'Date'])
+        self.assertEqual(row[1:8], ['exported', 'Ex Ported', 'Sales', '2024-01-01', '09:00:00', '', 'PRESENT'])
+
+    def test_csv_formulas_are_neutralised(self):
+        self.assertEqual(self.csv_rows('work')[1][1], "'=HYPERLINK(\"http://evil\")")
+        self.assertEqual(self.csv_rows('requests')[1][6], "'-2+3")
+        self.assertTrue(self.csv_rows('attendance')[1][8].startswith("'@SUM(A1)"))
+        # Numbers are written as numbers
+        self.assertEqual(self.csv_rows('work')[1][0], str(self.work.pk))
+
+    def test_xlsx_workbook(self):
+        header, row = self.xlsx_rows('work')
+        self.assertEqual(header[:2], [('inlineStr', 'ID'), ('inlineStr', 'Title')])
+        self.assertEqual(row[0], ('n', str(self.work.pk)))
+        # Inline strings are never evaluated, so they are kept as typed
+        self.assertEqual(row[1], ('inlineStr', '=HYPERLINK("http://evil")'))
+        notes = self.xlsx_rows('attendance')[1][8]
+        self.assertEqual(notes, ('inlineStr', '@SUM(A1) <late> & tired'))
+
+    def test_xlsx_streams_in_chunks(self):
+        chunks = list(xlsx_stream([['a', 1]] * 3))
+        self.assertGreater(len(chunks), 2)
+        self.assertTrue(chunks[0].startswith(b'PK'))
+
+
+class ImporterTests(TestCase):
+    HEADER = 'username,employee_id,email,first_name,phone,position,salary,status,hire_date\n'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user('import_admin', password='pw', role='ADMIN',
+                                                   employee_id='A1')
+
+    def run_import(self, *rows, dry_run=False):
+        lines = io.StringIO(self.HEADER + ''.join(row + '\n' for row in rows))
+        return EmployeeImporter(dry_run=dry_run).run(lines)
+
+    def errors(self, result):
+        return {username: message for _, username, message in result.errors}
+
+    def test_valid_rows(self):
+        result = self.run_import('ann,E1,ann@example.com,Ann,555,Clerk,1200.50,ON_LEAVE,2024-02-01',
+                                 'bob,E2,,,,,,,')
+        self.assertEqual((result.rows, result.created, result.errors), (2, 2, []))
+        ann = Employee.objects.get(user__username='ann')
+        self.assertEqual((ann.position, str(ann.salary), ann.status), ('Clerk', '1200.50', 'ON_LEAVE'))
+        self.assertEqual(ann.hire_date, datetime.date(2024, 2, 1))
+        self.assertFalse(ann.user.has_usable_password())
+        self.assertEqual(EmployeeStats.objects.filter(user__username__in=['ann', 'bob']).count(), 2)
+
+    def test_model_rules(self):
+        result = self.run_import(
+            'long,E1,,' + 'x' * 151 + ',,,,,',
+            'phone,E2,,,' + '5' * 16 + ',,,,',
+            'position,E3,,,,' + 'p' * 101 + ',,,',
+            'nan,E4,,,,,NaN,,',
+            'inf,E5,,,,,Infinity,,',
+            'digits,E6,,,,,123456789.00,,',
+            'status,E7,,,,,,RETIRED,',
+            'email,E8,not-an-email,,,,,,',
+            'bad name,E9,,,,,,,',
+            'date,E10,,,,,,,2024-13-01',
+        )
+        self.assertEqual(result.created, 0)
+        errors = self.errors(result)
+        self.assertEqual(len(errors), 10)
+        self.assertIn('first_name:', errors['long'])
+        self.assertIn('phone:', errors['phone'])
+        self.assertIn('position:', errors['position'])
+        self.assertIn('salary:', errors['nan'])
+        self.assertIn('salary:', errors['inf'])
+        self.assertIn('salary:', errors['digits'])
+        self.assertIn('status:', errors['status'])
+        self.assertIn('email:', errors['email'])
+        self.assertIn('username:', errors['bad name'])
+        self.assertIn('hire_date', errors['date'])
+
+    def test_duplicates(self):
+        result = self.run_import('import_admin,E1,,,,,,,', 'ann,A1,,,,,,,', 'cat,E3,,,,,,,', 'cat,E4,,,,,,,',
+                                 'dan,E3,,,,,,,')
+        self.assertEqual(result.created, 1)
+        self.assertEqual([line for line, _, _ in result.errors], [2, 3, 5, 6])
+        self.assertIn('already exists', result.errors[0][2])
+
+    def test_missing_columns(self):
+        result = EmployeeImporter().run(io.StringIO('username,email\nann,ann@example.com\n'))
+        self.assertEqual(result.errors, [(1, '', 'Missing required columns: employee_id')])
+
+    def test_dry_run_writes_nothing(self):
+        result = self.run_import('ann,E1,,,,,,,', dry_run=True)
+        self.assertEqual((result.created, result.errors), (1, []))
+        self.assertFalse(CustomUser.objects.filter(username='ann').exists())
+
+    def test_unreadable_line(self):
+        content = (self.HEADER + 'ann,E1,,,,,,,\n').encode() + b'b\xffb,E2,,,,,,,\n'
+        result = EmployeeImporter().run(codecs.iterdecode(io.BytesIO(content), 'utf-8'))
+        self.assertEqual(result.created, 1)
+        self.assertTrue(result.errors[0][2].startswith('Unreadable file:'))
+
+    @override_settings(STORAGES=BENCHMARK_SETTINGS['STORAGES'])
+    def test_view_rejects_unreadable_files(self):
+        self.client.force_login(self.admin)
+        too_long = b'x' * (csv.field_size_limit() + 1)
+        for content in (b'username,employee_id\n\xff\xfe,E1\n', b'username,employee_id\nann,' + too_long + b'\n'):
+            upload = SimpleUploadedFile('staff.csv', content, content_type='text/csv')
+            response = self.client.post('/admin-panel/employees/import/', {'csv_file': upload})
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.context['form'].errors['csv_file'])
+        self.assertFalse(CustomUser.objects.filter(username='ann').exists())
+
+    @override_settings(STORAGES=BENCHMARK_SETTINGS['STORAGES'], EMPLOYEE_IMPORT_MAX_ROWS=2)
+    def test_view_caps_rows(self):
+        self.client.force_login(self.admin)
+        content = 'username,employee_id,password\n' + ''.join(f'user{n},E{n},secret\n' for n in range(3))
+        upload = SimpleUploadedFile('staff.csv', content.encode())
+        response = self.client.post('/admin-panel/employees/import/', {'csv_file': upload})
+        self.assertIn('import_employees', response.context['form'].errors['csv_file'][0])
+        self.assertFalse(CustomUser.objects.filter(username__startswith='user').exists())
+
+    @override_settings(STORAGES=BENCHMARK_SETTINGS['STORAGES'])
+    def test_view_imports(self):
+        self.client.force_login(self.admin)
+        upload = SimpleUploadedFile('staff.csv', b'\xef\xbb\xbfusername,employee_id,password\nann,E1,secret\n')
+        response = self.client.post('/admin-panel/employees/import/', {'csv_file': upload})
+        self.assertRedirects(response, '/admin-panel/employees/', fetch_redirect_response=False)
+        self.assertTrue(CustomUser.objects.get(username='ann').check_password('secret'))
+
+    def test_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as handle:
+            handle.write(self.HEADER + 'ann,E1,,,,,,,\nbob,E1,,,,,,,\n')
+        self.addCleanup(os.remove, handle.name)
+        out, err = io.StringIO(), io.StringIO()
+        call_command('import_employees', handle.name, workers=0, stdout=out, stderr=err)
+        self.assertIn('Created 1 of 2 employees, 1 rejected', out.getvalue())
+        self.assertIn('Line 3 (bob)', err.getvalue())
+
+
+class CacheBackendTests(SimpleTestCase):
+    """Exercise the Redis code path against the in-process stand-in"""
+
+    def backend(self, name, max_entries=100):
+        backend = FakeRedisCache(f'redis://fake/{name}', {
+            'STATS_NAME': name, 'OPTIONS': {'max_entries': max_entries},
+        })
+        backend.clear()
+        return backend
+
+    def test_fake_redis_round_trip(self):
+        cache = self.backend('round-trip')
+        cache.set('user', {'id': 1}, 60)
+        cache.set('count', 1)
+        self.assertEqual(cache.get('user'), {'id': 1})
+        self.assertEqual(cache.incr('count', 4), 5)
+        self.assertFalse(cache.add('count', 0))
+        cache.set_many({'a': 1, 'b': 2})
+        self.assertEqual(cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2})
+        self.assertTrue(cache.touch('a', 60))
+        self.assertTrue(cache.delete('a'))
+        self.assertIsNone(cache.get('a'))
+        cache.set('gone', 1, 0)
+        self.assertFalse(cache.has_key('gone'))
+
+    def test_hit_miss_and_eviction_counters(self):
+        cache = self.backend('counters', max_entries=2)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, key)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('c'), 'c')
+        self.assertEqual((cache.stats['hits'], cache.stats['misses']), (1, 1))
+        self.assertEqual(cache.evictions(), 1)
+
+    def test_locmem_counts_culled_entries(self):
+        cache = LocMemCache('culling', {
+            'STATS_NAME': 'culling', 'OPTIONS': {'MAX_ENTRIES': 4, 'CULL_FREQUENCY': 2},
+        })
+        cache.clear()
+        for key in range(5):
+            cache.set(key, key)
+        self.assertEqual(cache.evictions(), 2)
+
+    def counted_backends(self):
+        with tempfile.TemporaryDirectory() as directory:
+            yield self.backend('counted')
+            yield LocMemCache('counted', {'STATS_NAME': 'counted-locmem'})
+            yield FileBasedCache(directory, {'STATS_NAME': 'counted-file'})
+
+    def test_every_operation_is_counted_once(self):
+        for cache in self.counted_backends():
+            with self.subTest(backend=type(cache).__name__):
+                cache.clear()
+                cache.stats.update(dict.fromkeys(cache.stats, 0))
+                self.assertTrue(cache.add('a', 1))
+                self.assertFalse(cache.add('a', 2))
+                self.assertEqual(cache.get_or_set('b', lambda: 5), 5)
+                self.assertEqual(cache.get_or_set('b', 6), 5)
+                self.assertEqual(cache.incr('a'), 2)
+                self.assertEqual(cache.decr('a', 2), 0)
+                with self.assertRaises(ValueError):
+                    cache.incr('missing')
+                cache.set_many({'c': 1, 'd': 2})
+                self.assertEqual(cache.get_many(['c', 'd', 'e']), {'c': 1, 'd': 2})
+                cache.delete_many(['c', 'd'])
+                self.assertEqual(
+                    {name: cache.stats[name] for name in ('hits', 'misses', 'sets', 'deletes')},
+                    {'hits': 6, 'misses': 3, 'sets': 6, 'deletes': 2},
+                )
+
+    def test_file_cache_lists_directory_only_near_the_limit(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = FileBasedCache(directory, {
+                'STATS_NAME': 'file-culling', 'OPTIONS': {'MAX_ENTRIES': 10, 'CULL_FREQUENCY': 2},
+            })
+            with mock.patch.object(cache, '_list_cache_files', wraps=cache._list_cache_files) as listing:
+                for key in range(9):
+                    cache.set(key, key)
+                self.assertEqual(listing.call_count, 1)
+                for key in range(9, 12):
+                    cache.set(key, key)
+            self.assertEqual(cache.evictions(), 5)
+            self.assertLessEqual(len(cache._list_cache_files()), 10)
+
+    def test_counters_kept_briefly_in_a_per_process_cache(self):
+        script = 'from django.conf import settings; print(settings.DASHBOARD_COUNTER_TIMEOUT)'
+        for backend, timeout in (('locmem', '5'), ('file', '300')):
+            env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'emp_system.settings', 'CACHE_BACKEND': backend}
+            env.pop('DASHBOARD_COUNTER_TIMEOUT', None)
+            output = subprocess.run([sys.executable, '-c', script], env=env, capture_output=True, text=True,
+                                    check=True, cwd=settings.BASE_DIR).stdout
+            self.assertEqual(output.strip(), timeout)
+
+    def test_redis_url_selects_redis(self):
+        script = 'from django.conf import settings; print(settings.CACHE_BACKEND, settings.CACHES["default"]["LOCATION"])'
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'emp_system.settings', 'REDIS_URL': 'redis://cache:6379/1'}
+        env.pop('CACHE_BACKEND', None)
+        output = subprocess.run([sys.executable, '-c', script], env=env, capture_output=True, text=True,
+                                check=True, cwd=settings.BASE_DIR).stdout
+        self.assertEqual(output.split(), ['redis', 'redis://cache:6379/1'])
+
+
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class RequestProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('profiled', password='pw', role='EMPLOYEE')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def server_timing(self, response):
+        return dict(re.findall(r'(\w+);dur=([\d.]+)', response['Server-Timing']))
+
+    def test_server_timing_header(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/employee-panel/')
+        timing = self.server_timing(response)
+        self.assertEqual(set(timing), {'sql', 'template', 'python', 'total'})
+        self.assertIn(f'desc="{len(queries)} queries"', response['Server-Timing'])
+        self.assertGreater(float(timing['template']), 0)
+        self.assertNotIn('X-Budget-Exceeded', response)
+
+    @override_settings(PROFILING_QUERY_BUDGET=1)
+    def test_query_budget_flagged(self):
+        with self.assertLogs('emp_system.profiling', 'WARNING') as logs:
+            response = self.client.get('/employee-panel/')
+        self.assertEqual(response['X-Budget-Exceeded'], 'queries')
+        self.assertIn('over budget', logs.output[0])
+
+    @override_settings(PROFILING_SLOW_QUERY_MS=0, PROFILING_STACKS_PER_REQUEST=2)
+    def test_slow_query_stack_logged(self):
+        with self.assertLogs('emp_system.profiling', 'WARNING') as logs:
+            self.client.get('/employee-panel/notifications/')
+        slow = [line for line in logs.output if 'Slow query' in line]
+        self.assertEqual(len(slow), 2)
+        self.assertTrue(any('employee_panel/views.py' in line for line in slow))
+
+    @override_settings(PROFILING_SLOW_QUERY_MS=5, PROFILING_STACKS_PER_REQUEST=2)
+    def test_slowest_queries_are_kept(self):
+        timings = RequestTimings()
+        for sql, seconds in (('fast', 0), ('slow', 0.02), ('slower', 0.04), ('medium', 0.01), ('slowest', 0.06)):
+            timings(lambda *args, seconds=seconds: time.sleep(seconds), sql, None, False, {})
+        self.assertEqual(timings.queries, 5)
+        request = RequestFactory().get('/somewhere/')
+        with self.assertLogs('emp_system.profiling', 'WARNING') as logs:
+            log_slow_queries(request, timings)
+        self.assertEqual([line.split('\n')[1] for line in logs.output], ['slowest', 'slower'])
+
+    @override_settings(PROFILING_TIME_BUDGET_MS=1)
+    def test_async_time_budget_flagged(self):
+        async def view(request):
+            await asyncio.sleep(0.01)
+            return HttpResponse('ok')
+
+        middleware = RequestProfilingMiddleware(view)
+        with self.assertLogs('emp_system.profiling', 'WARNING') as logs:
+            response = asyncio.run(middleware(RequestFactory().get('/async/')))
+        self.assertEqual(response['X-Budget-Exceeded'], 'time')
+        self.assertIn('GET /async/ over budget', logs.output[0])
+
+
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+@override_settings(METRICS_TOKEN='secret')
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('measured', password='pw', role='EMPLOYEE')
+
+    def scrape(self, authorization='Bearer secret'):
+        response = self.client.get('/metrics', headers={'authorization': authorization})
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def sample(self, text, series):
+        match = re.search(rf'^{re.escape(series)} (\S+)$', text, re.M)
+        return float(match.group(1)) if match else 0
+
+    def test_view_latency_histogram(self):
+        series = 'emp_request_duration_seconds_count{namespace="employee_panel",view="dashboard"}'
+        before = self.sample(self.scrape(), series)
+        self.client.force_login(self.user)
+        self.client.get('/employee-panel/')
+        text = self.scrape()
+        self.assertEqual(self.sample(text, series), before + 1)
+        self.assertIn('# TYPE emp_request_duration_seconds histogram', text)
+        self.assertIn('emp_request_duration_seconds_bucket{namespace="employee_panel",'
+                      'view="dashboard",le="+Inf"}', text)
+
+    def test_creates_and_transitions(self):
+        created = 'emp_model_creates_total{model="Work"}'
+        moved = 'emp_status_transitions_total{model="Work",from="PENDING",to="COMPLETED"}'
+        text = self.scrape()
+        before = self.sample(text, created), self.sample(text, moved)
+        with self.captureOnCommitCallbacks(execute=True):
+            work = Work.objects.create(title='Work', description='Body', assigned_to=self.user,
+                                       assigned_by=self.user, due_date=datetime.date(2024, 1, 2))
+        with self.captureOnCommitCallbacks(execute=True):
+            work.status = 'COMPLETED'
+            work.save()
+        text = self.scrape()
+        self.assertEqual((self.sample(text, created), self.sample(text, moved)),
+                         (before[0] + 1, before[1] + 1))
+
+    def test_workers_are_merged(self):
+        series = 'emp_request_duration_seconds_count{namespace="accounts",view="login"}'
+        before = self.sample(self.scrape(), series)
+        other = {('emp_request_duration_seconds', (('namespace', 'accounts'), ('view', 'login'))):
+                 [1] + [0] * len(metrics.LATENCY_BUCKETS) + [0.004],
+                 ('emp_db_connections_open', (('alias', 'default'), ('vendor', 'sqlite'))): 1}
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            # A pid that is not running: its counters stay, its gauges go
+            with open(os.path.join(directory, '999999999.json'), 'w') as f:
+                json.dump(metrics._encode(other), f)
+            text = self.scrape()
+        self.assertEqual(self.sample(text, series), before + 1)
+        self.assertLessEqual(self.sample(text, 'emp_db_connections_open{alias="default",vendor="sqlite"}'), 1)
+
+    def test_token_required(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.assertEqual(self.client.get('/metrics', headers={'authorization': 'Bearer wrong'}).status_code, 401)
+        self.client.force_login(CustomUser.objects.create_user('metrics_admin', password='pw', role='ADMIN'))
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_admins_only_without_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.client.force_login(CustomUser.objects.create_user('metrics_admin', password='pw', role='ADMIN'))
+        self.assertIn('# TYPE emp_request_duration_seconds histogram', self.scrape(authorization=''))
+
+
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class AttendanceMatrixTests(TestCase):
+    MONTH = datetime.date(2024, 2, 1)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user('matrix_admin', password='pw', role='ADMIN')
+        CustomUser.objects.bulk_create(
+            CustomUser(username=f'matrix{n:04d}', role='EMPLOYEE', first_name='Emp', last_name=f'{n:04d}',
+                       department=['Sales', 'Support'][n % 2])
+            for n in range(1000)
+        )
+        cls.users = list(CustomUser.objects.filter(role='EMPLOYEE').order_by('pk'))
+        statuses = ['PRESENT', 'PRESENT', 'ABSENT', 'LEAVE', 'HALF_DAY']
+        Attendance.objects.bulk_create(
+            Attendance(employee=user, date=cls.MONTH.replace(day=day), status=statuses[(i + day) % 5])
+            for i, user in enumerate(cls.users) for day in range(1, 30)
+        )
+
+    def test_matrix_and_totals(self):
+        matrix = reports.AttendanceMatrix(self.MONTH, 'Sales').build()
+        self.assertEqual(len(matrix.days), 29)
+        self.assertEqual(len(matrix.rows), 500)
+        row = next(r for r in matrix.rows if r.user_id == self.users[0].pk)
+        self.assertEqual(row.totals, {'present': 11, 'absent': 6, 'leave': 6, 'half_day': 6})
+        self.assertIn('<td class="cell cell-3 weekend">L</td>', row.cells)
+        (department, totals), = matrix.departments
+        self.assertEqual((department, totals['employees']), ('Sales', 500))
+        self.assertEqual(totals['present'] + totals['absent'] + totals['leave'] + totals['half_day'], 500 * 29)
+
+    def test_day_extraction_outside_sqlite(self):
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            records = reports.AttendanceMatrix(self.MONTH).records()
+        self.assertEqual(set(records), set(reports.AttendanceMatrix(self.MONTH).records()))
+
+    def test_full_month_query_count(self):
+        """The 1,000 x 29 grid costs the same few queries as an empty one"""
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin-panel/attendance/matrix/?month=2024-02')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'class="name"', count=1000)
+        # Session, user, department choices, employees, the month's records
+        self.assertEqual(len(queries), 5)
+
+
+@override_settings(SHIFT_RULES_BY_DEPARTMENT={'Support': {'start': '07:00', 'weekly_minutes': 600}})
+class WorkingHoursTests(TestCase):
+    WEEK = datetime.date(2024, 1, 1)  # a Monday
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sales = CustomUser.objects.create_user('hours_sales', password='pw', department='Sales',
+                                                   employee_id='S1')
+        cls.support = CustomUser.objects.create_user('hours_support', password='pw', department='Support')
+        day = lambda n: cls.WEEK + datetime.timedelta(days=n)
+        Attendance.objects.bulk_create([
+            # 515 worked after the break, 35 over the day
+            Attendance(employee=cls.sales, date=day(0), check_in=datetime.time(8, 55),
+                       check_out=datetime.time(18, 30)),
+            # 20 minutes late, 400 worked
+            Attendance(employee=cls.sales, date=day(1), check_in=datetime.time(9, 20),
+                       check_out=datetime.time(17)),
+            # Within the grace period
+            Attendance(employee=cls.sales, date=day(2), check_in=datetime.time(9, 5),
+                       check_out=datetime.time(17, 5)),
+            Attendance(employee=cls.sales, date=day(3), status='LEAVE'),
+            # Too short for a break
+            Attendance(employee=cls.sales, date=day(4), status='HALF_DAY', check_in=datetime.time(9),
+                       check_out=datetime.time(13)),
+            # The next week: a shift that ends after midnight
+            Attendance(employee=cls.sales, date=day(7), check_in=datetime.time(9),
+                       check_out=datetime.time(1)),
+            Attendance(employee=cls.support, date=day(0), check_in=datetime.time(7, 5),
+                       check_out=datetime.time(17, 5)),
+            Attendance(employee=cls.support, date=day(1), check_in=datetime.time(8),
+                       check_out=datetime.time(16)),
+        ])
+
+    def summary(self, user, week=WEEK):
+        return WorkingHours.objects.values(
+            'days_worked', 'worked_minutes', 'regular_minutes', 'overtime_minutes',
+            'late_arrivals', 'late_minutes',
+        ).get(employee=user, week_start=week)
+
+    def test_weekly_summary(self):
+        self.assertEqual(compute_hours(self.WEEK, self.WEEK + datetime.timedelta(days=4)), 2)
+        self.assertEqual(self.summary(self.sales), {
+            'days_worked': 4, 'worked_minutes': 1575, 'regular_minutes': 1540, 'overtime_minutes': 35,
+            'late_arrivals': 1, 'late_minutes': 20,
+        })
+        # Department rules: a 07:00 start and a 600 minute week
+        self.assertEqual(self.summary(self.support), {
+            'days_worked': 2, 'worked_minutes': 960, 'regular_minutes': 600, 'overtime_minutes': 360,
+            'late_arrivals': 1, 'late_minutes': 60,
+        })
+
+    def test_ranges_cover_whole_weeks(self):
+        compute_hours(self.WEEK + datetime.timedelta(days=9), self.WEEK + datetime.timedelta(days=9))
+        self.assertEqual(self.summary(self.sales, self.WEEK + datetime.timedelta(days=7))['worked_minutes'],
+                         16 * 60 - 60)
+        self.assertFalse(WorkingHours.objects.filter(week_start=self.WEEK).exists())
+
+    def test_saving_attendance_recomputes_its_weeks(self):
+        compute_hours(self.WEEK, self.WEEK + datetime.timedelta(days=13))
+        record = Attendance.objects.get(employee=self.sales, date=self.WEEK)
+        record.check_out = datetime.time(17, 55)
+        record.save()
+        self.assertEqual(self.summary(self.sales)['overtime_minutes'], 0)
+
+        record.date = self.WEEK + datetime.timedelta(days=8)
+        record.save()
+        self.assertEqual(self.summary(self.sales)['days_worked'], 3)
+        self.assertEqual(self.summary(self.sales, record.date - datetime.timedelta(days=1))['days_worked'], 2)
+
+        record.delete()
+        self.assertEqual(self.summary(self.sales, self.WEEK + datetime.timedelta(days=7))['days_worked'], 1)
+
+    def test_payroll_export_reads_the_summary(self):
+        compute_hours(self.WEEK, self.WEEK)
+        with self.assertNumQueries(1):
+            header, *rows = export_rows('hours', department='Sales')
+        self.assertEqual(header[:5], ['Employee ID', 'Username', 'Name', 'Department', 'Week Starting'])
+        self.assertEqual(rows, [['S1', 'hours_sales', ' ', 'Sales', '2024-01-01', 4, 1575, 1540, 35, 1, 20]])
+
+
+class WorkQueueTests(TestCase):
+    today = datetime.date(2024, 3, 20)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('queue_user', password='pw', role='EMPLOYEE')
+        cls.other = CustomUser.objects.create_user('queue_other', password='pw', role='EMPLOYEE')
+        cls.admin = CustomUser.objects.create_user('queue_admin', password='pw', role='ADMIN')
+
+    def work(self, title, priority, due_in, assigned_days_ago=0, status='PENDING', user=None):
+        work = Work.objects.create(title=title, description='Body', assigned_to=user or self.user,
+                                   assigned_by=self.admin, priority=priority, status=status,
+                                   due_date=self.today + datetime.timedelta(days=due_in))
+        assigned = timezone.make_aware(datetime.datetime.combine(
+            self.today - datetime.timedelta(days=assigned_days_ago), datetime.time(12)))
+        Work.objects.filter(pk=work.pk).update(assigned_date=assigned)
+        return work
+
+    def test_ranking(self):
+        self.work('someday', 'LOW', due_in=60)
+        self.work('urgent later', 'URGENT', due_in=30)
+        self.work('late', 'MEDIUM', due_in=-5, assigned_days_ago=10)
+        self.work('today', 'HIGH', due_in=0, status='IN_PROGRESS')
+        self.work('done', 'URGENT', due_in=-5, status='COMPLETED')
+        self.work('not mine', 'URGENT', due_in=-5, user=self.other)
+
+        queue = my_queue(self.user, self.today)
+        # 30 + 5 days late * 4 + 10 days old; 60 + 0; 90 - 14 * 4; 0 - 14 * 4
+        self.assertEqual([(w.title, w.score) for w in queue],
+                         [('late', 60), ('today', 60), ('urgent later', 34), ('someday', -56)])
+        self.assertEqual([w.days_overdue for w in queue], [5, 0, -30, -60])
+
+    def test_overdue_queue(self):
+        self.work('mine', 'LOW', due_in=-1)
+        self.work('theirs', 'HIGH', due_in=-3, user=self.other)
+        self.work('due today', 'URGENT', due_in=0)
+        self.work('done', 'URGENT', due_in=-5, status='COMPLETED')
+        with self.assertNumQueries(1):
+            rows = [(w.title, w.assigned_to.username, w.days_overdue) for w in overdue_queue(self.today)]
+        self.assertEqual(rows, [('theirs', 'queue_other', 3), ('mine', 'queue_user', 1)])
+
+    def test_pages_by_score(self):
+        for n in range(5):
+            self.work(f'w{n}', 'MEDIUM', due_in=-n)
+        paginator = KeysetPaginator(my_queue(self.user, self.today), per_page=2)
+        first = paginator.page()
+        second = paginator.page(after=first.next_cursor)
+        last = paginator.page(after=second.next_cursor)
+        self.assertEqual([w.title for page in (first, second, last) for w in page],
+                         ['w4', 'w3', 'w2', 'w1', 'w0'])
+        self.assertFalse(last.has_next)
+        self.assertEqual([w.title for w in paginator.page(before=last.previous_cursor)], ['w2', 'w1'])
+
+    @override_settings(STORAGES=BENCHMARK_SETTINGS['STORAGES'])
+    def test_views(self):
+        self.work('late one', 'HIGH', due_in=-2)
+        Work.objects.filter(title='late one').update(due_date=timezone.localdate() - datetime.timedelta(days=2))
+        self.client.force_login(self.admin)
+        response = self.client.get('/admin-panel/work/overdue/')
+        self.assertContains(response, 'late one')
+        self.assertContains(response, '2 days')
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get('/employee-panel/work/queue/'), '2 days overdue')
+
+    def test_ten_thousand_open_items(self):
+        """First page of a queue of 10,000 open items beside 10,000 closed ones, in one query"""
+        priorities = ['LOW', 'MEDIUM', 'HIGH', 'URGENT']
+        Work.objects.bulk_create(
+            Work(title=f'item {n}', description='', assigned_to=self.user, assigned_by=self.admin,
+                 priority=priorities[n // 2 % 4], status='COMPLETED' if n % 2 else 'PENDING',
+                 due_date=self.today + datetime.timedelta(days=n % 90 - 45))
+            for n in range(20000)
+        )
+        with CaptureQueriesContext(connection) as queries:
+            page = KeysetPaginator(my_queue(self.user, self.today)).page()
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(len(page), 50)
+        self.assertEqual(page.object_list[0].priority, 'URGENT')
+
+
+class AssignmentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user('assign_admin', password='pw', role='ADMIN')
+        cls.ann, cls.bob, cls.cat, cls.dan = [
+            CustomUser.objects.create_user(name, password='pw', role='EMPLOYEE', department='Sales')
+            for name in ('ann', 'bob', 'cat', 'dan')
+        ]
+        cls.eve = CustomUser.objects.create_user('eve', password='pw', role='EMPLOYEE', department='Support')
+
+    def setUp(self):
+        self.today = timezone.localdate()
+
+    def work(self, user, priority='MEDIUM', due_in=30, status='PENDING'):
+        return Work.objects.create(title='Job', description='Body', assigned_to=user, assigned_by=self.admin,
+                                   priority=priority, status=status,
+                                   due_date=self.today + datetime.timedelta(days=due_in))
+
+    def load(self, user):
+        return EmployeeStats.objects.get(pk=user.pk).work_load
+
+    def test_load_follows_work(self):
+        rebuild_stats([self.ann.pk])
+        job = self.work(self.ann, 'HIGH', due_in=30)
+        self.assertEqual(self.load(self.ann), 10 + 60)
+        self.work(self.ann, 'LOW', due_in=-2)
+        self.assertEqual(self.load(self.ann), 70 + 10 + 16 * 4)
+        self.work(self.ann, 'URGENT', status='COMPLETED')
+        self.assertEqual(self.load(self.ann), 144)
+        job.due_date = self.today
+        job.save()
+        self.assertEqual(self.load(self.ann), 144 + 14 * 4)
+        job.status = 'COMPLETED'
+        job.save()
+        self.assertEqual(self.load(self.ann), 74)
+        Work.objects.filter(assigned_to=self.ann, status='PENDING').get().delete()
+        self.assertEqual(self.load(self.ann), 0)
+        rebuild_stats([self.ann.pk])
+        self.assertEqual(self.load(self.ann), 0)
+
+    def test_stale_loads_are_rebuilt(self):
+        self.work(self.ann, 'MEDIUM', due_in=10)
+        rebuild_stats([self.ann.pk], today=self.today - datetime.timedelta(days=7))
+        self.assertEqual(self.load(self.ann), 40)
+        suggestions = suggest_assignees('Sales')
+        self.assertEqual(self.load(self.ann), 40 + 4 * 4)
+        self.assertEqual(suggestions[-1].work_load, 56)
+
+    def test_string_due_date(self):
+        due_date = self.today + datetime.timedelta(days=10)
+        Work.objects.create(title='Job', description='Body', assigned_to=self.ann, assigned_by=self.admin,
+                            due_date=due_date.isoformat())
+        self.assertEqual(self.load(self.ann), 40 + 4 * 4)
+        self.assertIn(f'due {due_date:%b %d, %Y}.', OutboxMessage.objects.get().body)
+
+    @override_settings(ASSIGNMENT_REBUILD_LIMIT=2)
+    def test_stale_rebuild_is_capped(self):
+        self.work(self.ann, 'MEDIUM', due_in=10)
+        rebuild_stats([self.ann.pk, self.bob.pk, self.cat.pk, self.dan.pk],
+                      today=self.today - datetime.timedelta(days=7))
+        self.assertEqual([u.username for u in suggest_assignees('Sales')], ['bob', 'cat'])
+        self.assertEqual([u.username for u in suggest_assignees('Sales')], ['bob', 'cat', 'dan', 'ann'])
+
+    def test_least_loaded_available(self):
+        self.work(self.ann, 'URGENT')
+        self.work(self.bob, 'LOW')
+        self.work(self.cat, 'HIGH')
+        Attendance.objects.create(employee=self.bob, date=self.today, status='LEAVE')
+        Attendance.objects.create(employee=self.cat, date=self.today, status='HALF_DAY')
+        Attendance.objects.create(employee=self.dan, date=self.today - datetime.timedelta(days=1),
+                                  status='ABSENT')
+
+        suggestions = suggest_assignees('Sales', limit=3)
+        self.assertEqual([(u.username, u.work_load, u.today_status) for u in suggestions],
+                         [('dan', 0, None), ('cat', 70, 'HALF_DAY'), ('ann', 100, None)])
+        self.assertEqual([u.username for u in suggest_assignees(limit=2)], ['dan', 'eve'])
+        with self.assertNumQueries(2):
+            suggest_assignees('Sales')
+
+    @override_settings(STORAGES=BENCHMARK_SETTINGS['STORAGES'])
+    def test_work_form(self):
+        self.work(self.ann, 'URGENT')
+        self.client.force_login(self.admin)
+        response = self.client.get('/admin-panel/work/create/?department=Sales')
+        self.assertEqual([u.username for u in response.context['form'].suggestions], ['bob', 'cat', 'dan', 'ann'])
+        self.assertContains(response, '<optgroup label="Suggested (Sales)">')
+        self.assertContains(response, 'ann - load 100')
+        with mock.patch('admin_panel.forms.suggest_assignees') as suggest:
+            response = self.client.post('/admin-panel/work/create/?department=Sales', {'title': 'Incomplete'})
+        self.assertEqual(response.status_code, 200)
+        suggest.assert_not_called()
+        self.assertNotContains(response, 'Suggested Assignees')
+        self.assertNotContains(response, 'No employees available today')
+        response = self.client.post('/admin-panel/work/create/?department=Sales', {
+            'title': 'New', 'description': 'Body', 'assigned_to': self.bob.pk,
+            'due_date': self.today + datetime.timedelta(days=30), 'priority': 'HIGH',
+        })
+        self.assertRedirects(response, '/admin-panel/work/', fetch_redirect_response=False)
+        self.assertEqual(self.load(self.bob), 70)
+
+    def test_ten_thousand_employees(self):
+        """Top five of a department of 10,000 employees, read off the load index"""
+        users = CustomUser.objects.bulk_create(
+            CustomUser(username=f'bench{n}', role='EMPLOYEE', department='Field') for n in range(10000))
+        EmployeeStats.objects.bulk_create(
+            EmployeeStats(user=user, month=self.today.replace(day=1), load_date=self.today, department='Field',
+                          work_load=(n * 7919) % 1000 + 5)
+            for n, user in enumerate(users))
+        Attendance.objects.bulk_create(
+            Attendance(employee=user, date=self.today, status=['PRESENT', 'ABSENT', 'LEAVE', 'HALF_DAY'][n % 4])
+            for n, user in enumerate(users[:5000]))
+        with CaptureQueriesContext(connection) as queries:
+            suggestions = suggest_assignees('Field')
+        # The stale-row check and the ranking
+        self.assertEqual(len(queries), 2)
+        loads = [user.work_load for user in suggestions]
+        self.assertEqual(len(loads), 5)
+        self.assertEqual(loads, sorted(loads))
+        self.assertTrue(all(user.today_status in (None, 'PRESENT', 'HALF_DAY') for user in suggestions))
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN QUERY PLAN {queries[1]['sql']}")
+                plan = '\n'.join(row[-1] for row in cursor.fetchall())
+            # Walked in load order, so the LIMIT stops it early
+            self.assertIn('stats_department_load_idx', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+
+def tap_time(hour, minute, second=0):
+    return timezone.make_aware(datetime.datetime(2024, 3, 4, hour, minute, second))
+
+
+@override_settings(KIOSK_TOKEN='kiosk-secret')
+class KioskTapTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('kiosk_user', password='pw', employee_id='K1')
+
+    def tap(self, **data):
+        return self.client.post('/kiosk/tap/', data, HTTP_AUTHORIZATION='Bearer kiosk-secret')
+
+    def test_taps_are_idempotent(self):
+        for when in (tap_time(9, 2), tap_time(9, 0), tap_time(9, 5), tap_time(9, 0)):
+            record_tap('in', user_id=self.user.pk, when=when)
+        record_tap('out', user_id=self.user.pk, when=tap_time(17, 30))
+        record_tap('out', user_id=self.user.pk, when=tap_time(17, 10))
+        record = Attendance.objects.get(employee=self.user)
+        self.assertEqual((record.check_in, record.check_out, record.status),
+                         (datetime.time(9), datetime.time(17, 30), 'PRESENT'))
+
+    def test_existing_status_kept(self):
+        Attendance.objects.create(employee=self.user, date=datetime.date(2024, 3, 4), status='HALF_DAY')
+        self.assertEqual(record_tap('in', employee_id='K1', when=tap_time(13, 0)),
+                         (self.user.pk, datetime.date(2024, 3, 4), datetime.time(13), None))
+        self.assertEqual(Attendance.objects.get(employee=self.user).status, 'HALF_DAY')
+
+    def test_derived_tables_refreshed_by_process_taps(self):
+        record_tap('in', employee_id='K1', when=tap_time(9, 20))
+        record_tap('out', employee_id='K1', when=tap_time(18, 0))
+        self.assertFalse(WorkingHours.objects.exists())
+        self.assertEqual(process_taps(), 1)
+        hours = WorkingHours.objects.get(employee=self.user)
+        self.assertEqual((hours.worked_minutes, hours.late_arrivals), (460, 1))
+        self.assertEqual(process_taps(), 0)
+
+    def test_unchanged_tap_needs_no_upkeep(self):
+        record_tap('in', employee_id='K1', when=tap_time(9, 0))
+        process_taps()
+        record_tap('in', employee_id='K1', when=tap_time(9, 5))
+        self.assertEqual(process_taps(), 0)
+        record_tap('out', employee_id='K1', when=tap_time(17, 0))
+        self.assertEqual(process_taps(), 1)
+
+    def test_check_out_first_counts_as_present(self):
+        """A tap that creates the row feeds the stats, whichever action it was"""
+        record_tap('out', employee_id='K1')
+        self.assertEqual(get_stats(self.user.pk).attendance_present, 0)
+        process_taps()
+        self.assertEqual(get_stats(self.user.pk).attendance_present, 1)
+
+    def test_kiosk_endpoint(self):
+        response = self.tap(employee_id='K1', action='in')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['employee_id'], 'K1')
+        self.assertIsNotNone(response.json()['check_in'])
+        self.assertEqual(self.tap(employee_id='nobody', action='in').status_code, 404)
+        self.assertEqual(self.tap(employee_id='K1', action='lunch').status_code, 400)
+        self.assertEqual(self.client.post('/kiosk/tap/', {'employee_id': 'K1', 'action': 'in'}).status_code, 401)
+
+
+class KioskConcurrencyTests(TransactionTestCase):
+    def test_one_statement_per_tap(self):
+        """Committed taps, on-commit work included, are one statement each"""
+        CustomUser.objects.create_user('kiosk_single', employee_id='S1')
+        for action, when in (('in', tap_time(9, 2)), ('out', tap_time(17, 0)), ('in', tap_time(9, 5))):
+            with CaptureQueriesContext(connection) as queries:
+                record_tap(action, employee_id='S1', when=when)
+            self.assertEqual(len(queries), 1)
+            self.assertTrue(queries[0]['sql'].startswith('INSERT'))
+
+    def test_parallel_taps(self):
+        """Eight threads replay a shuffled burst of taps for twenty employees"""
+        CustomUser.objects.bulk_create(
+            CustomUser(username=f'burst{n}', employee_id=f'B{n}') for n in range(20)
+        )
+        taps = [(action, f'B{n}', tap_time(hour, minute, n))
+                for n in range(20)
+                for action, hour, minutes in (('in', 8, range(55, 60)), ('out', 17, range(5, 10)))
+                for minute in minutes]
+        random.Random(0).shuffle(taps)
+        errors = []
+
+        def worker(share):
+            try:
+                for action, employee_id, when in share:
+                    record_tap(action, employee_id=employee_id, when=when)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(taps[i::8],)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        records = Attendance.objects.order_by('employee__employee_id').values_list(
+            'employee__employee_id', 'check_in', 'check_out')
+        self.assertEqual(len(records), 20)
+        for employee_id, check_in, check_out in records:
+            n = int(employee_id[1:])
+            self.assertEqual((check_in, check_out), (datetime.time(8, 55, n), datetime.time(17, 9, n)))
+
+
+@override_settings(OUTBOX_RETRY_SECONDS=30, OUTBOX_MAX_ATTEMPTS=3, STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class OutboxTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user('outbox_admin', password='pw', role='ADMIN')
+        cls.employee = CustomUser.objects.create_user('outbox_employee', password='pw', role='EMPLOYEE',
+                                                      email='employee@example.com')
+
+    def assign(self, title='Quarterly report'):
+        return Work.objects.create(title=title, description='Body', assigned_to=self.employee,
+                                   assigned_by=self.admin, due_date=datetime.date(2024, 5, 1))
+
+    def test_written_with_the_change(self):
+        self.assign()
+        message = OutboxMessage.objects.get()
+        self.assertEqual((message.recipient_id, message.subject, message.status),
+                         (self.employee.pk, 'New work assigned: Quarterly report', 'PENDING'))
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.assign('Rolled back')
+            raise RuntimeError
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+
+    def test_request_path_only_inserts(self):
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/admin-panel/work/create/', {
+                'title': 'Audit', 'description': 'Body', 'assigned_to': self.employee.pk,
+                'due_date': '2024-05-01', 'priority': 'HIGH',
+            })
+        self.assertEqual(response.status_code, 302)
+        outbox_writes = [q['sql'] for q in queries if 'core_outboxmessage' in q['sql']]
+        self.assertEqual(len(outbox_writes), 1)
+        self.assertTrue(outbox_writes[0].startswith('INSERT'))
+        self.assertEqual(mail.outbox, [])
+        self.assertFalse(Notification.objects.exists())
+
+    def test_request_decision_queued_once(self):
+        req = Request.objects.create(employee=self.employee, request_type='LEAVE',
+                                     subject='Friday off', description='Body')
+        self.assertFalse(OutboxMessage.objects.exists())
+        req.status, req.admin_response = 'APPROVED', 'Enjoy.'
+        req.save()
+        req.save()
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.subject, 'Request approved: Friday off')
+        self.assertIn('Enjoy.', message.body)
+
+    def test_reassignment_notifies_new_assignee(self):
+        other = CustomUser.objects.create_user('outbox_other', password='pw', role='EMPLOYEE')
+        work = self.assign()
+        work.priority = 'HIGH'
+        work.save()
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+        work.assigned_to = other
+        work.save()
+        self.assertEqual(list(OutboxMessage.objects.order_by('pk').values_list('recipient_id', flat=True)),
+                         [self.employee.pk, other.pk])
+
+    def test_drain_fans_out(self):
+        self.assign()
+        self.assign('Second')
+        self.assertEqual(outbox.drain(batch_size=1), 1)
+        self.assertEqual(outbox.drain(), 1)
+        self.assertEqual(outbox.drain(), 0)
+        self.assertEqual(OutboxMessage.objects.filter(status='SENT').count(), 2)
+        self.assertEqual(sorted(m.subject for m in mail.outbox),
+                         ['New work assigned: Quarterly report', 'New work assigned: Second'])
+        self.assertIn('/employee-panel/work/', mail.outbox[0].body)
+        self.assertEqual(Notification.objects.filter(user=self.employee).count(), 2)
+
+    def test_failures_retried_with_backoff(self):
+        self.assign()
+        now = timezone.now()
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                        side_effect=ConnectionRefusedError):
+            outbox.drain(now=now)
+            message = OutboxMessage.objects.get()
+            self.assertEqual((message.status, message.attempts), ('PENDING', 1))
+            self.assertEqual(message.next_attempt_at, now + datetime.timedelta(seconds=30))
+            self.assertIn('ConnectionRefusedError', message.last_error)
+            self.assertEqual(outbox.drain(now=now + datetime.timedelta(seconds=29)), 0)
+            outbox.drain(now=now + datetime.timedelta(seconds=30))
+            message.refresh_from_db()
+            self.assertEqual(message.next_attempt_at, now + datetime.timedelta(seconds=90))
+
+        outbox.drain(now=now + datetime.timedelta(seconds=90))
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), ('SENT', 2))
+        self.assertEqual(len(mail.outbox), 1)
+        # The in-app copy went out on the first attempt and was not repeated
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_gives_up_after_max_attempts(self):
+        self.assign()
+        now = timezone.now()
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                        side_effect=ConnectionRefusedError):
+            with self.assertLogs('emp_system.outbox', 'ERROR'):
+                for _ in range(3):
+                    outbox.drain(now=now)
+                    now += datetime.timedelta(hours=1)
+        self.assertEqual(OutboxMessage.objects.get().status, 'FAILED')
+
+    def test_notifications_page_marks_read(self):
+        self.assign()
+        outbox.drain()
+        self.client.force_login(self.employee)
+        response = self.client.get('/employee-panel/notifications/')
+        self.assertContains(response, 'New work assigned: Quarterly report')
+        self.assertContains(response, 'badge-info')
+        self.assertFalse(Notification.objects.filter(read_at__isnull=True).exists())
+        self.assertNotContains(self.client.get('/employee-panel/notifications/'), 'badge-info')
+
+    def test_smtp_sink_receives_mail(self):
+        sink = SMTPSink()
+        port = sink.start(port=0)
+        try:
+            with self.settings(EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                               EMAIL_HOST='127.0.0.1', EMAIL_PORT=port):
+                self.assign()
+                outbox.drain()
+        finally:
+            sink.stop()
+        (received,) = sink.messages
+        self.assertEqual((received['To'], received['Subject']),
+                         ('employee@example.com', 'New work assigned: Quarterly report'))
+        self.assertEqual(OutboxMessage.objects.get().status, 'SENT')
+
+
+@override_settings(STORAGES=BENCHMARK_SETTINGS['STORAGES'])
+class OutboxDrainTransactionTests(TransactionTestCase):
+    def test_email_sent_outside_transactions(self):
+        admin = CustomUser.objects.create_user('drain_admin', role='ADMIN')
+        employee = CustomUser.objects.create_user('drain_employee', email='drain@example.com')
+        Work.objects.create(title='Audit', description='Body', assigned_to=employee, assigned_by=admin,
+                            due_date=datetime.date(2024, 5, 1))
+        now = timezone.now()
+        seen = []
+
+        def send_messages(messages):
+            # The claim and the in-app copy are committed before anything is sent
+            message = OutboxMessage.objects.get()
+            seen.append((connection.in_atomic_block, message.next_attempt_at > now,
+                         Notification.objects.count(), message.emailed_at))
+            return len(messages)
+
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                        side_effect=send_messages):
+            self.assertEqual(outbox.drain(now=now), 1)
+        self.assertEqual(seen, [(False, True, 1, None)])
+        message = OutboxMessage.objects.get()
+        self.assertEqual((message.status, message.emailed_at), ('SENT', now))
+
+
+class ASGIStream:
+    """One GET /events/ request driven straight through the ASGI handler"""
+
+    def __init__(self, app, cookie=''):
+        self.chunks = asyncio.Queue()
+        self.status = None
+        self.requested = False
+        self.disconnected = asyncio.Event()
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': '/events/', 'raw_path': b'/events/', 'query_string': b'',
+            'root_path': '', 'client': ('127.0.0.1', 40000), 'server': ('testserver', 80),
+            'headers': [(b'host', b'testserver'), (b'cookie', cookie.encode())],
+        }
+        self.task = asyncio.ensure_future(app(scope, self.receive, self.send))
+
+    async def receive(self):
+        if not self.requested:
+            self.requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await self.disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        if message['type'] == 'http.response.start':
+            self.status = message['status']
+        elif message.get('body'):
+            await self.chunks.put(message['body'].decode())
+
+    async def read(self, timeout=5):
+        return await asyncio.wait_for(self.chunks.get(), timeout)
+
+    async def close(self):
+        self.disconnected.set()
+        await asyncio.wait_for(self.task, 5)
+
+
+class EventStreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user('events_admin', password='pw', role='ADMIN')
+        cls.employee = CustomUser.objects.create_user('events_employee', password='pw', role='EMPLOYEE')
+        cls.other = CustomUser.objects.create_user('events_other', password='pw', role='EMPLOYEE')
+
+    def setUp(self):
+        events._broadcaster = None
+        self.addCleanup(setattr, events, '_broadcaster', None)
+        # As the test client does, keep the handler from closing the test's connection
+        for signal in (request_started, request_finished):
+            signal.disconnect(close_old_connections)
+            self.addCleanup(signal.connect, close_old_connections)
+        self.app = ASGIHandler()
+
+    def cookie(self, user):
+        client = Client()
+        client.force_login(user)
+        return f'sessionid={client.cookies["sessionid"].value}'
+
+    def assign_work(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Work.objects.create(title='Live', description='Body', assigned_to=self.employee,
+                                assigned_by=self.admin, due_date=datetime.date(2024, 5, 1))
+
+    def parse(self, chunk):
+        event, data = chunk.strip().split('\n')
+        return event.removeprefix('event: '), json.loads(data.removeprefix('data: '))
+
+    def test_logins_send_no_counters(self):
+        with mock.patch('core.events.publish') as publish, self.captureOnCommitCallbacks(execute=True):
+            update_last_login(None, self.employee)
+        publish.assert_not_called()
+        self.employee.role = 'ADMIN'
+        with mock.patch('core.events.publish') as publish, self.captureOnCommitCallbacks(execute=True):
+            self.employee.save(update_fields=['role'])
+        publish.assert_called_once_with('counters', 'admins')
+
+    async def test_login_required(self):
+        stream = ASGIStream(self.app)
+        await stream.task
+        self.assertEqual(stream.status, 401)
+
+    async def test_events_reach_their_audience(self):
+        cookies = [await sync_to_async(self.cookie)(user) for user in (self.employee, self.other, self.admin)]
+        employee, other, admin = streams = [ASGIStream(self.app, cookie) for cookie in cookies]
+        for stream in streams:
+            self.assertEqual(await stream.read(), 'retry: 5000\n\n')
+            self.assertEqual(stream.status, 200)
+
+        await sync_to_async(self.assign_work)()
+        self.assertEqual(self.parse(await employee.read()),
+                         ('work', {'id': mock.ANY, 'title': 'Live', 'priority': 'MEDIUM', 'due_date': '2024-05-01'}))
+        self.assertEqual(self.parse(await employee.read()),
+                         ('counters', {'total_work': 1, 'pending_work': 1, 'in_progress_work': 0,
+                                       'completed_work': 0}))
+        self.assertEqual(self.parse(await admin.read())[0], 'work')
+        event, counters = self.parse(await admin.read())
+        self.assertEqual((event, counters['active_work']), ('counters', 1))
+        self.assertTrue(other.chunks.empty())
+
+        for stream in streams:
+            await stream.close()
+        self.assertEqual(events.get_broadcaster().connections, 0)
+
+    @override_settings(EVENTS_HEARTBEAT_SECONDS=0.01, EVENTS_QUEUE_SIZE=2)
+    async def test_heartbeat_and_overflow(self):
+        stream = ASGIStream(self.app, await sync_to_async(self.cookie)(self.employee))
+        await stream.read()
+        self.assertEqual(await stream.read(), ': keep-alive\n\n')
+        stream.disconnected.set()
+        while not stream.chunks.empty():
+            await stream.read()
+        broadcaster = events.get_broadcaster()
+        for n in range(3):
+            broadcaster.deliver({'event': 'notice', 'audience': 'all', 'data': {'id': n}})
+        self.assertEqual(await stream.read(), 'event: reload\ndata: {}\n\n')
+        await stream.close()
+
+
+class EventStreamLoadTests(TransactionTestCase):
+    def setUp(self):
+        events._broadcaster = None
+        self.addCleanup(setattr, events, '_broadcaster', None)
+
+    def test_idle_connections_share_the_event_loop(self):
+        """1,000 open streams, then one notice fanned out to all of them.
+
+        The streams are served from a thread of their own, as by an ASGI
+        server, rather than under the test runner's sync thread. Held
+        streams cost no thread.
+        """
+        count = 1000
+        employee = CustomUser.objects.create_user('load_employee', password='pw')
+        client = Client()
+        client.force_login(employee)
+        cookie = f'sessionid={client.cookies["sessionid"].value}'
+        app = ASGIHandler()
+        threads = threading.active_count()
+        results = {}
+
+        async def serve():
+            streams = [ASGIStream(app, cookie) for _ in range(count)]
+            await asyncio.gather(*[stream.read(timeout=60) for stream in streams])
+            results['connections'] = events.get_broadcaster().connections
+            results['threads'] = threading.active_count() - threads
+
+            await asyncio.to_thread(events.publish, 'notice', 'all', id=1, title='Fire drill')
+            results['received'] = {(await stream.read()).split('\n')[0] for stream in streams}
+
+            for stream in streams:
+                stream.disconnected.set()
+            await asyncio.gather(*[stream.task for stream in streams])
+            results['remaining'] = events.get_broadcaster().connections
+
+        server = threading.Thread(target=asyncio.run, args=(serve(),))
+        server.start()
+        server.join()
+
+        self.assertEqual(results['connections'], count)
+        # The server thread and the one shared sync thread
+        self.assertLessEqual(results['threads'], 2)
+        self.assertEqual(results['received'], {'event: notice'})
+        self.assertEqual(results['remaining'], 0)
@@ -1,3 +1,103 @@
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
+from django.contrib.auth.decorators import login_required
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from . import events, metrics
+from .counters import admin_counters, employee_counters
+from .kiosk import TAP_ACTIONS, record_tap
+from .search import search
+
+
+def result_url(user, result):
+    """Where a search hit links to for the current role"""
+    if user.is_admin():
+        urls = {
+            'notice': ('admin_panel:notice_edit', [result.object_id]),
+            'work': ('admin_panel:work_list', []),
+            'request': ('admin_panel:request_respond', [result.object_id]),
+        }
+    else:
+        urls = {
+            'notice': ('employee_panel:notice_list', []),
+            'work': ('employee_panel:work_detail', [result.object_id]),
+            'request': ('employee_panel:request_detail', [result.object_id]),
+        }
+    name, args = urls[result.kind]
+    return reverse(name, args=args)
+
+
+@login_required
+def search_view(request):
+    """Full-text search over notices, work and requests visible to the user"""
+    query = request.GET.get('q', '').strip()
+    results = search(request.user, query) if query else []
+    for result in results:
+        result.url = result_url(request.user, result)
+    return render(request, 'core/search.html', {'query': query, 'results': results})
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint.
+
+    Scrapers send METRICS_TOKEN as a bearer token. Until one is set only
+    logged-in admins may read it.
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        if not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return HttpResponse(status=401)
+    elif not (request.user.is_authenticated and request.user.is_admin()):
+        return HttpResponse('Set METRICS_TOKEN to scrape metrics', status=403, content_type='text/plain')
+    return HttpResponse(metrics.render(metrics.collect()),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@csrf_exempt
+@require_POST
+def kiosk_tap(request):
+    """Badge tap from a lobby kiosk, authenticated with KIOSK_TOKEN"""
+    token = settings.KIOSK_TOKEN
+    if not token or not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return JsonResponse({'error': 'Kiosk token required'}, status=401)
+    action, employee_id = request.POST.get('action'), request.POST.get('employee_id', '').strip()
+    if action not in TAP_ACTIONS or not employee_id:
+        return JsonResponse({'error': f"Send employee_id and action ({' or '.join(TAP_ACTIONS)})"}, status=400)
+    tap = record_tap(action, employee_id=employee_id)
+    if tap is None:
+        return JsonResponse({'error': 'Unknown employee'}, status=404)
+    _, day, check_in, check_out = tap
+    return JsonResponse({
+        'employee_id': employee_id,
+        'date': day.isoformat(),
+        'check_in': check_in and check_in.isoformat(),
+        'check_out': check_out and check_out.isoformat(),
+    })
+
+
+async def event_stream(request):
+    """Server-sent events for the live dashboards.
 
-# Create your views here.
+    Needs an ASGI server: the open stream is a coroutine on the event loop,
+    where under WSGI it would hold a worker thread for as long as it lasts.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponse(status=401)
+    if user.is_admin():
+        resolve_counters = sync_to_async(admin_counters)
+    else:
+        resolve_counters = sync_to_async(partial(employee_counters, user))
+    subscription = events.get_broadcaster().subscribe(events.audiences_for(user))
+    response = StreamingHttpResponse(events.stream(subscription, resolve_counters),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx and similar proxies from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
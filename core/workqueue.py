@@ -0,0 +1,112 @@
+"""Ranking of open work.
+
+Every open item gets a ``score`` computed in SQL from the WORK_QUEUE
+settings: points for its priority, points per day past its due date
+(counting up from ``due_horizon_days`` before it, so work due soon already
+rises) and points per day since it was assigned, so that nothing sits at
+the bottom for ever.
+
+Queues only ever read open rows: an employee's through the (assigned_to,
+status) index, the organisation's overdue list through the partial index
+on open work by due date (work_open_due_idx). Ranking an employee's open
+work is therefore one indexed query however much closed work they have;
+the sort by score covers the open rows alone.
+
+The same rules give each open item a ``load`` for assignment suggestions
+(core.assignment): load_points, plus its priority points, plus overdue
+points for each day inside the due horizon or past the due date. Unlike
+the score it never goes below load_points, so any open item adds load.
+"""
+import datetime
+
+from django.conf import settings
+from django.db.models import BooleanField, Case, F, Func, IntegerField, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Work
+
+OPEN_STATUSES = ['PENDING', 'IN_PROGRESS']
+QUEUE_ORDERING = ['-score', 'due_date']
+EPOCH = datetime.date(1970, 1, 1)
+
+
+class DayNumber(Func):
+    """Days from 1970-01-01 to a date, or to a datetime's UTC date, in SQL"""
+    output_field = IntegerField()
+    # PostgreSQL: subtracting two dates gives whole days
+    template = "(CAST(%(expressions)s AS DATE) - DATE '1970-01-01')"
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='CAST(julianday(%(expressions)s) - 2440587.5 AS INTEGER)',
+                           **extra_context)
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='(TO_DAYS(%(expressions)s) - 719528)', **extra_context)
+
+
+class IsOpen(Func):
+    """``status IN ('PENDING', 'IN_PROGRESS')`` with the statuses written out.
+
+    SQLite only picks a partial index when the query repeats the index's
+    condition, and a filter with bound parameters does not count.
+    """
+    template = '%(expressions)s IN (' + ', '.join(f"'{status}'" for status in OPEN_STATUSES) + ')'
+    output_field = BooleanField()
+    conditional = True
+
+    def __init__(self):
+        super().__init__(F('status'))
+
+
+def open_work():
+    return Work.objects.filter(IsOpen())
+
+
+def priority_points():
+    return Case(*[When(priority=name, then=Value(points))
+                  for name, points in settings.WORK_QUEUE['priority_points'].items()],
+                default=Value(0), output_field=IntegerField())
+
+
+def load(today=None):
+    """The load of each row of a Work queryset, as an SQL expression"""
+    rules = settings.WORK_QUEUE
+    today = (today or timezone.localdate()) - EPOCH
+    days_overdue = Value(today.days) - DayNumber('due_date')
+    return (Value(rules['load_points']) + priority_points()
+            + Greatest(days_overdue + rules['due_horizon_days'], Value(0)) * rules['overdue_points'])
+
+
+def item_load(priority, due_date, today=None):
+    """The load of one open item, as load() computes it in SQL"""
+    rules = settings.WORK_QUEUE
+    days_overdue = ((today or timezone.localdate()) - due_date).days
+    return (rules['load_points'] + rules['priority_points'].get(priority, 0)
+            + max(days_overdue + rules['due_horizon_days'], 0) * rules['overdue_points'])
+
+
+def ranked(queryset, today=None):
+    """Annotate ``days_overdue`` (negative while not yet due) and ``score``"""
+    rules = settings.WORK_QUEUE
+    today = (today or timezone.localdate()) - EPOCH
+    priority = priority_points()
+    return (queryset
+            .annotate(days_overdue=Value(today.days) - DayNumber('due_date'),
+                      # Whole days, near enough: assigned_date is taken in UTC
+                      days_open=Value(today.days) - DayNumber('assigned_date'))
+            .annotate(score=priority
+                      + Greatest(F('days_overdue'), Value(-rules['due_horizon_days'])) * rules['overdue_points']
+                      + F('days_open') * rules['age_points'])
+            .order_by(*QUEUE_ORDERING))
+
+
+def my_queue(user, today=None):
+    """The user's open work, most pressing first"""
+    return ranked(open_work().filter(assigned_to=user), today)
+
+
+def overdue_queue(today=None):
+    """Open work past its due date across the organisation, most pressing first"""
+    today = today or timezone.localdate()
+    return ranked(open_work().filter(due_date__lt=today), today).select_related('assigned_to')
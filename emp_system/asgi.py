@@ -9,8 +9,11 @@ https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'emp_system.settings')
+django.setup(set_prefix=False)
 
-application = get_asgi_application()
+from core.asgi import ASGIHandler  # noqa: E402 (needs the apps loaded)
+
+application = ASGIHandler()
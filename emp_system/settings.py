@@ -11,8 +11,10 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
 from pathlib import Path
+import json
 import os
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -47,12 +49,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestProfilingMiddleware',
+    'core.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'core.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -61,7 +65,8 @@ ROOT_URLCONF = 'emp_system.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates that reports render time to the profiling middleware
+        'BACKEND': 'core.profiling.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -97,6 +102,9 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # A file rather than the shared in-memory database, so that tests
+            # writing from several threads wait for locks as production does
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
         }
     }
 
@@ -158,3 +166,193 @@ AUTH_USER_MODEL = 'accounts.CustomUser'
 LOGIN_URL = 'accounts:login'
 LOGIN_REDIRECT_URL = 'home'
 LOGOUT_REDIRECT_URL = 'accounts:login'
+
+# Cache backend: locmem (per process), file (shared on one host), redis, or
+# fakeredis (an in-process Redis stand-in for offline tests). Hit, miss and
+# eviction counts are available from core.cache.cache_stats(). Setting only
+# REDIS_URL selects redis, so that every process shares one cache.
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'redis' if os.environ.get('REDIS_URL') else 'locmem')
+CACHE_BACKENDS = {
+    'locmem': ('core.cache.LocMemCache', 'emp-system'),
+    'file': ('core.cache.FileBasedCache', str(BASE_DIR / '.cache')),
+    'redis': ('core.cache.RedisCache', 'redis://127.0.0.1:6379/0'),
+    'fakeredis': ('core.cache.FakeRedisCache', 'redis://fake/0'),
+}
+CACHE_LOCATION = (os.environ.get('CACHE_LOCATION')
+                  or (os.environ.get('REDIS_URL') if CACHE_BACKEND == 'redis' else None)
+                  or CACHE_BACKENDS[CACHE_BACKEND][1])
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 10000))
+# locmem and fakeredis keep a separate cache in each process
+SHARED_CACHE = CACHE_BACKEND in ('file', 'redis')
+
+
+def cache_alias(alias, timeout=300):
+    backend, location = CACHE_BACKENDS[CACHE_BACKEND][0], CACHE_LOCATION
+    if CACHE_BACKEND in ('locmem', 'file'):
+        # Separate stores so that fragments cannot evict sessions
+        location = f'{location}/{alias}' if CACHE_BACKEND == 'file' else f'{location}-{alias}'
+    if CACHE_BACKEND == 'redis':
+        options = {}  # the server's maxmemory policy bounds it instead
+    elif CACHE_BACKEND == 'fakeredis':
+        options = {'max_entries': CACHE_MAX_ENTRIES}
+    else:
+        options = {'MAX_ENTRIES': CACHE_MAX_ENTRIES}
+    return {
+        'BACKEND': backend,
+        'LOCATION': location,
+        'KEY_PREFIX': alias,
+        'TIMEOUT': timeout,
+        'OPTIONS': options,
+        'STATS_NAME': alias,
+    }
+
+
+CACHES = {
+    'default': cache_alias('default'),
+    'sessions': cache_alias('sessions', timeout=None),
+    # Picked up by the {% cache %} template tag
+    'template_fragments': cache_alias('template_fragments', timeout=3600),
+}
+
+# Session storage: cached_db (reads from the cache, writes through to the
+# database), cache (cache only), db, or signed_cookies (no server state at
+# all). Expired database rows are removed by purge_sessions. A session
+# cached per process would outlive its logout in every other worker, so
+# cache and cached_db need the file or redis backend; the default is
+# cached_db with those and db otherwise.
+SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'cached_db' if SHARED_CACHE else 'db')
+if SESSION_BACKEND in ('cache', 'cached_db') and not SHARED_CACHE:
+    raise ImproperlyConfigured(f'SESSION_BACKEND={SESSION_BACKEND} needs a cache shared between processes, '
+                               f'not CACHE_BACKEND={CACHE_BACKEND}; use db instead')
+SESSION_ENGINE = f'django.contrib.sessions.backends.{SESSION_BACKEND}'
+SESSION_CACHE_ALIAS = 'sessions'
+
+# Per-process cache of authenticated users (accounts.user_cache). Other
+# processes learn about user changes through the default cache, so it is
+# only used when that cache is shared between processes.
+AUTH_USER_CACHE = SHARED_CACHE
+AUTH_USER_CACHE_TTL = int(os.environ.get('AUTH_USER_CACHE_TTL', 60))
+AUTH_USER_CACHE_SIZE = int(os.environ.get('AUTH_USER_CACHE_SIZE', 10000))
+
+# Seconds the dashboard counters (core.counters) stay cached. Writes drop
+# them, but only from the writing process's cache unless it is shared, so
+# with a per-process cache they are kept briefly instead.
+DASHBOARD_COUNTER_TIMEOUT = int(os.environ.get('DASHBOARD_COUNTER_TIMEOUT', 300 if SHARED_CACHE else 5))
+
+# Request profiling (core.middleware.RequestProfilingMiddleware): timings go
+# out in a Server-Timing header; requests over budget and the stacks of slow
+# queries are logged to PROFILING_LOG_FILE.
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'true').lower() == 'true'
+PROFILING_QUERY_BUDGET = int(os.environ.get('PROFILING_QUERY_BUDGET', 20))
+PROFILING_TIME_BUDGET_MS = float(os.environ.get('PROFILING_TIME_BUDGET_MS', 500))
+PROFILING_SLOW_QUERY_MS = float(os.environ.get('PROFILING_SLOW_QUERY_MS', 100))
+PROFILING_STACKS_PER_REQUEST = int(os.environ.get('PROFILING_STACKS_PER_REQUEST', 3))
+# Empty logs to stderr, like the server's own output; a path enables a
+# rotating log file, which belongs outside the checkout.
+PROFILING_LOG_FILE = os.environ.get('PROFILING_LOG_FILE', '')
+# core.test_runner silences these warnings while the tests run
+TEST_RUNNER = 'core.test_runner.TestRunner'
+
+# /metrics (core.metrics). Under gunicorn point METRICS_DIR at a directory
+# shared by the workers, emptied before start, so any worker can answer a
+# scrape for all of them.
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+# Bearer token for scrapers; while it is empty only admins can read /metrics
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Shift rules for the working-hours summary (core.hours). Times are HH:MM,
+# durations minutes; SHIFT_RULES_BY_DEPARTMENT overrides individual keys per
+# department, e.g. {"Support": {"start": "07:00"}}. Run compute_hours after
+# changing them.
+SHIFT_RULES = {
+    'start': os.environ.get('SHIFT_START', '09:00'),
+    'grace_minutes': int(os.environ.get('SHIFT_GRACE_MINUTES', 10)),
+    'break_minutes': int(os.environ.get('SHIFT_BREAK_MINUTES', 60)),
+    'break_after_minutes': int(os.environ.get('SHIFT_BREAK_AFTER_MINUTES', 360)),
+    'daily_minutes': int(os.environ.get('SHIFT_DAILY_MINUTES', 480)),
+    'weekly_minutes': int(os.environ.get('SHIFT_WEEKLY_MINUTES', 2400)),
+}
+SHIFT_RULES_BY_DEPARTMENT = json.loads(os.environ.get('SHIFT_RULES_BY_DEPARTMENT', '{}'))
+
+# Most rows the admin panel's CSV import accepts. It hashes each password
+# in the request (about 0.4 s apiece); larger files go through
+# `python manage.py import_employees`, which hashes on every core.
+EMPLOYEE_IMPORT_MAX_ROWS = int(os.environ.get('EMPLOYEE_IMPORT_MAX_ROWS', 50))
+
+# Ranking of open work (core.workqueue). Score = priority points
+# + overdue_points per day past due (counting from due_horizon_days before
+# the due date) + age_points per day since it was assigned. An open item's
+# load for assignment suggestions (core.assignment) is load_points
+# + priority points + overdue_points per day from due_horizon_days before
+# its due date.
+WORK_QUEUE = {
+    'priority_points': {'URGENT': 90, 'HIGH': 60, 'MEDIUM': 30, 'LOW': 0},
+    'overdue_points': 4,
+    'due_horizon_days': 14,
+    'age_points': 1,
+    'load_points': 10,
+}
+# How many least-loaded employees the work form suggests
+ASSIGNMENT_SUGGESTIONS = 5
+# Most stats rows a suggestion rebuilds when their loads were computed on
+# another day; run rebuild_employee_stats nightly so it rarely has to
+ASSIGNMENT_REBUILD_LIMIT = int(os.environ.get('ASSIGNMENT_REBUILD_LIMIT', 200))
+
+# Shared secret for lobby kiosks posting badge taps to /kiosk/tap/; the
+# endpoint is disabled while it is empty
+KIOSK_TOKEN = os.environ.get('KIOSK_TOKEN', '')
+# Taps only write the attendance row; `python manage.py process_taps` brings
+# EmployeeStats and WorkingHours up to date, polling this often
+KIOSK_POLL_SECONDS = float(os.environ.get('KIOSK_POLL_SECONDS', 5))
+
+# Email goes to an SMTP server; in development run `python manage.py
+# smtp_sink`, a local stand-in that prints what it receives.
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 1025))
+EMAIL_TIMEOUT = 10
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'EMP System <noreply@localhost>')
+# Prefix for links in emails
+SITE_URL = os.environ.get('SITE_URL', 'http://localhost:8000')
+
+# Notification outbox (core.outbox), drained by `python manage.py run_outbox`.
+# A failed delivery is retried after OUTBOX_RETRY_SECONDS, doubling each
+# time up to an hour, and given up after OUTBOX_MAX_ATTEMPTS.
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', 100))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 8))
+OUTBOX_RETRY_SECONDS = float(os.environ.get('OUTBOX_RETRY_SECONDS', 30))
+OUTBOX_POLL_SECONDS = float(os.environ.get('OUTBOX_POLL_SECONDS', 2))
+
+# Live dashboard updates (core.events), streamed from /events/ under ASGI.
+# LocalBackend only reaches streams held by the publishing process; with
+# several workers use 'core.events.RedisBackend' and
+# EVENTS_OPTIONS = {'url': REDIS_URL}.
+EVENTS_BACKEND = os.environ.get('EVENTS_BACKEND', 'core.events.LocalBackend')
+EVENTS_OPTIONS = {'url': os.environ['REDIS_URL']} if os.environ.get('REDIS_URL') else {}
+EVENTS_QUEUE_SIZE = 100
+EVENTS_HEARTBEAT_SECONDS = 15
+EVENTS_RETRY_MS = 5000
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'profiling': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': PROFILING_LOG_FILE,
+            'maxBytes': 5 * 1024 * 1024,
+            'backupCount': 3,
+            'delay': True,
+        } if PROFILING_LOG_FILE else {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'emp_system.profiling': {
+            'handlers': ['profiling'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
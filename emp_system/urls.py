@@ -3,6 +3,7 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from django.shortcuts import redirect
+from core.views import event_stream, kiosk_tap, metrics_view
 
 def home_redirect(request):
     """Redirect to appropriate dashboard based on role"""
@@ -19,6 +20,10 @@ urlpatterns = [
     path('accounts/', include('accounts.urls')),
     path('admin-panel/', include('admin_panel.urls')),
     path('employee-panel/', include('employee_panel.urls')),
+    path('search/', include('core.urls')),
+    path('metrics', metrics_view, name='metrics'),
+    path('kiosk/tap/', kiosk_tap, name='kiosk_tap'),
+    path('events/', event_stream, name='events'),
 ]
 
 if settings.DEBUG:
@@ -1,3 +1,81 @@
-from django.test import TestCase
+import datetime
 
-# Create your tests here.
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from accounts.models import CustomUser
+from core.models import Attendance, Work
+
+from core.benchmark import BENCHMARK_SETTINGS, SCENARIOS, run_deployments
+from core.seeding import OrgSeeder
+
+
+@override_settings(**BENCHMARK_SETTINGS)
+class DeploymentBenchmarkTests(TransactionTestCase):
+    def test_wsgi_and_asgi(self):
+        """The employee_panel pages serve through both the WSGI and the ASGI handler.
+
+        Throughput is reported by ``benchmark --deployments``.
+        """
+        OrgSeeder(employees=4, work=20, requests=20, notices=5).run()
+        scenarios = [s for s in SCENARIOS if s.url_name.startswith('employee_panel:')]
+        results = run_deployments(scenarios, requests=16, concurrency=8)
+        self.assertEqual([len(results['wsgi']), len(results['asgi'])], [len(scenarios)] * 2)
+        for wsgi, asgi in zip(results['wsgi'], results['asgi']):
+            self.assertEqual(wsgi.name, asgi.name)
+            self.assertEqual(len(wsgi.latencies), len(asgi.latencies))
+
+
+@override_settings(STORAGES=BENCHMARK_SETTINGS['STORAGES'])
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('async_user', password='pw', role='EMPLOYEE')
+        cls.other = CustomUser.objects.create_user('async_other', password='pw', role='EMPLOYEE')
+        cls.admin = CustomUser.objects.create_user('async_admin', password='pw', role='ADMIN')
+        cls.work = Work.objects.create(title='Mine', description='Body', assigned_to=cls.user,
+                                       assigned_by=cls.admin, due_date=datetime.date(2024, 5, 1))
+        cls.others_work = Work.objects.create(title='Theirs', description='Body', assigned_to=cls.other,
+                                              assigned_by=cls.admin, due_date=datetime.date(2024, 5, 1))
+
+    async def test_pages_render(self):
+        await self.async_client.aforce_login(self.user)
+        for url in ('/employee-panel/', '/employee-panel/work/', f'/employee-panel/work/{self.work.pk}/',
+                    '/employee-panel/requests/', '/employee-panel/notices/', '/employee-panel/attendance/'):
+            response = await self.async_client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+        self.assertContains(await self.async_client.get('/employee-panel/work/'), 'Mine')
+
+    async def test_other_employees_work_is_hidden(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(f'/employee-panel/work/{self.others_work.pk}/')
+        self.assertEqual(response.status_code, 404)
+
+    async def test_login_and_role_required(self):
+        response = await self.async_client.get('/employee-panel/work/')
+        self.assertRedirects(response, '/accounts/login/?next=/employee-panel/work/',
+                             fetch_redirect_response=False)
+        await self.async_client.aforce_login(self.admin)
+        response = await self.async_client.get('/employee-panel/work/')
+        self.assertRedirects(response, '/admin-panel/', fetch_redirect_response=False)
+
+
+@override_settings(STORAGES=BENCHMARK_SETTINGS['STORAGES'])
+class AttendanceTapTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('tap_user', password='pw', role='EMPLOYEE')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_check_in_and_out(self):
+        response = self.client.post('/employee-panel/attendance/tap/', {'action': 'in'}, follow=True)
+        self.assertContains(response, 'Checked in at')
+        self.client.post('/employee-panel/attendance/tap/', {'action': 'in'})
+        self.client.post('/employee-panel/attendance/tap/', {'action': 'out'})
+        record = Attendance.objects.get(employee=self.user)
+        self.assertIsNotNone(record.check_in)
+        self.assertIsNotNone(record.check_out)
+
+    def test_get_not_allowed(self):
+        self.assertEqual(self.client.get('/employee-panel/attendance/tap/').status_code, 405)
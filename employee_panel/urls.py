@@ -8,6 +8,7 @@ urlpatterns = [
     
     # Work Management
     path('work/', views.work_list, name='work_list'),
+    path('work/queue/', views.work_queue, name='work_queue'),
     path('work/<int:pk>/', views.work_detail, name='work_detail'),
     path('work/<int:pk>/update/', views.work_update, name='work_update'),
     
@@ -19,6 +20,10 @@ urlpatterns = [
     # Notices
     path('notices/', views.notice_list, name='notice_list'),
     
+    # Notifications
+    path('notifications/', views.notification_list, name='notification_list'),
+    
     # Attendance
     path('attendance/', views.attendance_view, name='attendance_view'),
+    path('attendance/tap/', views.attendance_tap, name='attendance_tap'),
 ]
@@ -1,54 +1,67 @@
-from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth.decorators import login_required
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib import messages
 from django.utils import timezone
-from core.models import Notice, Attendance, Work, Request
+from django.views.decorators.http import require_POST
+from accounts.decorators import role_required
+from core.models import Notice, Attendance, Work, Request, Notification
+from core.counters import employee_counters
+from core.fragments import notice_version
+from core.kiosk import TAP_ACTIONS, record_tap
+from core.pagination import paginate
+from core.workqueue import my_queue
 from .forms import WorkUpdateForm, RequestForm
 
-def employee_required(view_func):
-    """Decorator to check if user is employee"""
-    def wrapper(request, *args, **kwargs):
-        if not request.user.is_employee():
-            messages.error(request, 'You do not have permission to access this page.')
-            return redirect('admin_panel:dashboard')
-        return view_func(request, *args, **kwargs)
-    return login_required(wrapper)
+# Decorator to check if user is employee
+employee_required = role_required('EMPLOYEE', redirect_to='admin_panel:dashboard')
+
+# The read-only pages are async views. Under ASGI they fetch with the
+# async ORM on the event loop and render in the sync thread, where a
+# template may still query: a cached fragment that misses, the messages
+# and the user behind the base template.
+
+async def _fetch(queryset):
+    return [obj async for obj in queryset]
+
+async def _render(request, template_name, context):
+    return await sync_to_async(render)(request, template_name, context)
 
 @employee_required
-def employee_dashboard(request):
+async def employee_dashboard(request):
     """Employee dashboard view"""
-    total_work = Work.objects.filter(assigned_to=request.user).count()
-    pending_work = Work.objects.filter(assigned_to=request.user, status='PENDING').count()
-    in_progress_work = Work.objects.filter(assigned_to=request.user, status='IN_PROGRESS').count()
-    completed_work = Work.objects.filter(assigned_to=request.user, status='COMPLETED').count()
-    
-    recent_work = Work.objects.filter(assigned_to=request.user)[:5]
-    recent_notices = Notice.objects.filter(is_active=True)[:5]
-    my_requests = Request.objects.filter(employee=request.user)[:5]
-    
+    counters = await sync_to_async(employee_counters)(request.user)
+    recent_work = await _fetch(Work.objects.filter(assigned_to=request.user)[:5])
+    version = await sync_to_async(notice_version)()
+    # Only evaluated when the cached fragment is missing
+    recent_notices = Notice.objects.filter(is_active=True).only('title', 'published_date')[:5]
+
     context = {
-        'total_work': total_work,
-        'pending_work': pending_work,
-        'in_progress_work': in_progress_work,
-        'completed_work': completed_work,
+        **counters,
         'recent_work': recent_work,
         'recent_notices': recent_notices,
-        'my_requests': my_requests,
+        'notice_version': version,
     }
-    return render(request, 'employee_panel/dashboard.html', context)
+    return await _render(request, 'employee_panel/dashboard.html', context)
 
 # Work Management Views
 @employee_required
-def work_list(request):
+async def work_list(request):
     """List all assigned work"""
-    works = Work.objects.filter(assigned_to=request.user)
-    return render(request, 'employee_panel/work_list.html', {'works': works})
+    works = await _fetch(Work.objects.filter(assigned_to=request.user).select_related('assigned_by'))
+    return await _render(request, 'employee_panel/work_list.html', {'works': works})
+
+@employee_required
+async def work_queue(request):
+    """Open work ranked by priority, due date and age"""
+    page = await sync_to_async(paginate)(request, my_queue(request.user))
+    return await _render(request, 'employee_panel/work_queue.html', {'works': page, 'page': page})
 
 @employee_required
-def work_detail(request, pk):
+async def work_detail(request, pk):
     """View work details"""
-    work = get_object_or_404(Work, pk=pk, assigned_to=request.user)
-    return render(request, 'employee_panel/work_detail.html', {'work': work})
+    work = await aget_object_or_404(Work.objects.select_related('assigned_by'),
+                                    pk=pk, assigned_to=request.user)
+    return await _render(request, 'employee_panel/work_detail.html', {'work': work})
 
 @employee_required
 def work_update(request, pk):
@@ -71,10 +84,10 @@ def work_update(request, pk):
 
 # Request Management Views
 @employee_required
-def request_list(request):
+async def request_list(request):
     """List all my requests"""
-    requests = Request.objects.filter(employee=request.user)
-    return render(request, 'employee_panel/request_list.html', {'requests': requests})
+    requests = await _fetch(Request.objects.filter(employee=request.user))
+    return await _render(request, 'employee_panel/request_list.html', {'requests': requests})
 
 @employee_required
 def request_create(request):
@@ -100,14 +113,44 @@ def request_detail(request, pk):
 
 # Notice View
 @employee_required
-def notice_list(request):
+async def notice_list(request):
     """View all active notices"""
-    notices = Notice.objects.filter(is_active=True)
-    return render(request, 'employee_panel/notice_list.html', {'notices': notices})
+    # Only evaluated when the cached fragment is missing
+    notices = Notice.objects.filter(is_active=True).select_related('published_by')
+    version = await sync_to_async(notice_version)()
+    return await _render(request, 'employee_panel/notice_list.html',
+                         {'notices': notices, 'notice_version': version})
+
+# Notifications
+@employee_required
+def notification_list(request):
+    """Latest notifications; viewing them marks them read"""
+    notifications = list(Notification.objects.filter(user=request.user)[:50])
+    unread = [n.pk for n in notifications if n.read_at is None]
+    if unread:
+        Notification.objects.filter(pk__in=unread).update(read_at=timezone.now())
+    return render(request, 'employee_panel/notification_list.html',
+                  {'notifications': notifications, 'unread': set(unread)})
 
 # Attendance View
 @employee_required
-def attendance_view(request):
+async def attendance_view(request):
     """View personal attendance"""
-    attendance_records = Attendance.objects.filter(employee=request.user)
-    return render(request, 'employee_panel/attendance_list.html', {'attendance_records': attendance_records})
+    attendance_records = await _fetch(Attendance.objects.filter(employee=request.user))
+    return await _render(request, 'employee_panel/attendance_list.html',
+                         {'attendance_records': attendance_records})
+
+@require_POST
+@employee_required
+def attendance_tap(request):
+    """Check in or out for today"""
+    action = request.POST.get('action')
+    if action not in TAP_ACTIONS:
+        messages.error(request, 'Unknown attendance action.')
+        return redirect('employee_panel:attendance_view')
+    _, _, check_in, check_out = record_tap(action, user_id=request.user.pk)
+    if action == 'in':
+        messages.success(request, f'Checked in at {check_in:%H:%M}.')
+    else:
+        messages.success(request, f'Checked out at {check_out:%H:%M}.')
+    return redirect('employee_panel:attendance_view')
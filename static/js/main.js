@@ -30,8 +30,51 @@ document.addEventListener('DOMContentLoaded', function() {
             }, 500);
         }, 5000);
     });
+
+    initLiveUpdates();
 });
 
+// Live dashboard updates over server-sent events
+function initLiveUpdates() {
+    const grid = document.querySelector('[data-events-url]');
+    if (!grid || !window.EventSource) {
+        return;
+    }
+    const source = new EventSource(grid.dataset.eventsUrl);
+    const feed = document.querySelector('[data-live-feed]');
+
+    function announce(text) {
+        if (!feed) {
+            return;
+        }
+        const item = document.createElement('li');
+        item.textContent = text;
+        feed.querySelector('ul').prepend(item);
+        feed.hidden = false;
+    }
+
+    source.addEventListener('counters', function(e) {
+        Object.entries(JSON.parse(e.data)).forEach(([name, value]) => {
+            const counter = document.querySelector(`[data-counter="${name}"]`);
+            if (counter) {
+                counter.textContent = value;
+            }
+        });
+    });
+    source.addEventListener('work', function(e) {
+        const work = JSON.parse(e.data);
+        announce(`New work: ${work.title} (due ${work.due_date})`);
+    });
+    source.addEventListener('notice', function(e) {
+        announce(`New notice: ${JSON.parse(e.data).title}`);
+    });
+    // Sent when this page fell too far behind to catch up
+    source.addEventListener('reload', function() {
+        source.close();
+        window.location.reload();
+    });
+}
+
 // Form validation
 function validateForm(formId) {
     const form = document.getElementById(formId);